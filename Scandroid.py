@@ -22,17 +22,22 @@ import wx
 import string, os, sys, sre
 import random
 import robIcon
-from math import modf
 from scanstrings import *		# some global texts & the Explainer
 from scanstc import *			# editors for subwindows
 from scanfuncs import *			# the Scansion Machine
+from scandeduce import DeduceDocument, SectionAt
+from scanbatch import BackgroundScan
 from datetime import *          # used for saving scansions
 
 import traceback
 
 # global to this module:
-FORKSTEP = 3		# in iambics, the step at which the two algorithms divide
 dummyevent = wx.MouseEvent(wx.wxEVT_LEFT_UP)		# to call button directly
+RESCANDELAY = 1000	# ms after the last edit before stale lines are rescanned
+SCANCACHESIZE = 5000	# lines whose scansions we remember, for rescanning
+PROGRESSPOLL = 100	# ms between looks at a whole-document scan's progress
+STATUSWIDTHS = [0, -1, -3, 0]		# the status bar's fields, and
+SCANSTATUSWIDTHS = [0, -1, -2, -2]	#   while a document is scanned
 
 class ScandroidFrame(wx.Frame):
 ## - - - - - initializations
@@ -51,14 +56,23 @@ class ScandroidFrame(wx.Frame):
                                                       (246,246,246))
         # initialize our data members and helpers
         self.SM = ScansionMachine()		# central engine of scansion work
+        self.wordIndex = WordIndex()		# lines using each word
+        self.SM.wordIndex = self.wordIndex
         self.E = Explainer(self.NotesWindow)
         self.lineNum = 0			# where to put its scansion when done
         self.Metron = 2				# initial assumption:
         self.LineFeet = 5			#   iambic pentameter
         self.LineFeetSet = True
         self.SM.SetLineFeet(5, True)
-        self.forceiamb, self.forceanap = False, False
+        self.forcemetron = 0			# or the metron forced from the menu
+        self.Sections = []			# parts of the text, by metre
+        self.docScan = None			# a BackgroundScan, while one runs
+        self.rescan = None			# and one of stale lines
+        self.rescanTimer = None		# waiting for edits to stop
+        self.scanCache = LRUCache(SCANCACHESIZE)	# see RescanStaleLines
         self.SetupGUI()			# buttons, menus . . .
+        self.docTimer = wx.Timer(self)		# polls docScan's progress
+        self.Bind(wx.EVT_TIMER, self.PollDocumentScan, self.docTimer)
         self.SetupScansionSteps()		# inc some more data items
         self.WholeText.DisplayText(InitialText)		# as a startup . . .
         self.loadedtext = True
@@ -117,8 +131,13 @@ class ScandroidFrame(wx.Frame):
         
         # -- CREATION OF STATUS BAR --
         sb = wx.StatusBar(self, -1)
-        sb.SetFieldsCount(3)             # initial dummy field prevents
-        sb.SetStatusWidths([0, -1, -3])  # metron from being overwritten
+        sb.SetFieldsCount(4)             # initial dummy field prevents
+        sb.SetStatusWidths(STATUSWIDTHS) # metron from being overwritten
+        # a last field, empty till ScanWholeDocument shows its gauge there
+        self.docGauge = wx.Gauge(sb, -1, 1, style=wx.GA_HORIZONTAL
+                                                  | wx.GA_SMOOTH)
+        self.docGauge.Hide()
+        sb.Bind(wx.EVT_SIZE, self.PlaceDocumentGauge)
         
         # -- SETTING OF STATUS BAR --
         self.SetStatusBar(sb)
@@ -179,8 +198,11 @@ class ScandroidFrame(wx.Frame):
                      ['Scan\tCtrl+2', 'S&tep\tCtrl+T',
                       'Store\tCtrl+3', 'Canc&el\tCtrl+E',
                       'Force anapestics', 'Force iambics',
+                      'Force trochaics', 'Force dactylics',
                       'Force iambic alg. 1', 'Force iambic alg. 2',
-                      'Next unscanned line\tCtrl+1', '(Scan All)']]
+                      'Force iambic alg. 3',
+                      'Next unscanned line\tCtrl+1', '(Scan All)',
+                      'Scan whole document\tCtrl+5']]
                        # (Scan All) is for testing only!
                       
         self.menus = []
@@ -211,9 +233,11 @@ class ScandroidFrame(wx.Frame):
                         [self.OnScanBtn, self.OnStepBtn,
                          self.OnStoreBtn, self.OnCancelBtn,
                          self.ForceMetron, self.ForceMetron,
-                         self.ForceAlg, self.ForceAlg,
+                         self.ForceMetron, self.ForceMetron,
+                         self.ForceAlg, self.ForceAlg, self.ForceAlg,
                          self.GotoNextUnscannedLine,
-                         self.ScanEverything]] # <-- ALSO FOR TESTING      
+                         self.ScanEverything, # <-- ALSO FOR TESTING
+                         self.ScanWholeDocument]]
         for i, menu in enumerate(menuHandlers):
             for j, item in enumerate(menu):
                 self.Bind(wx.EVT_MENU, item, id = (i + 1) * 100 + (j + 1))
@@ -231,38 +255,24 @@ class ScandroidFrame(wx.Frame):
         self.ShowAboutBox()
     
     def OnClose(self, item):
+        if self.docScan: self.docScan.Cancel()
+        self.docTimer.Stop()
+        self.CancelRescan()
         self.Destroy()
 #        wx.GetApp().ExitMainLoop() 
     
-    def SetupScansionSteps(self, iambic=True, algorithm1=True):
+    def SetupScansionSteps(self, iambic=True, algorithm=1, metron=None):
         """Match a sequence of step names with function names.
         
         By default, initialize the sequence as per iambic Algorithm 1. It can 
-        be switched to Algorithm 2 for each iambic line any time before 
+        be switched to Algorithm 2 or 3 for each iambic line any time before 
         FORKSTEP (caller is responsible for checking this): at random, as 
         forced by the user, or as a switch in desperation when an alg fails.
-        Steps after 1 can be switched from iambic to anapestic.
-        Switch arguments allow these options.
+        Steps after 1 can be switched from iambic to anapestic, or (given
+        the metron) trochaic or dactylic.
+        Switch arguments allow these options. The SM owns the sequence.
         """
-        self.Steps = [('SYLLABLES', self.SM.ShowSyllables),
-                      ('PRELIMINARY MARKS', self.SM.ShowLexStresses)]
-        if iambic:
-            self.Steps.append(('CHOOSE ALGORITHM', self.SM.ChooseAlgorithm))
-            if algorithm1:
-                self.Steps.append(('FIRST TESTS', self.SM.WeirdEnds))
-                self.Steps.append(('FOOT DIVISION', self.SM.TestLengthAndDice))
-            else:
-                self.Steps.append(('LONGEST NORMAL', self.SM.TryREs))
-                self.Steps.append(('CLEAN UP ENDS', self.SM.CleanUpRE))
-            self.Steps.append(('PROMOTIONS', self.SM.PromotePyrrhics))
-            self.Steps.append(('ANALYSIS', self.SM.HowWeDoing))
-        else:		# anapestic steps
-            self.Steps.append(('ADJUST STRESSES', self.SM.GetBestAnapLexes))
-            self.Steps.append(('ANAPESTICS: LINE END', self.SM.AnapEndFoot))
-            self.Steps.append(('ANAPESTICS: FOOT DIVISION',
-                                    self.SM.AnapDivideHead))
-            self.Steps.append(('ANAPESTICS: ANALYSIS',
-                              self.SM.AnapCleanUpAndReport))
+        self.Steps = self.SM.GetScansionSteps(iambic, algorithm, metron)
 
 ## - - - - - menu and keystroke methods mainly doing simple display stuff      
     def ShowAboutBox(self, evt = None):
@@ -310,11 +320,14 @@ class ScandroidFrame(wx.Frame):
     def EnableNonScanMenuOptions(self, enable=True):
         self.GetMenuItem('Force anapestics').Enable(enable)
         self.GetMenuItem('Force iambics').Enable(enable)
+        self.GetMenuItem('Force trochaics').Enable(enable)
+        self.GetMenuItem('Force dactylics').Enable(enable)
         self.GetMenuItem('Next unscanned line').Enable(enable)
         
     def EnableIambicAlgForcing(self, enable=True):
         self.GetMenuItem('Force iambic alg. 1').Enable(enable)
         self.GetMenuItem('Force iambic alg. 2').Enable(enable)
+        self.GetMenuItem('Force iambic alg. 3').Enable(enable)
         
     def ClearWorkBoxes(self):
         """Clear text and scansion fields, not Notes window; disable buttons.
@@ -326,9 +339,14 @@ class ScandroidFrame(wx.Frame):
         self.ScanLine.Clear()
         self.EnableScansionSaving(False)
 
+    def PlaceDocumentGauge(self, evt=None):
+        """Fit ScanWholeDocument's gauge to the status bar's last field."""
+        rect = self.GetStatusBar().GetFieldRect(3)
+        self.docGauge.SetRect(rect.Deflate(2, 2))
+        if evt: evt.Skip()
+
     def UpdateStatusBar(self, metron=2, linefeet=5, linefeetset=True):
-        if metron == 2: mfieldtxt = "metron: IAMBIC"
-        else: mfieldtxt = "metron: ANAPESTIC"
+        mfieldtxt = "metron: " + metronNames[metron]
         if linefeetset and len(lineLengthName) > linefeet:
             footfieldtxt = "feet per line: " + lineLengthName[linefeet]
         else: footfieldtxt = "feet per line: VARIABLE"
@@ -430,7 +448,9 @@ class ScandroidFrame(wx.Frame):
         
         This is where news arrives, here at the top level, of a new line to be
         scanned, so quite a lot is initialized, internally and visibly.
+        Not while ScanWholeDocument runs, which has the text to itself.
         """
+        if self.docScan: return
         self.ClearWorkBoxes()		# no old lines or previous scansions
         self.NotesWindow.Clear()		# nor old notes
         self.linetext = txt.strip()
@@ -449,11 +469,15 @@ class ScandroidFrame(wx.Frame):
         self.TextLine.AppendText(self.linetext)	# put selected line in the box
         self.lineNum = num			# where to put scansion when done
         self.CurrentStep = 0			# (re)start the procedure
+        # in a text of more than one metre, take this line's part's
+        if self.loadedtext and len(self.Sections) > 1:
+            self.UseSection(SectionAt(self.Sections,
+                                      self.TextLineNumber(num)))
         # iambic-only preparations
         if self.Metron == 2:
             self.whichAlgorithm = random.randint(1, 2) # begin at random
             self.SetupScansionSteps(iambic=True,
-                                    algorithm1=(self.whichAlgorithm==1))
+                                    algorithm=self.whichAlgorithm)
             self.OneIambicAlgFailed = False
         #self.E.Explain("Press Step to inch through, Scan to rush")
         self.E.Explain("\n\n\"%s\"" % self.linetext)
@@ -464,20 +488,11 @@ class ScandroidFrame(wx.Frame):
         # The feet per line will stay as variable.
         try:
             #self.SM.SetLineFeet(5, False); theLengths = 0
-            if not self.forceanap:
-                (score, length) = self.SM.ChooseAlgorithm(self.E,
-                                              deducingParams=True)
-                iambCompTotal = score
-            if not self.forceiamb:
-                (score, length) = self.SM.GetBestAnapLexes(self.E,
-                                               deducingParams=True)
-                anapCompTotal = score
-            if not self.forceiamb and not self.forceanap:
-                if iambCompTotal < anapCompTotal:
-                    self.Metron = 2
-                else:
-                    self.Metron = 3
-                self.SetupScansionSteps(iambic=(self.Metron==2))
+            if not self.forcemetron:
+                scores = self.SM.ScoreMetres(self.E)
+                self.Metron = ChooseMetron(dict([(m, score)
+                                for (m, (score, length)) in scores.items()]))
+                self.SetupScansionSteps(metron=self.Metron)
             #self.SM.SetLineFeet(self.LineFeet, self.LineFeetSet)
             self.UpdateStatusBar(self.Metron, self.LineFeet, self.LineFeetSet)
         except:
@@ -499,20 +514,21 @@ class ScandroidFrame(wx.Frame):
         self.NotesWindow.AppendText('\n\n')
         self.E.Explain(self.Steps[self.CurrentStep][0] + '  ')	# show header
         try:		# this line is THE distributor of work to the SM
-            (scanline, result) = self.Steps[self.CurrentStep][1](self.E)
+            (scanline, result) = self.SM.RunStep(
+                                    self.Steps[self.CurrentStep][0],
+                                    self.Steps[self.CurrentStep][1], self.E)
         except:
             #self.ErrorMessage(self.Steps[self.CurrentStep][1])
             traceback.print_exc()
             self.AbortScansion(); return # bail out!
         # sneaky use of result for iambic ChooseAlgorithm step
         if self.CurrentStep == 2 and self.Metron == 2:
-            if result: self.whichAlgorithm = 1 # arbitrary T/F code to put
-            else: self.whichAlgorithm = 2	   # alg. into succeed/fail return
+            self.whichAlgorithm = result	# alg. number, not succeed/fail
             # substitute failure test only
             # for too-short lines if linefeet not set
             if scanline:
                 self.SetupScansionSteps(iambic=True,
-                                        algorithm1=(self.whichAlgorithm == 1))
+                                        algorithm=self.whichAlgorithm)
                 self.ShowScanLine(scanline)
                 self.EnableIambicAlgForcing()
                 self.CurrentStep += 1
@@ -530,7 +546,7 @@ class ScandroidFrame(wx.Frame):
                     self.ShowScanLine(scanline)
                     self.SwitchIambicAlg()
                     self.SetupScansionSteps(iambic=True,
-                                         algorithm1=(self.whichAlgorithm == 1))
+                                            algorithm=self.whichAlgorithm)
                     self.CurrentStep = FORKSTEP
                 else:
                     if self.Metron == 2:
@@ -568,7 +584,9 @@ class ScandroidFrame(wx.Frame):
         self.WholeText.SetFocus()		# and even encourage it
         if self.leadspace:
             currentscansion = self.leadspace.group() + currentscansion
-        self.WholeText.PutLineBack(self.lineNum, currentscansion) # make it so
+        versenum = self.WholeText.PutLineBack(self.lineNum,
+                                              currentscansion) # make it so
+        self.WholeText.lineIndex.MarkScanned(versenum)
         self.GetButton('Store').Enable(False)
         self.GetMenuItem('Store').Enable(False)
     
@@ -579,8 +597,275 @@ class ScandroidFrame(wx.Frame):
             self.OnScanBtn(evt)
             self.OnStoreBtn(evt)
 
+    def ScanWholeDocument(self, evt):
+        """Scan every unscanned verse line of the text, away from the GUI.
+
+        Unlike ScanEverything, this drives no buttons and explains nothing:
+        a BackgroundScan (see scanbatch.py) scans the lines on a thread of
+        its own, each with the parameters of its Section, and hands back
+        the results in batches, which StoreDocumentScans puts into the
+        text as they come, a batch in one change (see PutLinesBack). The
+        text is read-only until the scan ends; the rest of the window is
+        not, but for the scan commands themselves.
+
+        A gauge in the status bar, brought up to date every PROGRESSPOLL
+        ms by PollDocumentScan, shows how far the scan has got; Cancel
+        (button or menu) stops it before the next line, as does loading
+        or typing a new text.
+        """
+        if self.docScan: return
+        self.OnCancelBtn(dummyevent)
+        self.CancelRescan()
+        parts = self.DocumentParts()
+        total = sum([len(numbered) for (metron, linefeet, linefeetset,
+                                        numbered) in parts])
+        if not total:
+            self.E.Explain("\n\nNo unscanned lines to scan\n")
+            return
+        self.WholeText.SetReadOnly(1)
+        self.EnableDocumentCommands(False)
+        self.docTotal = total
+        self.docScanned = self.docFailed = 0
+        self.docInserted = 0			# scansion lines stored so far
+        self.ShowDocumentGauge(total)
+        scan = BackgroundScan(parts, lambda batch, finished:
+                    wx.CallAfter(self.StoreDocumentScans, scan, batch,
+                                 finished), wordIndex=self.wordIndex)
+        self.docScan = scan
+        scan.start()
+        self.docTimer.Start(PROGRESSPOLL)
+
+    def PollDocumentScan(self, evt):
+        """Show ScanWholeDocument's progress in the status bar."""
+        if not self.docScan: return
+        self.docGauge.SetValue(self.docScanned)
+        self.SetStatusText("scanned %d of %d lines" % (self.docScanned,
+                                                       self.docTotal), 2)
+
+    def ShowDocumentGauge(self, total):
+        sb = self.GetStatusBar()
+        sb.SetStatusWidths(SCANSTATUSWIDTHS)
+        self.docGauge.SetRange(total)
+        self.docGauge.SetValue(0)
+        self.PlaceDocumentGauge()
+        self.docGauge.Show()
+        self.SetStatusText("scanning %d lines" % total, 2)
+
+    def HideDocumentGauge(self):
+        self.docGauge.Hide()
+        self.GetStatusBar().SetStatusWidths(STATUSWIDTHS)
+        self.UpdateStatusBar(self.Metron, self.LineFeet, self.LineFeetSet)
+
+    def DocumentParts(self):
+        """Return the lines ScanWholeDocument should scan, as a list of
+        (metron, linefeet, linefeetset, [(line number, line)]) for each
+        run of lines with the same parameters; lines are numbered as in
+        the text panel.
+
+        Those are the lines GetNextUnscannedLine would stop at. A typed
+        text's parameters are deduced here, as a loaded one's were.
+        """
+        sections = self.Sections
+        if not self.loadedtext:
+            sections = DeduceDocument(self.TextLines(), self.forcemetron,
+                                      SM=self.SM)
+        parts = []
+        textlinenum = -1			# numbered as TextLines does
+        for linex in range(self.WholeText.GetLineCount()):
+            kind = self.WholeText.lineIndex.Kind(linex)
+            if kind == SCANSION: continue
+            textlinenum += 1
+            if kind != VERSE: continue		# blank, title, or scanned
+            line = self.WholeText.GetLine(linex).rstrip('\r\n')
+            params = self.LineParameters(sections, textlinenum)
+            if not parts or parts[-1][:3] != params:
+                parts.append(params + ([],))
+            parts[-1][3].append((linex, line))
+        return parts
+
+    def LineParameters(self, sections, textlinenum):
+        """(metron, linefeet, linefeetset) for a line, as UseSection
+        would set them for it."""
+        (metron, linefeet, linefeetset) = (self.Metron, self.LineFeet,
+                                           self.LineFeetSet)
+        section = SectionAt(sections, textlinenum)
+        if section is None and sections: section = sections[0]
+        if section:
+            if not self.forcemetron: metron = section.metron
+            if section.linefeet is not None:
+                linefeetset = section.linefeetset
+                if linefeetset: linefeet = section.linefeet
+        return metron, linefeet, linefeetset
+
+    def StoreDocumentScans(self, scan, batch, finished):
+        """Put a batch of ScanWholeDocument's results into the text, each
+        over its line as the Store button does (and marked as a failure as
+        the Scan button does); if the scan has finished, say how it went.
+
+        Results from a scan that has been cancelled are thrown away.
+        """
+        if scan is not self.docScan: return
+        scansions = []
+        for (linenum, result) in batch:
+            linenum += self.docInserted		# moved down by those stored
+            scansions.append((linenum, self.LeadOf(linenum)
+                                       + self.ScansionFor(result)))
+            if not result.success: self.docFailed += 1
+        self.docScanned += len(batch)
+        self.WholeText.SetReadOnly(0)
+        try: self.docInserted += self.WholeText.PutLinesBack(scansions)
+        finally: self.WholeText.SetReadOnly(1)
+        for (stored, (linenum, scansion)) in enumerate(scansions):
+            self.WholeText.lineIndex.MarkScanned(linenum + stored + 1)
+        if finished:
+            self.EndDocumentScan()
+            self.E.Explain("\n\nScanned %d of %d lines (%d failed);"
+                           " %d of %d lines of the text have scansions\n"
+                           % ((self.docScanned, self.docTotal, self.docFailed)
+                              + self.WholeText.ScannedCounts()))
+
+    def ScansionFor(self, result):
+        """The scansion to store for a ScanResult, as the Scan and Store
+        buttons would, failure mark and all; remembered in scanCache."""
+        scansion = result.scansion.rstrip()
+        if not result.success: scansion += '   **** '
+        self.scanCache.put(self.ScanKey(result.text, result.metron,
+                           result.linefeet, result.linefeetset), scansion)
+        return scansion
+
+    def LeadOf(self, linenum):
+        """A line's leading whitespace, for its scansion to keep too."""
+        lead = self.leadSpaceRE.match(self.WholeText.GetLine(linenum))
+        if lead: return lead.group()
+        return ''
+
+    def ScanKey(self, text, metron, linefeet, linefeetset):
+        """What the scansion of a line is remembered by in scanCache."""
+        return (text, metron, linefeet, linefeetset, self.SM.SD.version)
+
+    def ScheduleRescan(self):
+        """After an edit, wait for RESCANDELAY of quiet, then rescan any
+        lines whose scansions it has made stale (see RescanStaleLines)."""
+        if not self.WholeText.lineIndex.Count(STALE): return
+        if self.rescanTimer: self.rescanTimer.Restart(RESCANDELAY)
+        else: self.rescanTimer = wx.FutureCall(RESCANDELAY,
+                                               self.RescanStaleLines)
+
+    def RescanStaleLines(self):
+        """Scan again, in the background, the lines edited since their
+        scansions were stored, and put the new scansions in place.
+
+        The LineIndex (scandoc.py) knows which lines those are, by a hash
+        of each line's text. A line whose text and parameters were scanned
+        before gets its scansion from scanCache at once; the rest go to a
+        BackgroundScan, and StoreRescans puts what comes back in place of
+        the old scansions, over whatever lines still have that text. The
+        text stays editable all the while; a line edited meanwhile is
+        stale again, and a later rescan takes it.
+        """
+        self.rescanTimer = None
+        if self.docScan or self.rescan: return	# it will look again after
+        index = self.WholeText.lineIndex
+        sections = []
+        if self.loadedtext: sections = self.Sections
+        parts = []
+        known = []
+        linenum = index.NextLine(STALE, 0)
+        while linenum is not None:
+            line = self.WholeText.GetLine(linenum).rstrip('\r\n')
+            params = self.LineParameters(sections,
+                                         self.TextLineNumber(linenum))
+            scansion = self.scanCache.get(self.ScanKey(line.strip(),
+                                                       *params))
+            if scansion is not None: known.append((linenum, scansion))
+            else:
+                if not parts or parts[-1][:3] != params:
+                    parts.append(params + ([],))
+                parts[-1][3].append((linenum, line))
+            linenum = index.NextLine(STALE, linenum + 1)
+        for (linenum, scansion) in known:
+            self.ReplaceScansion(linenum, scansion)
+        if not parts: return
+        scan = BackgroundScan(parts, lambda batch, finished:
+                    wx.CallAfter(self.StoreRescans, scan, batch, finished),
+                    wordIndex=self.wordIndex)
+        self.rescan = scan
+        scan.start()
+
+    def StoreRescans(self, scan, batch, finished):
+        """Put a batch of RescanStaleLines's results in place."""
+        if scan is not self.rescan: return
+        for (linenum, result) in batch:
+            if linenum >= self.WholeText.GetLineCount() \
+                    or self.WholeText.GetLine(linenum).strip() != result.text:
+                continue		# edited, or moved, since
+            self.ReplaceScansion(linenum, self.ScansionFor(result))
+        if finished:
+            self.rescan = None
+            self.ScheduleRescan()		# for any edited meanwhile
+
+    def ReplaceScansion(self, linenum, scansion):
+        """Put a new scansion in place of the stale one over a line."""
+        index = self.WholeText.lineIndex
+        if index.Kind(linenum) != SCANNED: return
+        scansion = self.LeadOf(linenum) + scansion
+        readonly = self.WholeText.GetReadOnly()
+        self.WholeText.SetReadOnly(0)
+        try: self.WholeText.ReplaceLine(linenum - 1, scansion)
+        finally: self.WholeText.SetReadOnly(readonly)
+        index.MarkScanned(linenum)
+
+    def WordEdited(self, word):
+        """A word's dictionary entry has changed: rescan, in the
+        background, just the scanned lines of the text that use it.
+
+        The WordIndex knows which lines those are (any parsed since the
+        text was loaded, as every scanned line has been); a rescan under
+        way is stopped, since it used the old entry, and its lines are
+        taken again with these.
+        """
+        self.CancelRescan()
+        texts = self.wordIndex.LinesUsing(self.SM.WordsUsingEntry(
+                                                           word.lower()))
+        if texts: self.WholeText.lineIndex.MarkStale(texts)
+        self.RescanStaleLines()
+
+    def CancelRescan(self):
+        if self.rescanTimer:
+            self.rescanTimer.Stop()
+            self.rescanTimer = None
+        if self.rescan:
+            self.rescan.Cancel()
+            self.rescan = None
+
+    def CancelDocumentScan(self):
+        """Stop ScanWholeDocument; what it has stored stays stored."""
+        self.docScan.Cancel()
+        self.EndDocumentScan()
+        self.E.Explain("\n\nScanning canceled after %d of %d lines\n"
+                       % (self.docScanned, self.docTotal))
+
+    def EndDocumentScan(self):
+        self.docScan = None
+        self.docTimer.Stop()
+        self.HideDocumentGauge()
+        self.WholeText.SetReadOnly(0)
+        self.EnableDocumentCommands()
+        self.DisableAllScanButtons()
+        self.ScheduleRescan()		# if a word was edited meanwhile
+
+    def EnableDocumentCommands(self, enable=True):
+        """Enable/disable what must wait while ScanWholeDocument runs:
+        scanning the text again; Cancel, meanwhile, stops the scan.
+        (Lines can't be picked for scanning by hand; see ShowTextLine.)"""
+        self.GetMenuItem('(Scan All)').Enable(enable)
+        self.GetMenuItem('Scan whole document').Enable(enable)
+        self.GetButton('Cancel').Enable(not enable)
+        self.GetMenuItem('Cancel').Enable(not enable)
+
     def OnCancelBtn(self, evt):
         """Return all to condition before line was selected"""
+        if self.docScan: self.CancelDocumentScan()
         self.ClearWorkBoxes()
         self.WholeText.SetReadOnly(0)		# allow editing again
         p = self.WholeText.GetCurrentPos()
@@ -618,14 +903,18 @@ class ScandroidFrame(wx.Frame):
                             defaultDir=dir, defaultFile="", wildcard="*.*",
                             style=wx.OPEN | wx.CHANGE_DIR)
         if dlg.ShowModal() == wx.ID_OK:
+            if self.docScan: self.CancelDocumentScan()
             self.ClearWorkBoxes()
             self.NotesWindow.Clear()
             self.loadPath = dlg.GetPath()
             try:
                 with open(self.loadPath, 'rU') as f:
                     self.WholeText.DisplayText(f.read())
+                self.SM.ForgetLines()
+                self.CancelRescan()
+                self.WholeText.lineIndex.ForgetScansions()
                 self.loadedtext = True
-                self.forceiamb, self.forceAnap = False, False
+                self.forcemetron = 0
                 self.DeduceParameters()	# sets LineFeet, Metron, & LineFeetSet
             except:
                 self.WholeText.DisplayText('')
@@ -686,15 +975,20 @@ class ScandroidFrame(wx.Frame):
 
     def OnTypeBtn(self, evt):
         # safety check, if any scansions?? ("do you want to save...")
+        if self.docScan: self.CancelDocumentScan()
         self.loadedtext = False
         self.ClearWorkBoxes()
         self.WholeText.ClearAll()
+        self.SM.ForgetLines()
+        self.CancelRescan()
+        self.WholeText.lineIndex.ForgetScansions()
         self.WholeText.SetFocus()
         self.NotesWindow.Clear()
         s1 = 'Type lines of verse into the main text window,'
         s2 = '\nor press Load button to open a file of text'
         self.E.Explain(''.join([s1, s2]))
         self.Metron = 2
+        self.Sections = []
         self.LineFeetSet = False
         self.LineFeet = 5
         self.UpdateStatusBar(self.Metron, self.LineFeet, self.LineFeetSet)
@@ -703,101 +997,83 @@ class ScandroidFrame(wx.Frame):
 
 ## - - - - - establish major context for scansion work
     def DeduceParameters(self):
-        """When text is loaded, read multiple lines;
+        """When text is loaded, read as much of it as it takes;
         find metron and linelength.
         
-        Read all lines (up to a dozen); call SM to try a quick scansion
-        of each as iambic (both algorithms, but without stress-resolution
-        options) and as anapestic to decide consistent metron (2 or 3).
-        Guess line-length in feet under each assumption; if close average,
-        declare constant length. Set three flags as distributable globals:
-        Metron, LineFeet, and LineFeetSet (True *or* False). Metron is
-        always set (for better or worse).
+        DeduceDocument (see scandeduce.py) scores the lines of the text
+        under each metron until the votes are decisive, part by part if
+        the metre changes. Set three flags as distributable globals:
+        Metron, LineFeet, and LineFeetSet (True *or* False), from the first
+        part; ShowTextLine takes each line's own part's. Metron is always
+        set (for better or worse).
         
         Added "force" flags so this will be callable from ForceMetron.
         With one or the other set, skip non-pertinent parts.
         """
-        textlines = self.WholeText.GetLineCount()
-        iambLens, anapLens = [], []
-        iambCompTotal = anapCompTotal = 0
-        linesToSample = 12
-        theLengths = 0 # initialize the length variable
-        i = 0 # sample min of all lines (textlines) or linesToSample (break)
-        self.SM.SetLineFeet(5, False) # unset "linefeetset" for tests
-        for linex in range(textlines):	# parse lines, try various scansions
-            if i >= linesToSample: break
-            line = self.WholeText.GetLine(linex)
-            if len(line) < 5 or line[:1] == '\t': # can't use line[0] with or!
-                continue	# skip a title or other non-verse
-            i += 1	# count of "real" lines
-            self.SM.ParseLine(line)
-            if not self.forceanap:
-                try:
-                    (score, length) = self.SM.ChooseAlgorithm(self.E,
-                                                          deducingParams=True)
-                #except: self.ErrorMessage(self.SM.ChooseAlgorithm,
-                #                              self.SM.P.GetMarks())
-                except: traceback.print_exc()
-                iambCompTotal += score
-                if score < 100: iambLens.append(length)
-            if not self.forceiamb:
-                try:
-                    (score, length) = self.SM.GetBestAnapLexes(self.E,
-                                                          deducingParams=True)
-                #except: self.ErrorMessage(self.SM.GetBestAnapLexes,
-                #                               self.SM.P.GetMarks())
-                except: traceback.print_exc()
-                anapCompTotal += score
-                if score < 100: anapLens.append(length)
-        if not self.forceiamb and not self.forceanap:
-            if iambCompTotal < anapCompTotal:
-                self.Metron = 2
-                theLengths = iambLens
-                self._setLineLengthIfPossible(theLengths)
-            else:
-                self.Metron = 3
-                theLengths = anapLens
-                self._setLineLengthIfPossible(theLengths)
-            self.SetupScansionSteps(iambic=(self.Metron==2))
-        if not self.forceiamb and not self.forceanap:
+        forcemetron = self.forcemetron
+        self.Sections = DeduceDocument(self.TextLines(), forcemetron,
+                                       SM=self.SM)
+        if self.Sections:
+            first = self.Sections[0]
+            (metron, linefeet, linefeetset) = (first.metron, first.linefeet,
+                                               first.linefeetset)
+        else: (metron, linefeet, linefeetset) = (self.Metron, None, False)
+        if not forcemetron:
+            self.Metron = metron
+            self.SetupScansionSteps(metron=self.Metron)
+        if linefeet is None:
+            self.E.Explain("\nFAILED to determine verse parameters\n\n")
+        else:
+            self.LineFeetSet = linefeetset
+            if linefeetset: self.LineFeet = linefeet
+        if not forcemetron:
             self.E.ExpDeduceParams(self.Metron, self.LineFeet,
                                               self.LineFeetSet)
+        if len(self.Sections) > 1: self.E.ExpSections(self.Sections)
         self.SM.SetLineFeet(self.LineFeet, self.LineFeetSet)
         self.UpdateStatusBar(self.Metron, self.LineFeet, self.LineFeetSet)
-    
-    def _setLineLengthIfPossible(self, theLengths):
-        """If there's a clear average, set length and lengthset"""
-        total = sum(theLengths)
-        if not total or not theLengths:
-            self.E.Explain("\nFAILED to determine verse parameters\n\n")
-            return
-        (frac, integ) = modf(float(total) / len(theLengths))
-        if frac > 0.8:				# probably about right
-            self.LineFeet = int(integ) + 1
-            self.LineFeetSet = True
-        elif frac < 0.2:
-            self.LineFeet = int(integ)
-            self.LineFeetSet = True
-        else: self.LineFeetSet = False
+
+    def UseSection(self, section):
+        """Take the parameters of one part of the text (see DeduceParameters)
+        for the lines in it."""
+        if section is None: section = self.Sections[0]
+        if not self.forcemetron and section.metron != self.Metron:
+            self.Metron = section.metron
+            self.SetupScansionSteps(metron=self.Metron)
+        if section.linefeet is not None:
+            self.LineFeetSet = section.linefeetset
+            if section.linefeetset: self.LineFeet = section.linefeet
+        self.SM.SetLineFeet(self.LineFeet, self.LineFeetSet)
+        self.UpdateStatusBar(self.Metron, self.LineFeet, self.LineFeetSet)
+
+    def TextLines(self):
+        """Generate (number, line) for each line of the text that isn't a
+        stored scansion, numbered as if there were none, so that storing
+        scansions doesn't move lines out of their Sections."""
+        textlinenum = 0
+        for linex in range(self.WholeText.GetLineCount()):
+            if self.WholeText.IsScanLine(linex): continue
+            yield textlinenum, self.WholeText.GetLine(linex)
+            textlinenum += 1
+
+    def TextLineNumber(self, linenum):
+        """Number a line of the text as TextLines does."""
+        return linenum - self.WholeText.lineIndex.Count(SCANSION, linenum)
 
     def ForceMetron(self, evt):
         """Menu-only choice to force scansion
-        iambic/anapestic till next Load."""
+        iambic/anapestic/trochaic/dactylic till next Load."""
         self.OnCancelBtn(dummyevent)	# before msg or will be erased
         which = evt.GetId()
-        if which == self.menuItemIDs['Force anapestics']:
-            self.Metron = 3
-            self.forceanap = True; self.forceiamb = False
-            self.E.Explain("\nForced switch to anapestic scansion\n")
-            self.SetupScansionSteps(iambic=False)
-            self.DeduceParameters()
-        elif which == self.menuItemIDs['Force iambics']:
-            self.Metron = 2
-            self.forceiamb = True; self.forceanap = False
-            self.E.Explain("\nForced switch to iambic scansion\n")
-            self.SetupScansionSteps(iambic=True)
-            self.DeduceParameters()
+        for metron in METRONS:
+            name = metronNames[metron].lower()
+            if which == self.menuItemIDs['Force ' + name + 's']: break
         else: return
+        self.Metron = metron
+        self.forcemetron = metron
+        self.E.Explain("\nForced switch to %s scansion\n" % name)
+        self.SetupScansionSteps(metron=metron)
+        self.DeduceParameters()
         if self.LineFeetSet:
             self.E.Explain("implied line length is %s feet\n\n"
                                                 % self.LineFeet)
@@ -819,14 +1095,14 @@ class ScandroidFrame(wx.Frame):
         elif which == self.menuItemIDs['Force iambic alg. 2']:
             self.whichAlgorithm = 2
             self.E.Explain("\n\nAlgorithm 2 forced")
+        elif which == self.menuItemIDs['Force iambic alg. 3']:
+            self.whichAlgorithm = 3
+            self.E.Explain("\n\nAlgorithm 3 forced")
         else: return
-        self.SetupScansionSteps(iambic=True,
-                                algorithm1=(self.whichAlgorithm == 1))
+        self.SetupScansionSteps(iambic=True, algorithm=self.whichAlgorithm)
                                 
     def SwitchIambicAlg(self):
-        if self.whichAlgorithm == 1:
-            self.whichAlgorithm = 2
-        else: self.whichAlgorithm = 1
+        self.whichAlgorithm = fallbackAlgorithm[self.whichAlgorithm]
 
 # - - - - - - - - - - - end of ScandroidFrame class - - - - - - - - - - - -
 
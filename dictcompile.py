@@ -0,0 +1,180 @@
+# dictcompile.py 1.5
+#
+# the Scandroid
+# Copyright (C) 2005 Charles Hartman
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version. See the accompanying file, gpl.txt, for full
+# details.
+# OSI Certified Open Source Software
+#
+# This module compiles a dictionary of syllables and stresses into a compact
+# binary file, and holds the class that looks words up in such a file by
+# memory-mapping it. The dictionary in scandictionary.py is built as a
+# Python dict at import, which is fine for its few hundred exceptions; a
+# full pronouncing lexicon of 100,000 words is not, so for that we compile
+# once and then search the file in place, without making Python objects of
+# anything but the words actually looked up:
+#
+#     python dictcompile.py -o lexicon.scd [--builtin] [lexicon.txt ...]
+#
+# A lexicon text file has one word per line, the word and then its syllables
+# separated by spaces, the stressed one ALL CAPS, just as typed in the
+# Scandroid's dictionary-editing dialog:
+#
+#     abroad a BROAD
+#
+# Lines beginning with '#' are ignored. Later entries override earlier ones.
+#
+# The file: an 8-byte magic string, a count of entries, a table of (count+1)
+# offsets, then the entries, sorted by word, each "word\tsyl syl syl" in
+# UTF-8. All numbers are unsigned 32-bit little-endian. Lookup is a binary
+# search of the offsets.
+
+import sys
+import mmap
+import struct
+
+MAGIC = 'SCNDICT1'
+HEADER = struct.Struct('<8sI')
+OFFSET = struct.Struct('<I')
+
+
+class CompiledDict:
+    """Read-only mapping of words to syllable lists, searched in a file.
+
+    Supports what ScanDict's users ask of a dict: 'in', [], get, has_key.
+    Assignments (from ScanDict.EditDict) are kept in a small dict of edits
+    in front of the file; as with the built-in dictionary, they are not
+    saved.
+    """
+    def __init__(self, path):
+        self.path = path
+        f = open(path, 'rb')
+        try:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        (magic, self.count) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a compiled Scandroid dictionary"
+                             % path)
+        self.table = HEADER.size
+        self.data = self.table + (self.count + 1) * OFFSET.size
+        self.edits = {}
+
+    def _offset(self, i):
+        return self.data + OFFSET.unpack_from(self.mm,
+                                              self.table + i * OFFSET.size)[0]
+
+    def _find(self, word):
+        """Binary search; return the syllables part of the entry, or None."""
+        if isinstance(word, unicode): word = word.encode('utf-8')
+        lo, hi = 0, self.count
+        mm = self.mm
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._offset(mid)
+            tab = mm.find('\t', start)
+            key = mm[start:tab]
+            if key < word: lo = mid + 1
+            elif key > word: hi = mid
+            else: return mm[tab+1:self._offset(mid + 1)]
+        return None
+
+    def __getitem__(self, word):
+        if word in self.edits: return self.edits[word]
+        syls = self._find(word)
+        if syls is None: raise KeyError(word)
+        return syls.decode('utf-8').split(' ')
+
+    def __contains__(self, word):
+        return word in self.edits or self._find(word) is not None
+
+    has_key = __contains__
+
+    def get(self, word, default=None):
+        try: return self[word]
+        except KeyError: return default
+
+    def __setitem__(self, word, syls):
+        self.edits[word] = syls
+
+    def __len__(self): return self.count
+
+    def close(self):
+        self.mm.close()
+
+
+## - - - - - the build step
+
+def ReadLexicon(f, entries):
+    """Add the entries of a lexicon text file to a dict; return # rejected.
+
+    An entry is rejected if its syllables don't spell the word (the rule
+    the dictionary relies on; a final '*' marks a stress-ambiguous
+    monosyllable and isn't counted).
+    """
+    rejected = 0
+    for line in f:
+        line = line.decode('utf-8').strip()
+        if not line or line[0] == '#': continue
+        fields = line.split()
+        word, syls = fields[0].lower(), fields[1:]
+        if not syls or ''.join(syls).rstrip('*').lower() != word:
+            rejected += 1
+            continue
+        entries[word] = syls
+    return rejected
+
+def CompileDict(entries, path):
+    """Write a dict of word -> syllable list as a compiled dictionary file."""
+    records = []
+    for (word, syls) in entries.iteritems():
+        records.append((word.encode('utf-8'),
+                        ' '.join(syls).encode('utf-8')))
+    records.sort()
+    out = open(path, 'wb')
+    try:
+        out.write(HEADER.pack(MAGIC, len(records)))
+        offset = 0
+        for (word, syls) in records:
+            out.write(OFFSET.pack(offset))
+            offset += len(word) + 1 + len(syls)
+        out.write(OFFSET.pack(offset))
+        for (word, syls) in records:
+            out.write(word + '\t' + syls)
+    finally:
+        out.close()
+    return len(records)
+
+def main(argv=None):
+    import optparse
+    parser = optparse.OptionParser(
+        usage="%prog -o OUTFILE [--builtin] [lexicon.txt ...]",
+        description="Compile lexicon text files (or the built-in dictionary)"
+                    " into a dictionary file for the Scandroid's --dict.")
+    parser.add_option('-o', '--output', help="compiled dictionary to write")
+    parser.add_option('-b', '--builtin', action='store_true',
+                      help="start from the entries of scandictionary.py"
+                           " (the default when no lexicon is given)")
+    (options, args) = parser.parse_args(argv)
+    if not options.output: parser.error("no output file given")
+    entries = {}
+    if options.builtin or not args:
+        from scandictionary import scandict
+        entries.update(scandict)
+    for name in args:
+        f = open(name, 'rU')
+        try: rejected = ReadLexicon(f, entries)
+        finally: f.close()
+        if rejected:
+            sys.stderr.write("%s: %d entries rejected\n" % (name, rejected))
+    count = CompileDict(entries, options.output)
+    sys.stderr.write("%d entries written to %s\n" % (count, options.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
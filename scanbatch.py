@@ -0,0 +1,574 @@
+# scanbatch.py 1.5
+#
+# the Scandroid
+# Copyright (C) 2005 Charles Hartman
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version. See the accompanying file, gpl.txt, for full
+# details.
+# OSI Certified Open Source Software
+#
+# This module runs the ScansionMachine without any window at all, so that
+# whole files of verse can be scanned from the command line:
+#
+#     python scanbatch.py [options] [file ...]
+#
+# It reads the files (or standard input) a line at a time and writes one
+# result per verse line as soon as it has it, so a corpus of any size can
+# be streamed through. The LineScanner class does for each line what the
+# Frame's Scan button does, step by step, including the switch to the other
+# iambic algorithm when one fails; nothing here needs wx.
+#
+# With --jobs, lines are dealt out in chunks to a pool of worker processes,
+# each with its own LineScanner (and so its own Syllabizer, Positioner and
+# ScanDict); results come back, and are written, in input order. The Frame
+# scans a whole document the same way, on a thread of its own, with a
+# BackgroundScan.
+
+import sys, time
+import random
+import threading
+import multiprocessing
+from itertools import islice, chain
+import traceback
+import json
+from scanstrings import *
+from scanfuncs import *
+
+MAXLINELEN = 450		# the Frame refuses longer lines too (ShowTextLine)
+CHUNKSIZE = 64			# lines handed to a worker process at a time
+BATCHLINES = 32			# results a BackgroundScan hands back at a time
+
+
+class ScanResult:
+    """What became of one line: scansion, feet, and whether it succeeded.
+
+    Everything here is plain data (strings, numbers, lists), so a result
+    can go between processes or out as JSON (AsDict) without any scraping
+    of the display strings.
+    """
+    def __init__(self, text, linenum=0):
+        self.text = text
+        self.linenum = linenum
+        self.metron = 0
+        self.linefeet = 5		# and the line length it was scanned for
+        self.linefeetset = True
+        self.scansion = ''		# spaced marks, to stand over the text
+        self.marks = ''			# unspaced, with foot divisions
+        self.stresses = ''		# unspaced, one mark per syllable
+        self.words = []			# syllables of each word, stress in CAPS
+        self.feet = []
+        self.promotions = []		# indices of syllables promoted ('%')
+        self.complexity = 100		# lower is more regular; 100 is failure
+        self.success = False
+        self.steps = []			# StepRecords, if the scanner keeps them
+
+    def AsDict(self):
+        """Return the result (less any StepRecords) as a dict for JSON."""
+        return {'text': self.text, 'linenum': self.linenum,
+                'metron': metronNames.get(self.metron, self.metron),
+                'scansion': self.scansion, 'marks': self.marks,
+                'stresses': self.stresses, 'words': self.words,
+                'feet': self.feet, 'promotions': self.promotions,
+                'complexity': self.complexity, 'success': self.success}
+
+
+class LineScanner:
+    """Drive one ScansionMachine through all the steps for each line.
+
+    This is the Frame's OnStepBtn/OnScanBtn logic without the buttons. The
+    parameters (metron, feet per line) are either given or deduced from a
+    sample of lines, as the Frame does when a text is loaded.
+    """
+    def __init__(self, metron=2, linefeet=5, linefeetset=True, logger=None,
+                 dictpath=None, algorithms=None, recordsteps=False):
+        self.SM = ScansionMachine(dictpath)
+        if algorithms: self.SM.iambicAlgorithms = tuple(algorithms)
+        self.steps = None		# this line's StepRecords, if we keep them
+        if recordsteps:
+            self.steps = []
+            self.SM.AddStepHook(self.steps.append)
+        if logger: self.E = logger
+        else: self.E = NullExplainer()
+        self.SetParameters(metron, linefeet, linefeetset)
+
+    def SetParameters(self, metron, linefeet, linefeetset):
+        self.Metron = metron
+        self.LineFeet = linefeet
+        self.LineFeetSet = linefeetset
+        self.SM.SetLineFeet(linefeet, linefeetset)
+
+    def DeduceParameters(self, lines, forcemetron=0):
+        """Set our parameters from a sample of lines; see SM.DeduceParameters.
+
+        If no line could be scanned, the old line length stays.
+        """
+        (metron, linefeet, linefeetset) = self.SM.DeduceParameters(lines,
+                                                    self.E, forcemetron)
+        if linefeet is None: (linefeet, linefeetset) = (self.LineFeet,
+                                                        self.LineFeetSet)
+        self.SetParameters(metron, linefeet, linefeetset)
+
+    def ScanLine(self, linetext, linenum=0):
+        """Perform all scansion steps on one line; return a ScanResult."""
+        result = ScanResult(linetext.strip(), linenum)
+        (result.metron, result.linefeet, result.linefeetset) = (self.Metron,
+                                          self.LineFeet, self.LineFeetSet)
+        if len(result.text) > MAXLINELEN: return result
+        if self.steps is not None: del self.steps[:]
+        try:
+            result.success = self._runSteps(result.text)
+        except:
+            traceback.print_exc()
+            result.success = False
+        result.scansion = self.SM.P.GetScanString()
+        result.marks = self.SM.P.GetMarks(includeFeet=True)
+        result.stresses = self.SM.P.GetMarks()
+        result.words = [syls[:] for syls in self.SM.lineWords]
+        result.feet = self.SM.LD.data['footlist'][:]
+        result.promotions = [i for (i, mark) in enumerate(result.stresses)
+                             if mark == '%']
+        if result.success:
+            try: result.complexity = self.SM.LineComplexity(self.Metron)
+            except: traceback.print_exc()
+        if self.steps is not None: result.steps = self.steps[:]
+        return result
+
+    def _runSteps(self, text):
+        """The loop of the Frame's Scan button; return success or failure."""
+        iambic = (self.Metron == IAMBIC)
+        self.SM.ParseLine(text)
+        whichAlgorithm = random.randint(1, 2)		# begin at random
+        oneIambicAlgFailed = False
+        steps = self.SM.GetScansionSteps(iambic, whichAlgorithm, self.Metron)
+        step = 0
+        while step < len(steps):
+            (scanline, result) = self.SM.RunStep(steps[step][0],
+                                                 steps[step][1], self.E)
+            if iambic and step == FORKSTEP - 1:		# ChooseAlgorithm
+                if not scanline: return False
+                whichAlgorithm = result
+                steps = self.SM.GetScansionSteps(True, whichAlgorithm,
+                                                 self.Metron)
+                step += 1
+            elif not result:		# some step FAILED
+                if not iambic or oneIambicAlgFailed: return False
+                oneIambicAlgFailed = True
+                self.SM.RestartNewIambicAlg(self.E, whichAlgorithm, scanline)
+                whichAlgorithm = fallbackAlgorithm[whichAlgorithm]
+                steps = self.SM.GetScansionSteps(True, whichAlgorithm,
+                                                 self.Metron)
+                step = FORKSTEP
+            else: step += 1
+        return True
+
+
+## - - - - - scanning many lines, in one process or several
+
+_worker = {}		# each process's own LineScanner, and the random seed
+
+def _initWorker(metron, linefeet, linefeetset, seed, dictpath, algorithms,
+                recordsteps):
+    """Pool initializer: build (and so warm up) this process's scanner.
+
+    A scanner already built with the same dictionary, algorithms and
+    recording is kept, caches and all, and just given the new parameters;
+    so in one process the parts of a text (see DeduceParts) share one.
+    """
+    made = (dictpath, algorithms, recordsteps)
+    if _worker.get('made') == made:
+        _worker['scanner'].SetParameters(metron, linefeet, linefeetset)
+    else:
+        _worker['scanner'] = LineScanner(metron, linefeet, linefeetset,
+                                dictpath=dictpath, algorithms=algorithms,
+                                recordsteps=recordsteps)
+        _worker['made'] = made
+    _worker['seed'] = seed
+
+def _scanItem(item):
+    """Scan one (line number, line) pair if it's verse; None if it isn't.
+
+    With a seed, the random choices for a line depend only on the seed and
+    the line number, so results don't depend on which process got the line.
+    """
+    (linenum, line) = item
+    if not IsVerseLine(line): return None
+    if _worker['seed'] is not None:
+        random.seed(_worker['seed'] * 1000003 + linenum)
+    return _worker['scanner'].ScanLine(line, linenum)
+
+def ScanAll(numberedlines, metron, linefeet, linefeetset, jobs=1, seed=None,
+            dictpath=None, algorithms=None, recordsteps=False):
+    """Generator yielding (line number, line, ScanResult or None) in order.
+
+    With more than one job, lines are scanned out of order by a pool of
+    processes. Input is taken a block at a time, and the next block is
+    already being scanned while this one is written, so memory stays
+    bounded however long the input is.
+    """
+    params = (metron, linefeet, linefeetset, seed, dictpath, algorithms,
+              recordsteps)
+    if jobs < 2:
+        _initWorker(*params)
+        for item in numberedlines:
+            yield item[0], item[1], _scanItem(item)
+        return
+    pool = multiprocessing.Pool(jobs, _initWorker, params)
+    try:
+        blocksize = jobs * CHUNKSIZE * 4
+        block = list(islice(numberedlines, blocksize))
+        pending = pool.map_async(_scanItem, block, CHUNKSIZE)
+        while block:
+            nextblock = list(islice(numberedlines, blocksize))
+            if nextblock:
+                nextpending = pool.map_async(_scanItem, nextblock, CHUNKSIZE)
+            for (item, result) in zip(block, pending.get()):
+                yield item[0], item[1], result
+            block = nextblock
+            if nextblock: pending = nextpending
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class BackgroundScan(threading.Thread):
+    """Scan parts of a document on a thread of its own.
+
+    Parts are (metron, linefeet, linefeetset, numbered lines), as from
+    DeduceParts. Results are handed to deliver(batch, finished), from this
+    thread, a batch of (line number, ScanResult) at a time; the Frame
+    passes them on with wx.CallAfter. The last call has finished True, and
+    comes however the scan ends. Cancel stops the scan before its next
+    line, and nothing scanned after it is delivered.
+
+    In one job, the lines are scanned by a LineScanner of the thread's own,
+    not ScanAll's, so that one scan can run while another part of the
+    program uses scanbatch; in more, by ScanAll's pool. In one job, the
+    lines parsed are added to wordIndex, if given (see scandoc.py).
+    """
+    def __init__(self, parts, deliver, jobs=1, dictpath=None,
+                 algorithms=None, wordIndex=None):
+        threading.Thread.__init__(self, name='BackgroundScan')
+        self.setDaemon(True)		# don't keep a closed window's process
+        self.parts = parts
+        self.deliver = deliver
+        self.jobs = jobs
+        self.dictpath = dictpath
+        self.algorithms = algorithms
+        self.wordIndex = wordIndex
+        self.cancelled = threading.Event()
+
+    def Cancel(self): self.cancelled.set()
+
+    def Cancelled(self): return self.cancelled.isSet()
+
+    def run(self):
+        batch = []
+        try:
+            scanner = None
+            if self.jobs < 2:
+                scanner = LineScanner(dictpath=self.dictpath,
+                                      algorithms=self.algorithms)
+                # the shared memo isn't safe to use from two threads
+                scanner.SM.footMemo = LRUCache(FOOTMEMOSIZE)
+                scanner.SM.wordIndex = self.wordIndex
+            for (metron, linefeet, linefeetset, numbered) in self.parts:
+                if scanner:
+                    scanner.SetParameters(metron, linefeet, linefeetset)
+                    scans = self._scanHere(scanner, numbered)
+                else: scans = ScanAll(numbered, metron, linefeet,
+                                      linefeetset, self.jobs, None,
+                                      self.dictpath, self.algorithms)
+                try:
+                    for (linenum, line, result) in scans:
+                        if self.Cancelled(): return
+                        if result is None: continue
+                        batch.append((linenum, result))
+                        if len(batch) >= BATCHLINES:
+                            self.deliver(batch, False)
+                            batch = []
+                finally: scans.close()		# and so ScanAll's pool
+        except: traceback.print_exc()
+        finally:
+            if self.Cancelled(): batch = []
+            self.deliver(batch, True)
+
+    def _scanHere(self, scanner, numbered):
+        for (linenum, line) in numbered:
+            if self.Cancelled(): return		# before, not after, the work
+            if IsVerseLine(line): yield linenum, line, scanner.ScanLine(line,
+                                                                   linenum)
+            else: yield linenum, line, None
+
+
+class StepSummary:
+    """Totals of the StepRecords of many lines, by step and by ambiguity.
+
+    Shows which steps, and which kinds of line, take the time.
+    """
+    def __init__(self):
+        self.names = []			# steps in the order first seen
+        self.bystep = {}		# name -> [calls, failures, seconds, max]
+        self.byambig = {}		# resolutions -> [steps, seconds]
+
+    def Add(self, records):
+        for r in records:
+            if r.name not in self.bystep:
+                self.names.append(r.name)
+                self.bystep[r.name] = [0, 0, 0.0, 0.0]
+            totals = self.bystep[r.name]
+            totals[0] += 1
+            if not r.success: totals[1] += 1
+            totals[2] += r.seconds
+            totals[3] = max(totals[3], r.seconds)
+            totals = self.byambig.setdefault(r.ambiguities, [0, 0.0])
+            totals[0] += 1
+            totals[1] += r.seconds
+
+    def Report(self, out):
+        out.write("%-26s %7s %7s %9s %9s %9s\n" % ('step', 'calls', 'failed',
+                                        'total ms', 'mean us', 'max us'))
+        for name in self.names:
+            (calls, failures, seconds, longest) = self.bystep[name]
+            out.write("%-26s %7d %7d %9.1f %9.1f %9.1f\n" % (name, calls,
+                      failures, seconds * 1e3, seconds / calls * 1e6,
+                      longest * 1e6))
+        out.write("%-26s %7s %9s\n" % ('stress resolutions', 'steps',
+                                       'total ms'))
+        for ambigs in sorted(self.byambig):
+            (calls, seconds) = self.byambig[ambigs]
+            out.write("%-26d %7d %9.1f\n" % (ambigs, calls, seconds * 1e3))
+
+
+def ChooseParameters(numberedlines, metron=0, linefeet=0, dictpath=None,
+                     algorithms=None, sample=12):
+    """Settle (metron, linefeet, linefeetset) for some lines.
+
+    What isn't given is deduced from the first `sample` verse lines, as
+    the Frame does when a text is loaded. Return the parameters and a list
+    of the (line number, line) pairs read ahead to find the sample, which
+    the caller must scan before going on with numberedlines.
+    """
+    sampled = _sampleLines(numberedlines, sample)
+    if metron and linefeet: return metron, linefeet, True, sampled
+    scanner = LineScanner(dictpath=dictpath, algorithms=algorithms)
+    scanner.DeduceParameters((line for (n, line) in sampled
+                              if IsSampleLine(line)), metron)
+    if linefeet: scanner.SetParameters(scanner.Metron, linefeet, True)
+    return scanner.Metron, scanner.LineFeet, scanner.LineFeetSet, sampled
+
+def DeduceParts(numberedlines, metron=0, linefeet=0, sections=True, jobs=1,
+                seed=None, dictpath=None, algorithms=None):
+    """Settle parameters from the whole text, as scandeduce does.
+
+    Return a list of (metron, linefeet, linefeetset, numbered lines) for
+    each part of the text in its own metre (with sections), or for all of
+    it; what is given is kept for every part. Only as many lines are read
+    ahead as the deduction needs, and they are given back in the parts.
+    """
+    if metron and linefeet: return [(metron, linefeet, True, numberedlines)]
+    from scandeduce import DeduceDocument
+    read = []
+    def remember(items):
+        for item in items:
+            read.append(item)
+            yield item
+    found = DeduceDocument(remember(numberedlines), metron, jobs, sections,
+                           seed=seed, dictpath=dictpath,
+                           algorithms=algorithms)
+    if not found: return [(metron or IAMBIC, linefeet or 5, bool(linefeet),
+                           chain(read, numberedlines))]
+    parts = []
+    for (inx, section) in enumerate(found):
+        if inx + 1 < len(found): end = found[inx + 1].firstline
+        else: end = None
+        if linefeet: (feet, feetset) = (linefeet, True)
+        elif section.linefeet is None: (feet, feetset) = (5, False)
+        else: (feet, feetset) = (section.linefeet, section.linefeetset)
+        mine = [item for item in read if (inx == 0 or item[0] >=
+                section.firstline) and (end is None or item[0] < end)]
+        if end is None: mine = chain(mine, numberedlines)
+        parts.append((section.metron, feet, feetset, iter(mine)))
+    return parts
+
+def ScanLines(lines, metron=0, linefeet=0, jobs=1, seed=None, dictpath=None,
+              algorithms=None):
+    """Generator yielding a ScanResult for each verse line of an iterable.
+
+    Lines (str or unicode, with or without line ends) are pulled only as
+    they are needed, so input of any size goes through in constant memory.
+    A metron (IAMBIC, ANAPESTIC, TROCHAIC, DACTYLIC; see scanstrings) or
+    feet per line not given are deduced from the first dozen verse lines.
+    Other arguments are as for ScanAll.
+    """
+    numbered = ((n + 1, line.rstrip('\r\n'))
+                for (n, line) in enumerate(lines))
+    (metron, linefeet, linefeetset, sampled) = ChooseParameters(numbered,
+                                    metron, linefeet, dictpath, algorithms)
+    for (linenum, line, result) in ScanAll(chain(sampled, numbered), metron,
+                                           linefeet, linefeetset, jobs, seed,
+                                           dictpath, algorithms):
+        if result is not None: yield result
+
+
+## - - - - - reading and writing for the command line
+
+def IsVerseLine(line):
+    """Would the Frame's GetNextUnscannedLine stop at this line?
+
+    Not blank, not a "title" (beginning with a tab), and not itself a
+    stored scansion.
+    """
+    if not line or line.isspace() or line[0] == '\t': return False
+    return line.find(STRESS) == -1 and line.find(SYLMARK) == -1
+
+def IsSampleLine(line):
+    """Would DeduceParameters count this line? A verse line, and not one
+    too short (under 5 characters) to say anything about the metre."""
+    return len(line) >= 5 and IsVerseLine(line)
+
+def ReadLines(filenames, encoding='utf-8'):
+    """Generator yielding (line number, unicode line) from files or stdin."""
+    if not filenames: filenames = ['-']
+    for name in filenames:
+        if name == '-': f = sys.stdin
+        else: f = open(name, 'rU')
+        try:
+            for linenum, line in enumerate(f):
+                yield linenum + 1, line.rstrip('\r\n').decode(encoding,
+                                                              'replace')
+        finally:
+            if f is not sys.stdin: f.close()
+
+def FormatResult(result, format='tsv', lead=''):
+    """Return the output line(s) for one ScanResult.
+
+    The 'text' format stores the scansion over its line as the Frame's Store
+    button does, keeping the line's leading whitespace (lead). The 'json'
+    format is one object per line, as ScanResult.AsDict.
+    """
+    if format == 'json': return json.dumps(result.AsDict())
+    if format == 'text':
+        scansion = result.scansion.rstrip()
+        if not result.success: scansion += '   **** '
+        return lead + scansion + '\n' + lead + result.text
+    if result.success: status = 'ok'
+    else: status = 'FAIL'
+    return '\t'.join([str(result.linenum), result.marks,
+                      ' | '.join(result.feet),
+                      metronNames[result.metron], status])
+
+def _sampleLines(numberedlines, sample):
+    """Read ahead just far enough to see `sample` lines to deduce from."""
+    seen = []
+    for item in numberedlines:
+        seen.append(item)
+        if IsSampleLine(item[1]):
+            sample -= 1
+            if not sample: break
+    return seen
+
+def main(argv=None):
+    import optparse
+    parser = optparse.OptionParser(usage="%prog [options] [file ...]",
+        description="Scan lines of verse from files (or standard input) "
+                    "without the Scandroid's window, one result per line.")
+    parser.add_option('-m', '--metron', choices=[name.lower() for name
+                                                 in metronNames.values()],
+                      help="force the basic foot (default: deduce it)")
+    parser.add_option('-f', '--feet', type='int',
+                      help="force the number of feet per line")
+    parser.add_option('-d', '--dict', metavar='FILE',
+                      help="use a dictionary compiled by dictcompile.py")
+    parser.add_option('-e', '--encoding', default='utf-8',
+                      help="encoding of the input [%default]")
+    parser.add_option('--format', choices=['tsv', 'text', 'json'],
+                      default='tsv',
+                      help="tsv: line number, marks, feet, metron, ok/FAIL;"
+                           " text: scansion above each line;"
+                           " json: everything, an object per line"
+                           " [%default]")
+    parser.add_option('-j', '--jobs', type='int', default=1,
+                      help="worker processes; 0 for one per CPU [%default]")
+    parser.add_option('--seed', type='int',
+                      help="seed the random choices, for repeatable runs")
+    parser.add_option('--step-times', action='store_true',
+                      help="report time and failures for each step")
+    parser.add_option('-a', '--algorithm', type='choice',
+                      choices=['1', '2', '3'], action='append',
+                      help="iambic algorithm to choose from (repeatable;"
+                           " default: 1 and 2). 3, the least-cost division,"
+                           " is used only if given, alone or with others")
+    parser.add_option('--deduce', choices=['sample', 'document', 'sections'],
+                      default='sample',
+                      help="what to deduce the parameters not forced from:"
+                           " the first dozen lines; as much of the text as"
+                           " it takes; or all of it, part by part where"
+                           " the metre changes [%default]")
+    (options, args) = parser.parse_args(argv)
+    if options.jobs < 1: options.jobs = multiprocessing.cpu_count()
+    if options.seed is not None: random.seed(options.seed)
+    forcemetron = 0
+    for (metron, name) in metronNames.items():
+        if options.metron == name.lower(): forcemetron = metron
+    if options.algorithm:
+        algorithms = tuple(sorted(set(int(a) for a in options.algorithm)))
+    else: algorithms = None
+    lines = ReadLines(args, options.encoding)
+    if options.deduce == 'sample':
+        (metron, linefeet, linefeetset, sampled) = ChooseParameters(lines,
+                        forcemetron, options.feet, options.dict, algorithms)
+        parts = [(metron, linefeet, linefeetset, chain(sampled, lines))]
+    else:
+        parts = DeduceParts(lines, forcemetron, options.feet,
+                            options.deduce == 'sections', options.jobs,
+                            options.seed, options.dict, algorithms)
+    out = sys.stdout
+    numlines = failures = 0
+    summary = StepSummary()
+    starttime = time.time()
+    for (linenum, line, result) in chain(*[ScanAll(numbered, metron,
+                                  linefeet, linefeetset, options.jobs,
+                                  options.seed, options.dict, algorithms,
+                                  options.step_times) for (metron, linefeet,
+                                  linefeetset, numbered) in parts]):
+        if result is None:		# not a verse line
+            if options.format == 'text' and line.find(STRESS) == -1 \
+                                        and line.find(SYLMARK) == -1:
+                out.write(line.encode(options.encoding) + '\n')
+            continue			# old scansions are replaced, not copied
+        numlines += 1
+        if not result.success: failures += 1
+        if options.step_times: summary.Add(result.steps)
+        lead = line[:len(line) - len(line.lstrip())]
+        out.write(FormatResult(result, options.format, lead).encode(
+                                              options.encoding) + '\n')
+    elapsed = time.time() - starttime
+    if elapsed > 0: rate = numlines / elapsed
+    else: rate = 0.0
+    sys.stderr.write("%d lines (%d failed) in %.2f sec: %.1f lines/sec\n"
+                     % (numlines, failures, elapsed, rate))
+    if options.step_times: summary.Report(sys.stderr)
+    if options.jobs < 2 and 'scanner' in _worker:	# one, for every part;
+						# workers keep their own
+        SM = _worker['scanner'].SM
+        for (name, cache) in (('word cache', SM.wordCache),
+                              ('parse cache', SM.parseCache),
+                              ('foot memo', SM.footMemo)):
+            stats = cache.stats()
+            sys.stderr.write("%s: %d hits, %d misses, %d evictions"
+                             " (%.1f%% hits)\n" % (name, stats['hits'],
+                             stats['misses'], stats['evictions'],
+                             stats['hitrate'] * 100))
+        if SM.footTable:
+            stats = SM.footTable.stats()
+            sys.stderr.write("foot table: %d hits, %d misses (%.1f%% hits)\n"
+                             % (stats['hits'], stats['misses'],
+                                stats['hitrate'] * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
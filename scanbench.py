@@ -0,0 +1,407 @@
+# scanbench.py 1.5
+#
+# the Scandroid
+# Copyright (C) 2005 Charles Hartman
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version. See the accompanying file, gpl.txt, for full
+# details.
+# OSI Certified Open Source Software
+#
+# This module times each stage of the scansion pipeline separately over a
+# fixed corpus of verse, so that a change meant to speed up one of them can
+# be measured, and a change meant to speed up none of them can be caught:
+#
+#     python scanbench.py [--repeat N] [--save base.json]
+#     python scanbench.py --compare base.json
+#
+# Results are written as JSON (to standard output, or --save FILE). With
+# --compare, each stage is also set against the same stage in a stored
+# result, and the exit status is 1 if any is slower than --tolerance allows.
+# Every stage is run --repeat times and the fastest run is reported, since
+# the slower runs measure the rest of the machine more than the Scandroid;
+# on a busy machine, raise --repeat before believing a small difference.
+# The memo of foot divisions and the cache of parsed lines are emptied
+# before every run, so what a run saves by them is only what the corpus
+# repeats within itself. The table of
+# foot divisions (scantable.py) is used as in scansion, unless --no-table.
+#
+# Every run also checks that DeduceParameters and DeduceDocument find the
+# right metre for each corpus, falling ones included; a wrong one is
+# reported under "deduced", and the exit status is 1. So it is if the foot
+# table divides any short line of marks otherwise than the code now does
+# (see CheckFootTable); the count is reported under "stale". And so it
+# is if Syllabizer.SyllabizeMany, run on several threads at once, gives any
+# word of the corpora or the dictionary other syllables than Syllabize;
+# those are counted under "syllabized".
+#
+# The corpus is public domain: Shakespeare's Sonnet 18 and the opening of
+# Paradise Lost for iambics, the first stanzas of Byron's "The Destruction
+# of Sennacherib" for anapestics, and (only for the check) the opening
+# lines of Longfellow's "Hiawatha" for trochaics and of his "Evangeline"
+# for dactylics.
+
+import sys
+import gc
+import random
+import threading
+import timeit
+import json
+from scanstrings import *
+from scanfuncs import *
+from scandeduce import DeduceDocument
+from scantable import CheckFootTable
+
+IAMBIC_CORPUS = [
+    "Shall I compare thee to a summer's day?",
+    "Thou art more lovely and more temperate:",
+    "Rough winds do shake the darling buds of May,",
+    "And summer's lease hath all too short a date;",
+    "Sometime too hot the eye of heaven shines,",
+    "And often is his gold complexion dimm'd;",
+    "And every fair from fair sometime declines,",
+    "By chance or nature's changing course untrimm'd;",
+    "But thy eternal summer shall not fade,",
+    "Nor lose possession of that fair thou ow'st;",
+    "Nor shall Death brag thou wander'st in his shade,",
+    "When in eternal lines to time thou grow'st:",
+    "So long as men can breathe or eyes can see,",
+    "So long lives this, and this gives life to thee.",
+    "Of Man's first disobedience, and the fruit",
+    "Of that forbidden tree whose mortal taste",
+    "Brought death into the World, and all our woe,",
+    "With loss of Eden, till one greater Man",
+    "Restore us, and regain the blissful seat,",
+    "Sing, Heavenly Muse, that, on the secret top",
+    "Of Oreb, or of Sinai, didst inspire",
+    "That shepherd who first taught the chosen seed",
+    "In the beginning how the heavens and earth",
+    "Rose out of Chaos: or, if Sion hill",
+    "Delight thee more, and Siloa's brook that flowed",
+    "Fast by the oracle of God, I thence",
+    "Invoke thy aid to my adventurous song,",
+    "That with no middle flight intends to soar",
+    "Above th' Aonian mount, while it pursues",
+    "Things unattempted yet in prose or rhyme."]
+
+ANAPESTIC_CORPUS = [
+    "The Assyrian came down like the wolf on the fold,",
+    "And his cohorts were gleaming in purple and gold;",
+    "And the sheen of their spears was like stars on the sea,",
+    "When the blue wave rolls nightly on deep Galilee.",
+    "Like the leaves of the forest when Summer is green,",
+    "That host with their banners at sunset were seen:",
+    "Like the leaves of the forest when Autumn hath blown,",
+    "That host on the morrow lay withered and strown.",
+    "For the Angel of Death spread his wings on the blast,",
+    "And breathed in the face of the foe as he passed;",
+    "And the eyes of the sleepers waxed deadly and chill,",
+    "And their hearts but once heaved, and for ever grew still!"]
+
+TROCHAIC_CORPUS = [
+    "Should you ask me, whence these stories?",
+    "Whence these legends and traditions,",
+    "With the odours of the forest,",
+    "With the dew and damp of meadows,",
+    "With the curling smoke of wigwams,",
+    "With the rushing of great rivers,",
+    "With their frequent repetitions,",
+    "And their wild reverberations,",
+    "As of thunder in the mountains?",
+    "I should answer, I should tell you,",
+    "From the forests and the prairies,",
+    "From the great lakes of the Northland,"]
+
+DACTYLIC_CORPUS = [
+    "This is the forest primeval. The murmuring pines and the hemlocks,",
+    "Bearded with moss, and in garments green, indistinct in the twilight,",
+    "Stand like Druids of eld, with voices sad and prophetic,",
+    "Stand like harpers hoar, with beards that rest on their bosoms.",
+    "Loud from its rocky caverns, the deep-voiced neighboring ocean",
+    "Speaks, and in accents disconsolate answers the wail of the forest.",
+    "This is the forest primeval; but where are the hearts that beneath it",
+    "Leaped like the roe, when he hears in the woodland the voice of the"
+        " huntsman?",
+    "Where is the thatch-roofed village, the home of Acadian farmers,",
+    "Men whose lives glided on like rivers that water the woodlands,",
+    "Darkened by shadows of earth, but reflecting an image of heaven?",
+    "Waste are those pleasant farms, and the farmers forever departed!"]
+
+# each corpus with the metron deduction must find for it
+DEDUCTIONS = [('iambic', IAMBIC_CORPUS, IAMBIC),
+              ('anapestic', ANAPESTIC_CORPUS, ANAPESTIC),
+              ('trochaic', TROCHAIC_CORPUS, TROCHAIC),
+              ('dactylic', DACTYLIC_CORPUS, DACTYLIC)]
+
+REPEAT = 5
+TOLERANCE = 0.20	# slower than baseline by more than this is a regression
+SEED = 1		# the same random tie-breaks in every run
+WORDPASSES = 20		# word stages are quick; time enough to measure
+
+
+def _corpusWords(lines, distinct=True):
+    """Return the words of some lines, lowercased, in order; each only
+    once if distinct."""
+    SM = ScansionMachine()
+    words = []
+    for line in lines:
+        for w in SM.wordBoundsRE.split(line):
+            w = SM._stripPunct(w).lower()
+            if not w or not SM.vowelRE.search(w): continue
+            if not distinct or w not in words: words.append(w)
+    return words
+
+## - - - - - the stages; each returns (seconds, calls) for one run
+
+def _timePerLine(SM, lines, call, lfeet, parse=True):
+    """Time call() once for each line, after an untimed ParseLine."""
+    clock = timeit.default_timer
+    total = 0.0
+    for line in lines:
+        SM.SetLineFeet(lfeet, True)
+        if parse: SM.ParseLine(line)
+        start = clock()
+        call(line)
+        total += clock() - start
+    return total, len(lines)
+
+def BenchParseLine(SM, logger):
+    SM.wordCache.clear()		# every word looked up afresh at first
+    SM.parseCache.clear()		# and every line parsed afresh
+    return _timePerLine(SM, IAMBIC_CORPUS + ANAPESTIC_CORPUS,
+                        SM.ParseLine, 5, parse=False)
+
+def _timePerWord(call):
+    """Time call(word) for each word of the corpus, WORDPASSES times."""
+    words = _corpusWords(IAMBIC_CORPUS + ANAPESTIC_CORPUS)
+    start = timeit.default_timer()
+    for i in range(WORDPASSES):
+        for w in words: call(w)
+    return timeit.default_timer() - start, len(words) * WORDPASSES
+
+def BenchSyllabize(SM, logger):
+    return _timePerWord(SM.S.Syllabize)
+
+def BenchSyllabizeMany(SM, logger):
+    """Syllabize the corpus's words as they come, repeats and all, in one
+    batch; timed per word, to set beside Syllabize."""
+    words = _corpusWords(IAMBIC_CORPUS + ANAPESTIC_CORPUS, distinct=False)
+    start = timeit.default_timer()
+    for i in range(WORDPASSES): SM.S.SyllabizeMany(words)
+    return timeit.default_timer() - start, len(words) * WORDPASSES
+
+def BenchDictLookup(SM, logger):
+    return _timePerWord(SM._dictLookup)
+
+def BenchChooseAlgorithm(SM, logger):
+    return _timePerLine(SM, IAMBIC_CORPUS,
+                lambda line: SM.ChooseAlgorithm(logger, deducingParams=True),
+                5)
+
+def _benchDoAlgorithm(algorithm):
+    def bench(SM, logger):
+        return _timePerLine(SM, IAMBIC_CORPUS,
+                lambda line: SM.DoAlgorithm(algorithm, SM.P.GetMarks()), 5)
+    return bench
+
+def BenchGetBestAnapLexes(SM, logger):
+    return _timePerLine(SM, ANAPESTIC_CORPUS,
+                lambda line: SM.GetBestAnapLexes(logger, deducingParams=True),
+                4)
+
+def BenchScanAnapestics(SM, logger):
+    return _timePerLine(SM, ANAPESTIC_CORPUS,
+                lambda line: SM.scanAnapestics(SM.P.GetMarks()), 4)
+
+def BenchDeduceParameters(SM, logger):
+    start = timeit.default_timer()
+    SM.DeduceParameters(IAMBIC_CORPUS, logger)
+    SM.DeduceParameters(ANAPESTIC_CORPUS, logger)
+    return timeit.default_timer() - start, 2
+
+def BenchDeduceDocument(SM, logger):
+    start = timeit.default_timer()
+    DeduceDocument(enumerate(IAMBIC_CORPUS), SM=SM)
+    DeduceDocument(enumerate(ANAPESTIC_CORPUS), SM=SM)
+    return timeit.default_timer() - start, 2
+
+STAGES = [('ParseLine', BenchParseLine),
+          ('Syllabize', BenchSyllabize),
+          ('SyllabizeMany', BenchSyllabizeMany),
+          ('_dictLookup', BenchDictLookup),
+          ('ChooseAlgorithm', BenchChooseAlgorithm),
+          ('DoAlgorithm 1', _benchDoAlgorithm(1)),
+          ('DoAlgorithm 2', _benchDoAlgorithm(2)),
+          ('DoAlgorithm 3', _benchDoAlgorithm(3)),
+          ('GetBestAnapLexes', BenchGetBestAnapLexes),
+          ('scanAnapestics', BenchScanAnapestics),
+          ('DeduceParameters', BenchDeduceParameters),
+          ('DeduceDocument', BenchDeduceDocument)]
+
+## - - - - - running, saving, comparing
+
+def CheckDeductions():
+    """Deduce the metron of each corpus, by DeduceParameters and by
+    DeduceDocument; return {corpus: {'DeduceParameters': name, ...}} and
+    a list of the (corpus, deducer) pairs that got it wrong."""
+    logger = NullExplainer()
+    deduced = {}
+    wrong = []
+    for (corpus, lines, metron) in DEDUCTIONS:
+        SM = ScansionMachine()
+        random.seed(SEED)
+        found = {'DeduceParameters': SM.DeduceParameters(lines, logger)[0]}
+        sections = DeduceDocument(enumerate(lines), SM=SM)
+        if sections: found['DeduceDocument'] = sections[0].metron
+        else: found['DeduceDocument'] = None
+        deduced[corpus] = {}
+        for (deducer, got) in found.items():
+            deduced[corpus][deducer] = metronNames.get(got, got)
+            if got != metron: wrong.append((corpus, deducer))
+    return deduced, wrong
+
+def CheckSyllabizeMany(threads=4):
+    """Syllabize every word of the corpora and the dictionary one by one,
+    and by SyllabizeMany on several threads sharing one Syllabizer at once
+    (while this thread goes on with Syllabize); return the words on which
+    any thread's answer differs."""
+    SM = ScansionMachine()
+    expected = {}
+    for w in _corpusWords([line for (corpus, lines, metron) in DEDUCTIONS
+                           for line in lines]) + sorted(SM.SD.Dict):
+        try: expected[w] = SM.S.Syllabize(w)
+        except AttributeError: pass	# one it chokes on, e.g. 'quest'
+    words = sorted(expected)
+    answers = [None] * threads
+    def work(n):
+        answers[n] = SM.S.SyllabizeMany(words[n:] + words[:n])
+    workers = [threading.Thread(target=work, args=(n,))
+               for n in range(threads)]
+    for t in workers: t.start()
+    for w in words: SM.S.Syllabize(w)
+    for t in workers: t.join()
+    wrong = set()
+    for got in answers:
+        if got is None: return sorted(expected)		# a thread failed
+        wrong.update([w for w in expected if got.get(w) != expected[w]])
+        if len(got) != len(expected): wrong.add(None)
+    return sorted(wrong)
+
+def RunBenchmarks(stagenames=None, repeat=REPEAT, usetable=True):
+    """Time the stages (all, or those named); return a JSON-ready dict.
+
+    Each stage gets a fresh ScansionMachine, one untimed run to warm it up,
+    and then `repeat` timed runs, of which the fastest counts. As with
+    timeit, garbage collection is off while a stage runs. Unless usetable,
+    the machine divides every line into feet itself.
+    """
+    logger = NullExplainer()
+    stages = {}
+    for (name, bench) in STAGES:
+        if stagenames and name not in stagenames: continue
+        SM = ScansionMachine()
+        if not usetable: SM.footTable = None
+        SM.footMemo.clear()
+        random.seed(SEED)
+        bench(SM, logger)
+        best = None
+        gcwason = gc.isenabled()
+        gc.disable()
+        try:
+            for i in range(repeat):
+                random.seed(SEED)
+                SM.footMemo.clear()	# each run finds its own repeats
+                SM.parseCache.clear()
+                (seconds, calls) = bench(SM, logger)
+                if best is None or seconds < best: best = seconds
+        finally:
+            if gcwason: gc.enable()
+        stages[name] = {'seconds': best, 'calls': calls,
+                        'usec_per_call': best / calls * 1e6}
+    return {'python': sys.version.split()[0], 'repeat': repeat,
+            'table': bool(usetable and footTable),
+            'lines': {'iambic': len(IAMBIC_CORPUS),
+                      'anapestic': len(ANAPESTIC_CORPUS)},
+            'stages': stages}
+
+def CompareResults(results, baseline, tolerance=TOLERANCE, out=sys.stderr):
+    """Report each stage against the baseline; return names of slower ones.
+
+    A stage is slower if its time per call is more than (1 + tolerance)
+    times the baseline's. Stages missing from either side are skipped.
+    """
+    regressions = []
+    out.write("%-18s %12s %12s %8s\n" % ('stage', 'base usec', 'now usec',
+                                         'ratio'))
+    for (name, bench) in STAGES:
+        if name not in results['stages'] or name not in baseline['stages']:
+            continue
+        now = results['stages'][name]['usec_per_call']
+        base = baseline['stages'][name]['usec_per_call']
+        if base: ratio = now / base
+        else: ratio = 1.0
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  SLOWER'
+            regressions.append(name)
+        elif ratio < 1 - tolerance: flag = '  faster'
+        out.write("%-18s %12.1f %12.1f %8.2f%s\n" % (name, base, now,
+                                                     ratio, flag))
+    return regressions
+
+def main(argv=None):
+    import optparse
+    parser = optparse.OptionParser(usage="%prog [options]",
+        description="Time each stage of the Scandroid's scansion over a "
+                    "fixed corpus; write the results as JSON.")
+    parser.add_option('-r', '--repeat', type='int', default=REPEAT,
+                      help="timed runs of each stage; the fastest counts"
+                           " [%default]")
+    parser.add_option('-s', '--stage', action='append',
+                      choices=[name for (name, bench) in STAGES],
+                      help="time only this stage (repeatable)")
+    parser.add_option('--no-table', dest='table', action='store_false',
+                      default=True,
+                      help="divide lines into feet without the foot table")
+    parser.add_option('--save', metavar='FILE',
+                      help="write the results to FILE, not standard output")
+    parser.add_option('--compare', metavar='FILE',
+                      help="compare with results saved earlier")
+    parser.add_option('--tolerance', type='float', default=TOLERANCE,
+                      help="allowed slowdown against --compare [%default]")
+    (options, args) = parser.parse_args(argv)
+    results = RunBenchmarks(options.stage, max(options.repeat, 1),
+                            options.table)
+    (results['deduced'], wrong) = CheckDeductions()
+    if footTable: results['stale'] = len(CheckFootTable(footTable))
+    results['syllabized'] = len(CheckSyllabizeMany())
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if options.save:
+        f = open(options.save, 'w')
+        try: f.write(text + '\n')
+        finally: f.close()
+    else: print text
+    status = 0
+    for (corpus, deducer) in sorted(wrong):
+        sys.stderr.write("%s deduced %s for the %s corpus\n" % (deducer,
+                         results['deduced'][corpus][deducer], corpus))
+        status = 1
+    if results.get('stale'):
+        sys.stderr.write("the foot table is stale for %d lines of marks;"
+                         " rebuild it (scantable.py)\n" % results['stale'])
+        status = 1
+    if results['syllabized']:
+        sys.stderr.write("SyllabizeMany differs from Syllabize on %d words\n"
+                         % results['syllabized'])
+        status = 1
+    if options.compare:
+        f = open(options.compare)
+        try: baseline = json.load(f)
+        finally: f.close()
+        if CompareResults(results, baseline, options.tolerance): return 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# scandeduce.py 1.5
+#
+# the Scandroid
+# Copyright (C) 2005 Charles Hartman
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version. See the accompanying file, gpl.txt, for full
+# details.
+# OSI Certified Open Source Software
+#
+# This module deduces the metre and line length of a whole document, where
+# ScansionMachine.DeduceParameters looks only at its first dozen lines. The
+# verse lines are streamed through (a pool of worker processes, with
+# jobs > 1), each scored under every metron by ScoreMetres, and each line
+# votes for the metron that scans it best and for its length in feet under
+# each. The votes are counted as they come in, and reading stops as soon as
+# they are decisive: when the leading metron has a majority of the votes,
+# and the commonest length has a majority or clearly hasn't, each with
+# the given confidence (by the Wilson score interval, which behaves well
+# for the few lines of a short poem).
+#
+# With sections, the counting is done stanza by stanza (verse lines between
+# blank lines or titles); a stanza's remaining lines are skipped once its
+# votes are decisive, and neighbouring stanzas in the same metre are joined
+# into sections, so that a text whose metre changes partway through gets
+# parameters for each part. Without, the whole text is one section, and
+# reading stops as soon as that is decided.
+
+import random
+import multiprocessing
+from math import sqrt, erf
+from scanstrings import *
+from scanfuncs import *
+from scanbatch import IsVerseLine, IsSampleLine, CHUNKSIZE
+
+CONFIDENCE = 0.99	# how sure the votes must be before we stop counting
+MAJORITY = 0.5		# share of the votes that decides a metron or length
+MINSECTION = 3		# lines; a shorter stanza joins the section before it
+
+
+def ConfidenceZ(confidence):
+    """The z such that a normal variable is below z with this probability."""
+    low, high = 0.0, 10.0
+    for i in range(60):			# bisection; erf is all math gives us
+        z = (low + high) / 2
+        if 0.5 * (1 + erf(z / sqrt(2))) < confidence: low = z
+        else: high = z
+    return (low + high) / 2
+
+def WilsonBounds(successes, trials, z):
+    """Return (lower, upper) bounds of the Wilson score interval for the
+    proportion of successes in trials."""
+    if not trials: return 0.0, 1.0
+    p = float(successes) / trials
+    zz = z * z
+    centre = p + zz / (2 * trials)
+    margin = z * sqrt(p * (1 - p) / trials + zz / (4 * trials * trials))
+    return ((centre - margin) / (1 + zz / trials),
+            (centre + margin) / (1 + zz / trials))
+
+
+class MetreTally:
+    """The running count of votes from scored lines.
+
+    Each line adds its scores under each metron, a vote for the metron that
+    scored it lowest (if any could scan it at all; ties go as in
+    ChooseMetron), and a vote for its length in feet under each metron
+    that could scan it.
+    """
+    def __init__(self):
+        self.lines = 0			# lines counted
+        self.votes = {}			# metron -> lines it scanned best
+        self.totals = {}		# metron -> total of its scores
+        self.lengths = {}		# metron -> {feet: lines}
+
+    def Add(self, scores):
+        """Count one line's {metron: (score, length)} from ScoreMetres."""
+        self.lines += 1
+        for (metron, (score, length)) in scores.items():
+            self.totals[metron] = self.totals.get(metron, 0) + score
+            if score < 100:
+                lengths = self.lengths.setdefault(metron, {})
+                lengths[length] = lengths.get(length, 0) + 1
+        VoteMetron(self.votes, dict([(m, score) for (m, (score, length))
+                                     in scores.items()]))
+
+    def Merge(self, other):
+        """Add another tally's counts to ours."""
+        self.lines += other.lines
+        for (metron, n) in other.votes.items():
+            self.votes[metron] = self.votes.get(metron, 0) + n
+        for (metron, n) in other.totals.items():
+            self.totals[metron] = self.totals.get(metron, 0) + n
+        for (metron, lengths) in other.lengths.items():
+            ours = self.lengths.setdefault(metron, {})
+            for (length, n) in lengths.items():
+                ours[length] = ours.get(length, 0) + n
+
+    def Metron(self):
+        """The metron with most votes; a tie goes to the lowest total."""
+        return ChooseVotedMetron(self.votes, self.totals)
+
+    def MetronBounds(self, z):
+        """Bounds on the share of the votes the leading metron has."""
+        return WilsonBounds(self.votes.get(self.Metron(), 0),
+                            sum(self.votes.values()), z)
+
+    def LineLength(self, metron, z):
+        """Return (linefeet, linefeetset, bounds) under the metron.
+
+        The length is the commonest one (the shorter, on a tie); it is set
+        if its share of the votes is surely a majority. Linefeet is None if
+        no line scanned under the metron.
+        """
+        lengths = self.lengths.get(metron)
+        if not lengths: return None, False, (0.0, 1.0)
+        most = max(lengths.values())
+        linefeet = min([length for (length, n) in lengths.items()
+                        if n == most])
+        bounds = WilsonBounds(most, sum(lengths.values()), z)
+        return linefeet, bounds[0] > MAJORITY, bounds
+
+    def Decided(self, z):
+        """Are the votes decisive, so that more lines would change nothing?"""
+        if self.MetronBounds(z)[0] <= MAJORITY: return False
+        (linefeet, linefeetset, bounds) = self.LineLength(self.Metron(), z)
+        return linefeetset or bounds[1] < MAJORITY
+
+
+class Section:
+    """Lines firstline to lastline (numbers as given) and the parameters
+    deduced for them: metron, linefeet (None if no line scanned) and
+    linefeetset, as from ScansionMachine.DeduceParameters; and the tally
+    they came from, with confidence, the least share of the votes the
+    metron can be said to have.
+    """
+    def __init__(self, firstline, lastline, tally, z):
+        self.firstline = firstline
+        self.lastline = lastline
+        self.tally = tally
+        self.metron = tally.Metron()
+        (self.linefeet, self.linefeetset, bounds) = tally.LineLength(
+                                                           self.metron, z)
+        self.confidence = tally.MetronBounds(z)[0]
+
+    def __repr__(self):
+        return '<Section %s-%s %s %s%s, %d lines>' % (self.firstline,
+                    self.lastline, metronNames[self.metron], self.linefeet,
+                    ('?', '')[self.linefeetset], self.tally.lines)
+
+def SectionAt(sections, linenum):
+    """The section a line number falls in (or after); None if before all."""
+    found = None
+    for section in sections:
+        if section.firstline > linenum: break
+        found = section
+    return found
+
+
+## - - - - - scoring lines, in one process or several
+
+_worker = {}		# each process's own ScansionMachine and settings
+
+def _initScorer(forcemetron, seed, dictpath, algorithms, SM=None):
+    """Pool initializer: build this process's ScansionMachine (or, in
+    one process, use the caller's)."""
+    if SM is None: SM = ScansionMachine(dictpath)
+    if algorithms: SM.iambicAlgorithms = tuple(algorithms)
+    _worker['SM'] = SM
+    _worker['logger'] = NullExplainer()
+    if forcemetron: _worker['metrons'] = (forcemetron,)
+    else: _worker['metrons'] = METRONS
+    _worker['seed'] = seed
+
+def _scoreItem(item):
+    """Score one (line number, line) under every metron, as
+    DeduceParameters does; with a seed, as scanbatch._scanItem."""
+    (linenum, line) = item
+    SM = _worker['SM']
+    if _worker['seed'] is not None:
+        random.seed(_worker['seed'] * 1000003 + linenum)
+    SM.SetLineFeet(5, False)		# unset "linefeetset" for tests
+    SM.ParseLine(line.strip())
+    return SM.ScoreMetres(_worker['logger'], _worker['metrons'])
+
+def _stanzas(numberedlines):
+    """Generate (line number, line, stanza number) for each line to vote
+    (see IsSampleLine), numbering the stanzas as blank lines and titles
+    divide them; a verse line too short to vote doesn't divide them."""
+    stanza = 0
+    inVerse = False
+    for (linenum, line) in numberedlines:
+        if IsSampleLine(line):
+            inVerse = True
+            yield linenum, line, stanza
+        elif inVerse and not IsVerseLine(line):
+            inVerse = False
+            stanza += 1
+
+def DeduceDocument(numberedlines, forcemetron=0, jobs=1, sections=True,
+                   confidence=CONFIDENCE, seed=None, dictpath=None,
+                   algorithms=None, SM=None):
+    """Deduce parameters for (line number, line) pairs; return Sections.
+
+    Lines are read only until the votes are decisive (see above), or to
+    the end with sections. With a forcemetron, only the line length is in
+    question. The results are the same for any number of jobs: lines
+    scored ahead of a decision are simply not counted. In one process,
+    the lines are scored by SM if given (as the Frame's own, with its
+    edited dictionary), else by a new ScansionMachine.
+    """
+    z = ConfidenceZ(confidence)
+    params = (forcemetron, seed, dictpath, algorithms)
+    if jobs < 2:
+        _initScorer(*params + (SM,))
+        pool = None
+        blocksize = 1
+    else:
+        pool = multiprocessing.Pool(jobs, _initScorer, params)
+        blocksize = jobs * CHUNKSIZE
+    stanzas = []		# [firstline, lastline, tally, decided]
+    lines = _stanzas(numberedlines)
+    try:
+        while True:
+            # gather a block of lines that still need scoring
+            block = []
+            for (linenum, line, stanza) in lines:
+                if not sections: stanza = 0
+                if stanza == len(stanzas):
+                    stanzas.append([linenum, linenum, MetreTally(), False])
+                stanzas[stanza][1] = linenum
+                if not stanzas[stanza][3]:
+                    block.append((stanza, (linenum, line)))
+                    if len(block) >= blocksize: break
+            if not block: break
+            items = [item for (stanza, item) in block]
+            if pool: results = pool.map(_scoreItem, items, CHUNKSIZE)
+            else: results = [_scoreItem(item) for item in items]
+            for ((stanza, item), scores) in zip(block, results):
+                if stanzas[stanza][3]: continue	# decided ahead of this
+                stanzas[stanza][2].Add(scores)
+                stanzas[stanza][3] = stanzas[stanza][2].Decided(z)
+            if not sections and stanzas[0][3]: break
+        if pool: pool.close()
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+    # join stanzas in the same metre, and short ones to their neighbours
+    joined = []			# [firstline, lastline, tally]
+    for (firstline, lastline, tally, decided) in stanzas:
+        if not tally.lines: continue
+        if joined and (tally.Metron() == joined[-1][2].Metron()
+                       or tally.lines < MINSECTION
+                       or joined[-1][2].lines < MINSECTION):
+            joined[-1][1] = lastline
+            joined[-1][2].Merge(tally)
+        else: joined.append([firstline, lastline, tally])
+    return [Section(firstline, lastline, tally, z)
+            for (firstline, lastline, tally) in joined]
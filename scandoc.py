@@ -0,0 +1,199 @@
+# scandoc.py 1.5
+#
+# the Scandroid
+# Copyright (C) 2005 Charles Hartman
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version. See the accompanying file, gpl.txt, for full
+# details.
+# OSI Certified Open Source Software
+#
+# This module keeps track of what each line of the text panel is, so that
+# the STC can find the next line to scan, or count the lines scanned,
+# without reading the lines again. The LineIndex holds a kind for every
+# line (blank, title, verse, scansion, or verse with its scansion over it)
+# and, for each kind, a FenwickTree of which lines are of it; the STC tells
+# it of every change to the text (see MyTextSTC.OnModified), and it looks
+# again only at the lines changed. A change within lines costs O(log n);
+# one that adds or removes lines rebuilds the trees, in O(n) but in one
+# pass with no calls back to the STC. Nothing here needs wx.
+#
+# It also knows which scansions have gone stale. When a scansion is stored
+# over a line, MarkScanned records that the scansion (by a hash of its
+# text) was made for that line (by a hash of its); a scanned line whose
+# scansion is known to have been made for other text is STALE, which is
+# kept in a tree like the kinds; but since marking one line can change
+# any other line with the same scansion over it, the tree is made again,
+# in one pass, when next asked for after a marking that told it anything
+# new. Going by content, not line numbers, this survives any change to
+# the text around the lines, even a whole SetText; a scansion typed or
+# loaded, or edited by hand, is not known, and never stale.
+#
+# The WordIndex is the other way round: for each word, the lines that use
+# it, fed by ScansionMachine.ParseLine. When a word's dictionary entry is
+# edited, the Frame asks it which lines those are, and LineIndex.MarkStale
+# makes just those lines' scansions stale, for the rescan to take.
+
+import threading
+from scanstrings import *
+from scanutilities import FenwickTree
+
+BLANK, TITLE, VERSE, SCANSION, SCANNED = range(5)
+KINDS = (BLANK, TITLE, VERSE, SCANSION, SCANNED)
+STALE = 5		# not a kind: a SCANNED line its scansion wasn't made for
+
+
+def IsScansion(line):
+    """Does this line of text hold scansion marks?"""
+    return line.find(STRESS) != -1 or line.find(SYLMARK) != -1
+					# NOT a sophisticated test
+
+def LineKind(line):
+    """BLANK, TITLE, SCANSION or VERSE, for a line by itself; a VERSE line
+    under a SCANSION is SCANNED, but that is the LineIndex's business."""
+    if IsScansion(line): return SCANSION
+    if not line or line.isspace(): return BLANK
+    if line[0] == '\t': return TITLE
+    return VERSE
+
+def LineHash(line):
+    """What a line's text is known by, leading and trailing space aside."""
+    return hash(line.strip())
+
+
+class LineIndex:
+    """The kind of every line of a text, and where the lines of each kind
+    are, and which are STALE; lines are numbered from 0, as in the STC."""
+    def __init__(self, lines=('',)):
+        self.madeFor = {}	# scansion's LineHash -> set of its lines' ones
+        self.Reset(lines)
+
+    def Reset(self, lines):
+        self.kinds = [LineKind(line) for line in lines]	# as LineKind says
+        self.hashes = [LineHash(line) for line in lines]
+        self._build()
+
+    def _build(self):
+        counts = dict([(kind, [0] * len(self.kinds)) for kind in KINDS])
+        for linenum in range(len(self.kinds)):
+            counts[self.Kind(linenum)][linenum] = 1
+        self.trees = dict([(kind, FenwickTree(counts[kind]))
+                           for kind in KINDS])
+        self.trees[STALE] = None		# see _tree
+
+    def _tree(self, kind):
+        if self.trees[kind] is None:
+            self.trees[kind] = FenwickTree([int(self.IsStale(linenum))
+                                    for linenum in range(len(self.kinds))])
+        return self.trees[kind]
+
+    def __len__(self): return len(self.kinds)
+
+    def Kind(self, linenum):
+        kind = self.kinds[linenum]
+        if kind == VERSE and linenum > 0 \
+                         and self.kinds[linenum - 1] == SCANSION:
+            return SCANNED
+        return kind
+
+    def IsStale(self, linenum):
+        """Is the line scanned, by a scansion made for other text?"""
+        if self.Kind(linenum) != SCANNED: return False
+        made = self.madeFor.get(self.hashes[linenum - 1])
+        return made is not None and self.hashes[linenum] not in made
+
+    def Replace(self, first, count, lines):
+        """Lines first to first+count-1 have become the given lines."""
+        if len(lines) != count:
+            self.kinds[first:first + count] = [LineKind(line)
+                                               for line in lines]
+            self.hashes[first:first + count] = [LineHash(line)
+                                                for line in lines]
+            self._build()
+            return
+        for (linenum, line) in enumerate(lines):
+            self._setLine(first + linenum, LineKind(line), LineHash(line))
+
+    def _setLine(self, linenum, kind, linehash):
+        if (kind, linehash) == (self.kinds[linenum], self.hashes[linenum]):
+            return
+        affected = [n for n in (linenum, linenum + 1) if n < len(self.kinds)]
+        self._count(affected, -1)
+        self.kinds[linenum] = kind
+        self.hashes[linenum] = linehash
+        self._count(affected, 1)
+
+    def _count(self, linenums, delta):
+        for n in linenums:
+            self.trees[self.Kind(n)].Add(n, delta)
+            if self.trees[STALE] is not None and self.IsStale(n):
+                self.trees[STALE].Add(n, delta)
+
+    def MarkScanned(self, linenum):
+        """The scansion over this line has just been made for it."""
+        made = self.madeFor.setdefault(self.hashes[linenum - 1], set())
+        if self.hashes[linenum] in made: return
+        made.add(self.hashes[linenum])
+        self.trees[STALE] = None
+
+    def MarkStale(self, texts):
+        """Make stale every scanned line with one of these texts."""
+        hashes = set([LineHash(text) for text in texts])
+        for linenum in range(1, len(self.kinds)):
+            if self.hashes[linenum] in hashes \
+                    and self.Kind(linenum) == SCANNED:
+                self.madeFor.setdefault(self.hashes[linenum - 1],
+                                        set()).discard(self.hashes[linenum])
+        self.trees[STALE] = None
+
+    def ForgetScansions(self):
+        """A new text: no scansion in it was made here."""
+        self.madeFor = {}
+        self._build()
+
+    def NextLine(self, kind, linenum):
+        """The first line of the kind (or STALE) at or after linenum, or
+        None."""
+        tree = self._tree(kind)
+        found = tree.Find(tree.Sum(max(linenum, 0)))
+        if found >= len(self.kinds): return None
+        return found
+
+    def Count(self, kind, end=None):
+        """How many lines (before line end) are of the kind."""
+        if end is None: end = len(self.kinds)
+        return self._tree(kind).Sum(min(max(end, 0), len(self.kinds)))
+
+
+class WordIndex:
+    """The lines (by text, so that edits elsewhere don't move them) that
+    use each word, lowercased as ParseLine looks it up.
+
+    ScansionMachines on other threads (as a BackgroundScan's) may feed the
+    same index as the Frame's, so it keeps a lock.
+    """
+    def __init__(self):
+        self.lines = {}		# word -> set of stripped line texts
+        self.lock = threading.Lock()
+
+    def AddLine(self, line, words):
+        line = line.strip()
+        self.lock.acquire()
+        try:
+            for word in words: self.lines.setdefault(word, set()).add(line)
+        finally: self.lock.release()
+
+    def LinesUsing(self, words):
+        """The texts of the lines that use any of the words."""
+        self.lock.acquire()
+        try:
+            found = set()
+            for word in words: found.update(self.lines.get(word, ()))
+            return found
+        finally: self.lock.release()
+
+    def Clear(self):
+        self.lock.acquire()
+        try: self.lines = {}
+        finally: self.lock.release()
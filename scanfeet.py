@@ -0,0 +1,145 @@
+# scanfeet.py 1.5
+#
+# the Scandroid
+# Copyright (C) 2005 Charles Hartman
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version. See the accompanying file, gpl.txt, for full
+# details.
+# OSI Certified Open Source Software
+#
+# This module compiles the feet defined in scanstrings (footDict for iambics,
+# AnapSubs for anapestics, TrochSubs and DactSubs for trochaics and dactylics,
+# and the points each metron charges for them) into one registry, once, at
+# import. Every foot gets a number, its marks and
+# length are kept in lists by number, and each metron's points for it in a
+# dict by name, so nothing needs to invert a dict to learn how long a foot
+# is or strip parentheses to learn what it costs.
+#
+# The registry also recognizes feet in a line of marks without cutting the
+# line into substrings. A line of marks is read as one number in base 4
+# ('x' 0, '/' 1, '%' 2, anything else 3), so the marks from any position
+# for any length are a few of its digits, got by shifting and masking; each
+# metron has a list, indexed by length and those digits, of the foot (if
+# any) with just those marks.
+
+import string
+from scanstrings import *
+
+MAXFOOT = 4			# syllables in the longest foot
+_digits = string.maketrans(''.join([chr(c) for c in range(256)]),
+                           ''.join([{'x': '0', '/': '1', '%': '2'}.get(chr(c),
+                                                '3') for c in range(256)]))
+# where the feet of each length begin in a table; and masks for their digits
+_offset = [(4 ** length - 1) // 3 for length in range(MAXFOOT + 2)]
+_mask = [(1 << 2 * length) - 1 for length in range(MAXFOOT + 1)]
+TABLESIZE = _offset[MAXFOOT + 1]	# places in a table of feet
+
+def LineCode(marks):
+    """Return the number a line of marks is read as (see above)."""
+    if not marks: return 0
+    if isinstance(marks, unicode): marks = marks.encode('ascii', 'replace')
+    return int(marks.translate(_digits), 4)
+
+def CodeIndex(code, numsyls, pos, length):
+    """Where, in a table of feet, to find marks[pos:pos+length] of the line
+    of numsyls marks whose LineCode is code. Length must be 0 to MAXFOOT
+    and pos+length no more than numsyls.
+    """
+    return _offset[length] + ((code >> 2 * (numsyls - pos - length))
+                              & _mask[length])
+
+def MarksIndex(marks):
+    """Where, in a table of feet, to find these marks."""
+    return CodeIndex(LineCode(marks), len(marks), 0, len(marks))
+
+
+class FootRegistry:
+    """Every foot the Scandroid knows, numbered, with its length and
+    its points (a measure of irregularity) under each metron.
+
+    Names in parentheses are feet with a promoted stress ('(iamb)' is
+    'x%'); see Unpromoted.
+    """
+    def __init__(self):
+        self.names = []			# foot number -> name
+        self.ids = {}			# name -> foot number
+        self.marks = []			# foot number -> marks
+        self.lengths = []		# foot number -> syllables
+        self.tables = {}		# metron -> CodeIndex -> foot number or -1
+        self.points = {}		# metron -> name -> points
+
+    def Register(self, name, marks):
+        """Number a foot (once); return its number."""
+        if name in self.ids:
+            if self.marks[self.ids[name]] != marks:
+                raise ValueError("foot %s has two sets of marks" % name)
+            return self.ids[name]
+        if not 0 < len(marks) <= MAXFOOT:
+            raise ValueError("foot %s is too long" % name)
+        self.ids[name] = len(self.names)
+        self.names.append(name)
+        self.marks.append(marks)
+        self.lengths.append(len(marks))
+        return self.ids[name]
+
+    def AddSubstitutions(self, metron, subs):
+        """Register the feet a metron allows, from a dict marks -> name."""
+        table = self.tables.setdefault(metron, [-1] * TABLESIZE)
+        for (marks, name) in subs.items():
+            table[MarksIndex(marks)] = self.Register(name, marks)
+
+    def AddPoints(self, metron, points, unpromote=False):
+        """Set a metron's points for its feet, from a dict name -> points;
+        feet not in it cost nothing. If unpromote, a promoted foot costs
+        what the foot without parentheses does.
+        """
+        if unpromote: named = Unpromoted
+        else: named = lambda name: name
+        self.points[metron] = dict([(name, points.get(named(name), 0))
+                                    for name in self.names])
+
+    def Length(self, name):
+        return self.lengths[self.ids[name]]
+
+    def Find(self, metron, marks):
+        """Return the name of the metron's foot with these marks, or ''."""
+        if not 0 < len(marks) <= MAXFOOT: return ''
+        foot = self.tables[metron][MarksIndex(marks)]
+        if foot < 0: return ''
+        return self.names[foot]
+
+    def Divide(self, metron, marks, chunksize, startpoint, endpoint):
+        """Generator of the names of successive feet of chunksize syllables
+        from startpoint to endpoint, each with the index after it; where
+        the marks are no foot (or the line runs out), yield ('', index).
+        """
+        table = self.tables[metron]
+        numsyls = len(marks)
+        code = LineCode(marks)
+        while startpoint < endpoint:
+            length = min(chunksize, numsyls - startpoint)
+            if length > 0:
+                foot = table[CodeIndex(code, numsyls, startpoint, length)]
+            else: foot = -1
+            if foot >= 0:
+                startpoint += chunksize
+                yield self.names[foot], startpoint
+            else: yield '', startpoint
+
+
+def Unpromoted(name):
+    """The foot a promoted one stands for: '(iamb)' -> 'iamb'."""
+    if name[:1] == '(': return name[1:-1]
+    return name
+
+feet = FootRegistry()
+feet.AddSubstitutions(IAMBIC, footDict)
+feet.AddSubstitutions(ANAPESTIC, AnapSubs)
+feet.AddSubstitutions(TROCHAIC, TrochSubs)
+feet.AddSubstitutions(DACTYLIC, DactSubs)
+feet.AddPoints(IAMBIC, iambicPoints, unpromote=True)
+feet.AddPoints(ANAPESTIC, anapesticPoints)
+feet.AddPoints(TROCHAIC, trochaicPoints)
+feet.AddPoints(DACTYLIC, dactylicPoints)
@@ -16,30 +16,246 @@
 
 import sre
 import random		# second import! will be reseeded! (not a problem)
+import traceback
+import time
+from math import modf
 from scanstrings import *
 from syllables import *
 from scanpositions import *
 from dictfuncs import *
 from scanutilities import *
+from scanfeet import *
+from scantable import FootTable, LoadFootTable
 
 #fo = open("foo.txt", "wb")
 
+WORDCACHESIZE = 5000	# words whose syllables and stresses we remember
+FOOTMEMOSIZE = 20000	# lines of marks whose division into feet we remember
+PARSECACHESIZE = 2000	# lines of a document whose parse we remember
+AMBIGUITYLIMIT = 6	# ambiguous words past which not every resolution is tried
+
+# shared by every ScansionMachine: the feet found for a line of marks
+# depend on nothing that differs from one machine to another
+footMemo = LRUCache(FOOTMEMOSIZE)
+# and the feet found in advance for all short lines (see scantable.py), or
+# None if the table file is missing or out of date
+footTable = LoadFootTable()
+
+# for iambic Algorithm 3: the kinds of foot that matter to what follows,
+# and by MarksIndex of each foot's marks, (footname, points, end of line
+# only?, kind), or None
+_OTHER, _TROCHEE, _PYRRHIC = 0, 1, 2
+
+def _makeLeastCostTable():
+    table = [None] * TABLESIZE
+    for (marklist, endonly) in ((leastCostFeet, False),
+                                (leastCostEndFeet, True)):
+        for marks in marklist:
+            name = feet.Find(IAMBIC, marks)
+            kind = {'trochee': _TROCHEE,
+                    'pyrrhic': _PYRRHIC}.get(name, _OTHER)
+            table[MarksIndex(marks)] = (name, feet.points[IAMBIC][name],
+                                        endonly, kind)
+    return table
+
+_leastCostTable = _makeLeastCostTable()
+
+# for _measureComplexity: each iambic foot's (points, is a trochee?, needs
+# punctuation before it?), promoted feet counting as their plain versions
+_iambicScores = dict([(name, (feet.points[IAMBIC][name],
+                              Unpromoted(name) == 'trochee',
+                              Unpromoted(name) in ('trochee', 'defective')))
+                      for name in feet.names])
+
+# for the falling metres: by MarksIndex of each foot's marks, (footname,
+# points within the line or None if it may only end the line, points at
+# the end of the line), or None
+def _fallingPoints(metron, name, atEnd):
+    if atEnd and name in catalecticFeet[metron]: return CATALEXISPOINTS
+    if name == 'defective': return None
+    return feet.points[metron][name]
+
+def _makeFallingTable(metron):
+    table = [None] * TABLESIZE
+    for (index, foot) in enumerate(feet.tables[metron]):
+        if foot < 0: continue
+        name = feet.names[foot]
+        table[index] = (name, _fallingPoints(metron, name, False),
+                        _fallingPoints(metron, name, True))
+    return table
+
+_fallingTables = dict([(metron, _makeFallingTable(metron))
+                       for metron in (TROCHAIC, DACTYLIC)])
+
 class ScansionMachine:
     
-    def __init__(self):
-        """Create our main helpers and compile RE patterns"""
+    def __init__(self, dictpath=None):
+        """Create our main helpers and compile RE patterns.
+
+        The dictionary is the built-in one unless dictpath names a file
+        compiled by dictcompile.py.
+        """
         self.LD = LineData()
         self.S = Syllabizer()
         self.P = Positioner()
-        self.SD = ScanDict(self)
+        self.SD = ScanDict(self, dictpath)
+        self.wordCache = LRUCache(WORDCACHESIZE)
+        self.parseCache = LRUCache(PARSECACHESIZE)	# see ParseLine
+        self.wordIndex = None		# the Frame's WordIndex, fed by ParseLine
+        self.footMemo = footMemo		# see DoAlgorithm, scanAnapestics
+        self.footTable = footTable		# looked up before footMemo
         self.vowelRE = sre.compile('[aeiouyAEIOUY]')
         self.wordBoundsRE = sre.compile(r"([-.,;:?!\(\)\"\s]+)")
         self.possIambRE = sre.compile('(x[x/])+')
+        # those ChooseAlgorithm tries; the least-cost division (3) only if
+        # asked for, alone or beside these
+        self.iambicAlgorithms = (1, 2)
+        self.stepHooks = []			# called with a StepRecord per step
         
     def SetLineFeet(self, num, setflag):
         """Frame, while deducing parameters, sets chief values here."""
         self.LD.setData(lfeet = num, lfeetset = setflag)
 
+    def GetScansionSteps(self, iambic=True, algorithm=1, metron=None):
+        """Return the sequence of (step name, method) pairs for one line.
+
+        By default, the sequence is that of iambic Algorithm 1. It can be
+        switched to Algorithm 2 or 3 for each iambic line any time before
+        FORKSTEP (caller is responsible for checking this). Steps after 1 can
+        be switched from iambic to anapestic, or (given the metron) to
+        trochaic or dactylic. Every method takes the logger and returns
+        (scanline, result).
+        """
+        steps = [('SYLLABLES', self.ShowSyllables),
+                 ('PRELIMINARY MARKS', self.ShowLexStresses)]
+        if metron in (TROCHAIC, DACTYLIC):
+            name = metronNames[metron] + 'S'
+            steps.append(('ADJUST STRESSES',
+                  lambda logger: self.GetBestFallingLexes(logger, metron)))
+            steps.append((name + ': FOOT DIVISION',
+                  lambda logger: self.FallingDivision(logger, metron)))
+            steps.append((name + ': ANALYSIS',
+                  lambda logger: self.FallingReport(logger, metron)))
+        elif iambic and metron != ANAPESTIC:
+            steps.append(('CHOOSE ALGORITHM', self.ChooseAlgorithm))
+            if algorithm == 1:
+                steps.append(('FIRST TESTS', self.WeirdEnds))
+                steps.append(('FOOT DIVISION', self.TestLengthAndDice))
+            elif algorithm == 3:
+                steps.append(('BEST DIVISION', self.BestDivision))
+            else:
+                steps.append(('LONGEST NORMAL', self.TryREs))
+                steps.append(('CLEAN UP ENDS', self.CleanUpRE))
+            steps.append(('PROMOTIONS', self.PromotePyrrhics))
+            steps.append(('ANALYSIS', self.HowWeDoing))
+        else:		# anapestic steps
+            steps.append(('ADJUST STRESSES', self.GetBestAnapLexes))
+            steps.append(('ANAPESTICS: LINE END', self.AnapEndFoot))
+            steps.append(('ANAPESTICS: FOOT DIVISION', self.AnapDivideHead))
+            steps.append(('ANAPESTICS: ANALYSIS', self.AnapCleanUpAndReport))
+        return steps
+
+    def AddStepHook(self, hook):
+        """Have hook(StepRecord) called after every step run by RunStep."""
+        if hook not in self.stepHooks: self.stepHooks.append(hook)
+
+    def RemoveStepHook(self, hook):
+        if hook in self.stepHooks: self.stepHooks.remove(hook)
+
+    def RunStep(self, name, method, logger):
+        """Run one step from GetScansionSteps; return its (scanline, result).
+
+        This is where the Frame and LineScanner dispatch every step, so
+        it's where the step hooks hear about them: time taken, the size of
+        the line, and success or failure (a step that raises counts as a
+        failure; the exception goes on to the caller). With no hooks, the
+        step is simply run.
+        """
+        if not self.stepHooks: return method(logger)
+        success = False
+        start = time.time()
+        try:
+            (scanline, result) = method(logger)
+            success = bool(result)
+        finally:
+            record = StepRecord(name, time.time() - start,
+                                len(self.LD.data['linetext']),
+                                len(self.P.sylmids),
+                                self.P.CountAmbiguities(), success)
+            for hook in self.stepHooks[:]: hook(record)
+        return scanline, result
+
+## - - - - - establish major context for scansion work
+    def DeduceParameters(self, lines, logger, forcemetron=0, sample=12):
+        """Read multiple lines; find metron and linelength.
+
+        Read the "real" lines (up to a dozen) from any iterable of lines;
+        parse each once and try a quick scansion of it under every metron
+        (see ScoreMetres); each votes for the metron that scanned it best,
+        and the most votes decide (see ChooseVotedMetron), unless
+        forcemetron says which. Guess line-length in feet under that
+        metron; if close average, declare constant length. Return (metron,
+        linefeet, linefeetset); linefeet is None if no line could be
+        scanned at all. Leaves the lfeet settings unset, so the caller must
+        call SetLineFeet.
+        """
+        if forcemetron: metrons = (forcemetron,)
+        else: metrons = METRONS
+        totals = dict([(m, 0) for m in metrons])
+        votes = {}				# metron -> lines it scanned best
+        lengths = dict([(m, []) for m in metrons])
+        i = 0
+        self.SetLineFeet(5, False)		# unset "linefeetset" for tests
+        for line in lines:	# parse lines, try various scansions
+            if i >= sample: break
+            if len(line) < 5 or line[:1] == '\t': # can't use line[0] with or!
+                continue	# skip a title or other non-verse
+            i += 1	# count of "real" lines
+            self.ParseLine(line)
+            scores = self.ScoreMetres(logger, metrons)
+            for (m, (score, length)) in scores.items():
+                totals[m] += score
+                if score < 100: lengths[m].append(length)
+            VoteMetron(votes, dict([(m, score) for (m, (score, length))
+                                    in scores.items()]))
+        if forcemetron: metron = forcemetron
+        else: metron = ChooseVotedMetron(votes, totals)
+        (linefeet, linefeetset) = self._lineLengthIfPossible(lengths[metron])
+        return metron, linefeet, linefeetset
+
+    def ScoreMetres(self, logger, metrons=METRONS):
+        """Score the parsed line under each metron, all from one ParseLine.
+
+        Return {metron: (score, length in feet)}, as ChooseAlgorithm (for
+        iambics), GetBestAnapLexes, or GetBestFallingLexes report them when
+        deducing parameters; a metron whose scansion raises is left out.
+        """
+        scores = {}
+        for metron in metrons:
+            try:
+                if metron == IAMBIC:
+                    scores[metron] = self.ChooseAlgorithm(logger,
+                                                          deducingParams=True)
+                elif metron == ANAPESTIC:
+                    scores[metron] = self.GetBestAnapLexes(logger,
+                                                          deducingParams=True)
+                else:
+                    scores[metron] = self.GetBestFallingLexes(logger, metron,
+                                                          deducingParams=True)
+            except: traceback.print_exc()
+        return scores
+
+    def _lineLengthIfPossible(self, theLengths):
+        """If there's a clear average, return (length, True)"""
+        total = sum(theLengths)
+        if not total or not theLengths: return None, False
+        (frac, integ) = modf(float(total) / len(theLengths))
+        if frac > 0.8:				# probably about right
+            return int(integ) + 1, True
+        elif frac < 0.2:
+            return int(integ), True
+        else: return int(round(integ + frac)), False
+
 ## - - - - - line-parsing code called by everybody in prep for any scansion
 
     def ParseLine(self, line):
@@ -49,9 +265,28 @@ class ScansionMachine:
         in dictionary, and there or by calculation in the Syllabizer
         determine syllabification and stress. Lay all basic
         data-groundwork in Positioner. Return nothing.
+
+        Each line is parsed once: what parsing leaves in the Positioner and
+        in our lists of words is kept in self.parseCache, under the line and
+        the dictionary's version, and put back when the line comes again
+        (from DeduceParameters, then from the Frame's selecting it, then
+        from Scan Everything).
+
+        A line parsed afresh is also added to self.wordIndex, if there is
+        one (see scandoc.py), under each word it looked up, so that the
+        lines using a word can be found when its dictionary entry changes.
         """
         if len(line) < 1: return None		   # nothing to do
         self.LD.setData(linetext = line, footlist = [], lastfoot = '')
+        key = (line, self.SD.version)
+        parsed = self.parseCache.get(key)
+        if parsed is not None:
+            (state, dwds, cwds, lineWords) = parsed
+            self.P.SetParsedState(state)
+            self.dwds = [list(syls) for syls in dwds]
+            self.cwds = [list(syls) for syls in cwds]
+            self.lineWords = [list(syls) for syls in lineWords]
+            return
         self.P.NewLine(len(line))			   # prepare new data structures
         # Tricky: hyphens separate tokens, apostrophes don't; hyphen must go
         # first in list; double-quote needs escape; and please
@@ -59,6 +294,8 @@ class ScansionMachine:
         words = self.wordBoundsRE.split(line)
         lineindex = 0		# keep track of position in list of chars
         self.dwds = []; self.cwds = []		# collections for Explainer
+        self.lineWords = []		# syllables of each word, in order
+        looked = []			# the words, as looked up
         for wORD in words:
             if not wORD: continue	# sre.split can produce empty returns
             # catch clitics for non-syllabic treatment, defined as:
@@ -72,14 +309,93 @@ class ScansionMachine:
                 lineindex = self.P.AddPunct(wORD, lineindex)
                 continue
             w = wORD.lower()	  # for ALL internal use! e.g. in dictionary!
-            syls = self._dictLookup(w)
-            if syls: self.dwds.append(syls)
-            else:
-                syls = self.S.Syllabize(w)
-                self.cwds.append(syls)
+            looked.append(w)
+            (syls, fromDict) = self._lookupWord(w)
+            if fromDict: self.dwds.append(syls)
+            else: self.cwds.append(syls)
             lineindex = self.P.AddWord(syls, lineindex)	# advances index
+            self.lineWords.append(syls[:])	# as AddWord left them
         self.P.LocateFootDivPositions()
+        self.parseCache.put(key, (self.P.ParsedState(),
+                                  tuple([tuple(syls) for syls in self.dwds]),
+                                  tuple([tuple(syls) for syls in self.cwds]),
+                                  tuple([tuple(syls)
+                                         for syls in self.lineWords])))
+        if self.wordIndex is not None: self.wordIndex.AddLine(line, looked)
     
+    def _lookupWord(self, word):
+        """Return (syls, True if from dictionary) for a lowercased word.
+
+        The answer comes from our cache of recent words if it can; verse
+        uses the same few words over and over. The cache holds tuples, and
+        each caller gets a fresh list, since AddWord may alter it.
+        """
+        known = self.wordCache.get(word)
+        if known is None:
+            syls = self._dictLookup(word)
+            if syls: known = (tuple(syls), True)
+            else: known = (tuple(self.S.Syllabize(word)), False)
+            self.wordCache.put(word, known)
+        return list(known[0]), known[1]
+
+    def WordsUsingEntry(self, word):
+        """Return the words whose lookup depends on this dictionary entry.
+
+        These are the word itself and the -s/-ed/-d forms that _dictLookup
+        builds from it.
+        """
+        return (word, word + 's', word + 'ed', word + 'd')
+
+    def ForgetWord(self, word):
+        """ScanDict has changed an entry; drop whatever we cached from it."""
+        for w in self.WordsUsingEntry(word):
+            self.wordCache.discard(w)
+        self.parseCache.clear()		# keyed by the old version anyway
+
+    def ForgetLines(self):
+        """A new document: drop the parses of the old one's lines."""
+        self.parseCache.clear()
+        if self.wordIndex is not None: self.wordIndex.Clear()
+
+    def Vocabulary(self, lines):
+        """Generate each distinct word of some lines once, as ParseLine
+        will look it up (lowercased, keeping inner punctuation)."""
+        seen = set()
+        for line in lines:
+            for wORD in self.wordBoundsRE.split(line):
+                if not wORD or not self.vowelRE.search(wORD): continue
+                if not self._stripPunct(wORD): continue
+                w = wORD.lower()
+                if w not in seen:
+                    seen.add(w)
+                    yield w
+
+    def PrimeWords(self, words, analyses=None):
+        """Fill the word cache for a whole vocabulary at once.
+
+        Words in the dictionary are looked up there; the rest are taken
+        from analyses (word -> syllables, as from SyllabizeVocabulary run in
+        a pool) or else syllabized together by the Syllabizer. Words the
+        cache already holds are skipped. Only the last WORDCACHESIZE words
+        can stay, so prime with the commonest. Return how many were added.
+        """
+        unknown = []
+        added = 0
+        for w in words:
+            if self.wordCache.get(w) is not None: continue
+            syls = self._dictLookup(w)
+            if syls:
+                self.wordCache.put(w, (tuple(syls), True))
+                added += 1
+            elif analyses and w in analyses:
+                self.wordCache.put(w, (tuple(analyses[w]), False))
+                added += 1
+            else: unknown.append(w)
+        for (w, syls) in self.S.SyllabizeMany(unknown).iteritems():
+            self.wordCache.put(w, (tuple(syls), False))
+            added += 1
+        return added
+
     def _dictLookup(self, word):
         """If word, or word less -s/-ed ending,
         is in dict, return its syls/stress.
@@ -134,46 +450,85 @@ class ScansionMachine:
         logger.ExpLexStress(self.dwds, self.cwds)
         # in case user forces choice of algorithm, which fails;
         # see RestartNewIambicAlg
-        self.lexData = self.P.charlist[:]	# now ONLY data needed to restart
+        self.lexData = self.P.Snapshot()	# now ONLY data needed to restart
         return self.P.GetScanString(False, False), True	# no feet/punct to disp
 
 ## - - - - - where iambic and anapestic steps diverge
+    def ResolveAmbiguities(self, score):
+        """Try resolutions of the line's stress ambiguities; return (the
+        lowest points, the keys with them, how many resolutions were tried).
+
+        score(marks) returns the (points, key) pairs for one line of
+        lexical marks. With up to AMBIGUITYLIMIT ambiguous words, every
+        resolution is tried, in the Positioner's order. With more, 2**k
+        are too many: starting from the first resolution, each word in turn
+        takes its other reading if the line then scores lower, so only k + 1
+        are tried. That finds the best wherever the words' effects on the
+        score are independent, as they mostly are, in different feet.
+        """
+        best = [None, []]		# lowest points, and the keys with them
+        def take(marks):
+            least = None
+            for (points, key) in score(marks):
+                if best[0] is None or points < best[0]:
+                    best[0] = points
+                    best[1] = []
+                if points == best[0]: best[1].append(key)
+                if least is None or points < least: least = points
+            return least
+        words = self.P.CountAmbiguousWords()
+        if words <= AMBIGUITYLIMIT:
+            for marks in self.P.GetAmbiguities(): take(marks)
+            return best[0], best[1], self.P.CountAmbiguities()
+        choice = 0
+        least = take(self.P.GetResolution(choice))
+        for j in range(words):
+            other = choice ^ (1 << j)
+            points = take(self.P.GetResolution(other))
+            if points < least: (choice, least) = (other, points)
+        return best[0], best[1], words + 1
+
     def ChooseAlgorithm(self, logger, deducingParams=False):
         """The "crux" step for iambics.
         Look ahead to see which comes out better.
         
         Choices to try are multiplied by any stress-ambiguities discovered by
-        ParseLine. If neither is superior, choose at random. Announce whatever 
-        we do; allow user (with menu choice) to override.
+        ParseLine. If none is superior, choose at random. Announce whatever 
+        we do; allow user (with menu choice) to override. Only the best
+        choices so far are kept as the resolutions are tried (see
+        ResolveAmbiguities). The algorithms tried are those in
+        self.iambicAlgorithms; the number of the one chosen is returned as
+        the step's result.
         """
-        complexities = {}
-        possScansions = self.P.GetAmbiguities()
-        for s in possScansions:
-            for algorithm in (1, 2):
+        def score(s):
+            for algorithm in self.iambicAlgorithms:
                 (feet, test) = self.DoAlgorithm(algorithm, s)
-                complexities[(s, algorithm)] = (self._measureComplexity(feet,
-                                                             test), len(feet))
-        lowest = min([v[0] for v in complexities.values()])
-        bestkeys = [key for key in complexities
-                    if complexities[key][0] == lowest]
+                yield (self._measureComplexity(feet, test),
+                       (s, algorithm, len(feet)))
+        (lowest, bestkeys, tried) = self.ResolveAmbiguities(score)
         ourkey = random.choice(bestkeys)
         if not deducingParams:
             self.P.AdjustMarks(ourkey[0])
-            logger.ExpChooseAlg(ourkey[1], len(possScansions))
-            if ourkey[1] == 1: return self.P.GetScanString(), True
-            else: return self.P.GetScanString(), False
-        else: return (lowest, complexities[ourkey][1])
+            logger.ExpChooseAlg(ourkey[1], tried)
+            return self.P.GetScanString(), ourkey[1]
+        else: return (lowest, ourkey[2])
         
 ## - - the quick-run-through version of iambic scansion, so as
 ##     to test algorithms etc. without displaying step-by-step messages
     def DoAlgorithm(self, whichAlgorithm, scansion):
-        """Run through whole iambic scansion, either algorithm, silently.
+        """Run through whole iambic scansion, any algorithm, silently.
         
         Called by top-level DeduceParameters to figure metron.
         After, if iambic, called by ChooseAlgorithm to try each approach.
         If global-to-module linelength not set, figure it (not reliably!)
         and set it for step-by-steps. Note that when call is from
         DeduceParameters, lfeetset is *false*.
+
+        The feet found for given marks, line length, and algorithm are
+        looked up in self.footTable if it covers them, else remembered in
+        self.footMemo, so a line of marks seen before (in this line's other
+        resolutions, or in lines before it) is not divided again; only the
+        punctuation test is made afresh.
         """
         ## whichAlgorithm = 1           # TESTTESTTEST
         if not self.LD.data['lfeetset']:
@@ -184,17 +539,46 @@ class ScansionMachine:
                 self.LD.data['lfeet'] = linefeet
             else: return ([], [])
         else: linefeet = self.LD.data['lfeet']
+        key = (whichAlgorithm, scansion, linefeet)
+        footlist = None
+        if whichAlgorithm == 3:
+            key += (self._syllableBounds(len(scansion)),)
+            tabled = True not in key[-1][1:]	# table's lines lack punct
+        else: tabled = True
+        if tabled and self.footTable:
+            footlist = self.footTable.Lookup(whichAlgorithm, scansion,
+                                             linefeet)
+        if footlist is None: footlist = self.footMemo.get(key)
+        if footlist is None:
+            footlist = tuple(self._divideIambic(whichAlgorithm, scansion,
+                                                linefeet))
+            self.footMemo.put(key, footlist)
+        if not footlist: return ([], [])
+        footlist = list(footlist)
+        test = self.P.FeetAtPunctBounds(footlist)
+        return (footlist, test)
+
+    def _divideIambic(self, whichAlgorithm, scansion, linefeet):
+        """Return the feet DoAlgorithm finds, or [] for none.
+
+        Depends on nothing but the arguments (and, for Algorithm 3, where
+        the line's punctuation falls), which is what lets DoAlgorithm
+        remember the answer.
+        """
         footlist = []
-        if whichAlgorithm == 1:
+        if whichAlgorithm == 3:
+            footlist = [f for (f, length)
+                        in self._leastCostDivision(scansion, linefeet)[0]]
+        elif whichAlgorithm == 1:
             normlen = linefeet * 2
             currlen = len(scansion)
             if ((currlen > (normlen + 1))
                  and (scansion[-4:] in ('x/xx', 'xx/x'))):
-                lastfoot = footDict[scansion[-4:]]
+                lastfoot = feet.Find(IAMBIC, scansion[-4:])
                 linefeet -= 1			# only in local copy!
                 scansion = scansion[:-4]
             elif currlen >= normlen and scansion[-3:] in ('x/x', '//x'):
-                lastfoot = footDict[scansion[-3:]]
+                lastfoot = feet.Find(IAMBIC, scansion[-3:])
                 linefeet -= 1
                 scansion = scansion[:-3]
             else: lastfoot = ''
@@ -206,22 +590,22 @@ class ScansionMachine:
                 scansion = scansion[1:]
             # end of special-first-last-feet section
             if currlen == normlen:				# simple disyllables
-                for (footname, sylinx) in footfinder(footDict, scansion,
+                for (footname, sylinx) in feet.Divide(IAMBIC, scansion,
                                                      2, 0, len(scansion)):
                     if footname: footlist.append(footname)
-                    else: return ([], [])
+                    else: return []
             elif currlen < normlen:				# defective somewhere
                 candidate = scansion.find('x//')
-                if candidate % 2 != 0: return ([], [])
-                for (footname, sylinx) in footfinder(footDict, scansion,
+                if candidate % 2 != 0: return []
+                for (footname, sylinx) in feet.Divide(IAMBIC, scansion,
                                                         2, 0, candidate):
                     if footname: footlist.append(footname)
-                    else: return ([], [])
+                    else: return []
                 footlist.append('defective')
-                for (footname, sylinx) in footfinder(footDict, scansion, 2,
+                for (footname, sylinx) in feet.Divide(IAMBIC, scansion, 2,
                                                    candidate+1, len(scansion)):
                     if footname: footlist.append(footname)
-                    else: return ([], [])
+                    else: return []
             else:										# anapests
                 need = currlen - normlen
                 candidates = []
@@ -236,61 +620,59 @@ class ScansionMachine:
                         footlist.append('anapest')
                         i += 3
                     else:
-                        if footDict.has_key(scansion[i:i+2]):
-                            footlist.append(footDict[scansion[i:i+2]])
-                        else: return ([], [])
+                        footname = feet.Find(IAMBIC, scansion[i:i+2])
+                        if footname: footlist.append(footname)
+                        else: return []
                         i += 2
             if lastfoot: footlist.append(lastfoot)
         else:			# algorithm 2
             (startoflongest, longest) = longestMatch(self.possIambRE, scansion)
-            if startoflongest is None: return ([], [])
+            if startoflongest is None: return []
             if startoflongest % 2 == 0:			# divide head into disyllables
-                for (footname, sylinx) in footfinder(footDict, scansion,
+                for (footname, sylinx) in feet.Divide(IAMBIC, scansion,
                                                      2, 0, startoflongest):
                     if footname: footlist.append(footname)
-                    else: return ([], [])
+                    else: return []
             elif scansion[:2] == '/x':		# headless, I guess
 # could use better test from alg 1: sc[:4] in ('/xxx', '/x/x'), IFF 3+ syls!!
                 footlist.append('defective')
-                for (footname, sylinx) in footfinder(footDict, scansion,
+                for (footname, sylinx) in feet.Divide(IAMBIC, scansion,
                                                     2, 1, startoflongest):
                     if footname: footlist.append(footname)
-                    else: return ([], [])
+                    else: return []
             else:
                 anap = scansion.find('xx/', 0, startoflongest)
-                if anap == -1: return ([],[])
-                for (footname, longest) in footfinder(footDict, scansion,
+                if anap == -1: return []
+                for (footname, longest) in feet.Divide(IAMBIC, scansion,
                                                                2, 0, anap):
                     if footname: footlist.append(footname)
-                    else: return ([], [])
+                    else: return []
                 footlist.append('anapest')
-                for (footname, sylinx) in footfinder(footDict, scansion,
+                for (footname, sylinx) in feet.Divide(IAMBIC, scansion,
                                             2, anap + 3, startoflongest):
                     if footname: footlist.append(footname)
-                    else: return ([], [])
-            for (footname, sylinx) in footfinder(footDict, scansion, 2,
+                    else: return []
+            for (footname, sylinx) in feet.Divide(IAMBIC, scansion, 2,
                                startoflongest, startoflongest + longest):
                 if footname: footlist.append(footname)
-                else: return ([], [])
+                else: return []
             # to divide tail, check e-s endings, divide in pairs (anaps??)
             scansion = scansion[startoflongest + longest:]
             if len(scansion) > 0:
                 lastfoot = ''
                 if scansion[-1] == 'x' and len(scansion) > 2:
-                    if footDict.has_key(scansion[-3:]):
-                        lastfoot = footDict[scansion[-3:]]
-                        scansion = scansion[:-3]
-                for (footname, sylinx) in footfinder(footDict, scansion,
+                    lastfoot = feet.Find(IAMBIC, scansion[-3:])
+                    if lastfoot: scansion = scansion[:-3]
+                for (footname, sylinx) in feet.Divide(IAMBIC, scansion,
                                                     2, 0, len(scansion)):
                     if footname: footlist.append(footname)
-                    else: return ([], [])
+                    else: return []
                 if lastfoot: footlist.append(lastfoot)
         for inx, f in enumerate(footlist):
             if f == 'pyrrhic':
                 if inx == len(footlist) - 1 or footlist[inx+1] != 'spondee':
                     f = '(iamb)'
-        test = self.P.FeetAtPunctBounds(footlist)
-        return (footlist, test)
+        return footlist
 
     def _measureComplexity(self, footlist, boundstest):
         """Add up weighted points for each foot substituted for the iamb.
@@ -301,27 +683,102 @@ class ScansionMachine:
         of corresponding anapestic method.
         """
         if len(footlist) != self.LD.data['lfeet']: return 100 # test for empty!
-        feet = footlist[:]				# so we can remove parens
         points = 0
         prevIsTrochee = False
-        for inx, f in enumerate(feet):
-            if f[0] == '(': f = f[1:-1]	# remove parens
-            # progressively stranger substitutions
-            if f in ('spondee', 'pyrrhic', 'trochee'): points += 2
-            if f in ('anapest', 'defective', '3rd paeon', 'amphibrach',
-                           'palimbacchius', '2nd paeon'): 
-                points += 4
-            # (does my code even allow for this to happen??)
-            if f in ('dactyl', 'cretic', 'bacchius'): points += 10
+        for inx, f in enumerate(footlist):
+            # progressively stranger substitutions (see iambicPoints)
+            (footpoints, isTrochee, needsBound) = _iambicScores.get(f,
+                                                        (0, False, False))
+            points += footpoints
             # especially disruptive positional variations
-            if f == 'trochee':
-                if inx == len(feet) - 1: points += 6	# scazon
-                if prevIsTrochee: points += 8	# "sprung rhythm"
-                prevIsTrochee = True
-            else: prevIsTrochee = False
-            if f in ('trochee', 'defective') and not boundstest[inx]:
-                    points += 4
+            if isTrochee:
+                if inx == len(footlist) - 1: points += SCAZONPOINTS
+                if prevIsTrochee: points += SPRUNGPOINTS # "sprung rhythm"
+            prevIsTrochee = isTrochee
+            if needsBound and not boundstest[inx]:
+                    points += OFFBOUNDPOINTS
         return points
+
+    def LineComplexity(self, metron):
+        """Score the feet found for the line, as in choosing among scansions.
+
+        Iambic lines are scored by _measureComplexity, anapestic ones by
+        _anapComplexity, trochaic and dactylic ones by _fallingComplexity;
+        lower is more regular, and 100 means failure.
+        """
+        footlist = self.LD.data['footlist']
+        if metron == ANAPESTIC: return self._anapComplexity(footlist)
+        if metron in (TROCHAIC, DACTYLIC):
+            return self._fallingComplexity(metron, footlist)
+        return self._measureComplexity(footlist,
+                                       self.P.FeetAtPunctBounds(footlist))
+
+    def _syllableBounds(self, numsyls):
+        """Return a tuple: does a foot at each syllable follow punctuation?"""
+        return tuple([self.P.SyllableAtPunctBound(pos)
+                      for pos in range(numsyls)])
+
+    def _leastCostDivision(self, scansion, linefeet):
+        """Divide marks into exactly linefeet feet at least cost in points.
+
+        Return ([(footname, length), ...], points), or ([], 100) if there
+        is no division at all. This is a Viterbi-style pass over the line:
+        for each syllable, number of feet so far, and kind of foot just
+        before (trochee, pyrrhic, other), keep only the cheapest way there.
+        Points are those of _measureComplexity; a pyrrhic may not precede a
+        trochee, since PromotePyrrhics could do nothing with that.
+        """
+        numsyls = len(scansion)
+        if not numsyls or linefeet < 1: return [], 100
+        bounds = self._syllableBounds(numsyls)
+        code = LineCode(scansion)
+        # states[pos] = {(feet so far, prev): (points, back)}, where back is
+        # (oldpos, oldprev, footname); only reachable states are kept
+        states = [{} for pos in range(numsyls + 1)]
+        states[0][(0, _OTHER)] = (0, None)
+        for pos in range(numsyls):
+            if not states[pos]: continue
+            fits = []
+            for length in (1, 2, 3, 4):
+                end = pos + length
+                if end > numsyls: break
+                foot = _leastCostTable[CodeIndex(code, numsyls, pos, length)]
+                if foot is None: continue
+                (f, points, endonly, kind) = foot
+                if endonly and end != numsyls: continue
+                if f in ('trochee', 'defective') and not bounds[pos]:
+                    points += OFFBOUNDPOINTS
+                fits.append((end, f, points, endonly, kind))
+            for ((k, prev), (points, back)) in states[pos].iteritems():
+                feetleft = linefeet - k - 1
+                for (end, f, footpoints, endonly, kind) in fits:
+                    # the feet still to come must fit what's left
+                    left = numsyls - end
+                    if left < feetleft or left > feetleft * 4: continue
+                    if endonly and feetleft: continue
+                    newpoints = points + footpoints
+                    if kind == _TROCHEE:
+                        if prev == _PYRRHIC: continue
+                        if not feetleft: newpoints += SCAZONPOINTS
+                        if prev == _TROCHEE: newpoints += SPRUNGPOINTS
+                    there = states[end].get((k + 1, kind))
+                    if (there is None or newpoints < there[0]
+                          or (newpoints == there[0]
+                              and (pos, prev, f) < there[1])):
+                        states[end][(k + 1, kind)] = (newpoints,
+                                                      (pos, prev, f))
+        ends = [(value, key) for (key, value) in states[numsyls].items()
+                if key[0] == linefeet]
+        if not ends: return [], 100
+        ((points, back), (k, prev)) = min(ends)
+        division = []
+        pos = numsyls
+        while back:
+            (oldpos, oldprev, f) = back
+            division.insert(0, (f, pos - oldpos))
+            (pos, k, prev) = (oldpos, k - 1, oldprev)
+            back = states[pos][(k, prev)][1]
+        return division, points
     
 ## - - if one iambic alg. fails, we try the other, starting here with a restart
     def RestartNewIambicAlg(self, logger, failedAlgorithm, scanline):
@@ -336,7 +793,7 @@ class ScansionMachine:
         """
         #fo.write("\n",+failedAlgorithm+" - "+scanline) 
         logger.ExpRestartNewIambicAlg(failedAlgorithm, scanline)
-        self.P.charlist = self.lexData[:]
+        self.P.Restore(self.lexData)
         # prevent detritus in the clean restart
         self.LD.setData(footlist = [], hremain = (0, 0), midremain = (0, 0))
         return self.P.GetScanString()
@@ -360,7 +817,7 @@ class ScansionMachine:
         elif currlen >= normlen and marks[-3:] in endfeet:
             lastfootstring = marks[-3:]
         if lastfootstring:
-            self.LD.data['lastfoot'] = footDict[lastfootstring]
+            self.LD.data['lastfoot'] = feet.Find(IAMBIC, lastfootstring)
             self.P.AddFootDivMark(len(marks) - len(lastfootstring))
         else: self.LD.data['lastfoot'] = ''
         # FOLLOWING IF AND LINES IN IT, BUT NOT THE ELSE, ALL CHANGED TO FIX
@@ -386,7 +843,7 @@ class ScansionMachine:
         marks = self.P.GetMarks()
         if currlen == normlen:
             for (footname, sylinx) \
-                  in footfinder(footDict, marks, 2, start, end):
+                  in feet.Divide(IAMBIC, marks, 2, start, end):
                 if footname: self.LD.appendFoot(footname)
                 else: return self.P.GetScanString(), False
                 if sylinx < end: # not at end of line or where lastfoot starts
@@ -400,14 +857,14 @@ class ScansionMachine:
                 return self.P.GetScanString(), False
             candidate += 2			# point directly at defective foot
             for (footname, sylinx) \
-                  in footfinder(footDict, marks, 2, start, candidate):
+                  in feet.Divide(IAMBIC, marks, 2, start, candidate):
                 if footname: self.LD.appendFoot(footname)
                 else: return self.P.GetScanString(), False
                 self.P.AddFootDivMark(sylinx)
             self.LD.appendFoot('defective')
             self.P.AddFootDivMark(candidate+1)
             for (footname, sylinx) \
-                  in footfinder(footDict, marks, 2, candidate+1, end):
+                  in feet.Divide(IAMBIC, marks, 2, candidate+1, end):
                 if footname: self.LD.appendFoot(footname)
                 else: return self.P.GetScanString(), False
                 if sylinx < end: self.P.AddFootDivMark(sylinx)
@@ -419,16 +876,14 @@ class ScansionMachine:
                 candidates += morecands
             while start < end:
                 if need and (start in candidates):
-                    foot = marks[start:start+3]
-                    if footDict.has_key(foot):
-                        self.LD.appendFoot(footDict[foot])
+                    foot = feet.Find(IAMBIC, marks[start:start+3])
+                    if foot: self.LD.appendFoot(foot)
                     else: return self.P.GetScanString(), False
                     start += 3
                     need -= 1
                 else:
-                    foot = marks[start:start+2]
-                    if footDict.has_key(foot):
-                        self.LD.appendFoot(footDict[foot])
+                    foot = feet.Find(IAMBIC, marks[start:start+2])
+                    if foot: self.LD.appendFoot(foot)
                     else: return self.P.GetScanString(), False
                     start += 2
                 if start < end: self.P.AddFootDivMark(start)
@@ -455,7 +910,7 @@ class ScansionMachine:
         self.LD.data['midremain'] = (runend, len(marks))
         retstr = self.P.GetScanString(True)		# show only bounds of longest
         for (footname, sylinx) \
-              in footfinder(footDict, marks, 2, startlongest, runend):
+              in feet.Divide(IAMBIC, marks, 2, startlongest, runend):
             if footname: self.LD.appendFoot(footname)
             else: return self.P.GetScanString(), False
             if sylinx < len(marks): 
@@ -477,7 +932,7 @@ class ScansionMachine:
         tail = len(marks) - self.LD.data['midremain'][0]
         insertpoint = 0
         if head and (head % 2 == 0):
-            for (footname, sylinx) in footfinder(footDict, marks, 2, 0, head):
+            for (footname, sylinx) in feet.Divide(IAMBIC, marks, 2, 0, head):
                 if footname: self.LD.insertFoot(insertpoint, footname)
                 else: return self.P.GetScanString(), False
                 self.P.AddFootDivMark(sylinx)
@@ -488,7 +943,7 @@ class ScansionMachine:
                 self.LD.insertFoot(insertpoint, 'defective')
                 insertpoint += 1
                 for (footname, sylinx) \
-                      in footfinder(footDict, marks, 2, 1, head):
+                      in feet.Divide(IAMBIC, marks, 2, 1, head):
                     if footname:
                         self.LD.insertFoot(insertpoint, footname)
                     else: return self.P.GetScanString(), False
@@ -504,7 +959,7 @@ class ScansionMachine:
                     return self.P.GetScanString(), False
                 else:
                     for (footname, sylinx) \
-                          in footfinder(footDict, marks, 2, 0, head):
+                          in feet.Divide(IAMBIC, marks, 2, 0, head):
                         if footname:
                             self.LD.insertFoot(insertpoint, footname)
                         else: return self.P.GetScanString(), False
@@ -512,7 +967,7 @@ class ScansionMachine:
                         insertpoint += 1
                     self.LD.appendFoot('anapest')
                     for (footname, sylinx) \
-                          in footfinder(footDict, marks, 2, anap+3, head):
+                          in feet.Divide(IAMBIC, marks, 2, anap+3, head):
                         if footname:
                             self.LD.insertFoot(insertpoint,footname)
                         else: return self.P.GetScanString(), False
@@ -522,15 +977,15 @@ class ScansionMachine:
             # we find x/x, //x iff tail is odd len; do NOT find 3rd paeon!
             if marks[-1] == 'x' and tail % 2 != 0:
                 startlastfoot = len(marks) - 3
-                if footDict.has_key(marks[-3:]): 
-                    self.LD.data['lastfoot'] = footDict[marks[-3:]]
+                self.LD.data['lastfoot'] = feet.Find(IAMBIC, marks[-3:])
+                if self.LD.data['lastfoot']:
                     self.P.AddFootDivMark(startlastfoot)
                 else: return self.P.GetScanString(), False
             else:
                 startlastfoot = len(marks)
                 self.LD.data['lastfoot'] = ''
             for (footname, sylinx) \
-                  in footfinder(footDict, marks, 2,
+                  in feet.Divide(IAMBIC, marks, 2,
                   self.LD.data['midremain'][0], startlastfoot):
                 if footname: self.LD.appendFoot(footname)
                 else: return self.P.GetScanString(), False
@@ -540,7 +995,31 @@ class ScansionMachine:
             self.LD.appendFoot(self.LD.data['lastfoot'])
         return self.P.GetScanString(), True
 
-## - - - - - - - - end of fork between iambic Algorithms 1 & 2 - - - - - - - - 
+## - - - - - - - - iambic Algorithm 3: Least Cost - - - - - - - - - - - - 
+    def BestDivision(self, logger):
+        """Divide the line into feet the way that costs fewest points.
+
+        Where Algorithms 1 and 2 work out the feet from the line's unusual
+        or regular parts, this one weighs every division into the right
+        number of feet at once (see _leastCostDivision), so it fails only
+        if there is no division into known feet at all.
+        """
+        marks = self.P.GetMarks()
+        (division, points) = self._leastCostDivision(marks,
+                                                     self.LD.data['lfeet'])
+        if not division:
+            logger.Explain("\nFAIL! no division into known feet")
+            return self.P.GetScanString(), False
+        sylinx = 0
+        for (footname, length) in division:
+            self.LD.appendFoot(footname)
+            sylinx += length
+            if sylinx < len(marks): self.P.AddFootDivMark(sylinx)
+        self.LD.data['lastfoot'] = ''
+        logger.ExpBestDivision(self.LD.data['footlist'], points)
+        return self.P.GetScanString(), True
+
+## - - - - - - end of fork between iambic Algorithms 1, 2 & 3 - - - - - - 
     def PromotePyrrhics(self, logger):
         """Identify and mark instances of promoted stress in iambic lines.^
         
@@ -555,7 +1034,6 @@ class ScansionMachine:
         if self.LD.data['lfeetset'] and len(fl) != self.LD.data['lfeet']:
             logger.Explain("\nFAIL! wrong number of feet")
             return self.P.GetScanString(), False
-        d = dictinvert(footDict)
         promotions = []
         sylinx = 0
         for inx, f in enumerate(fl):
@@ -579,7 +1057,7 @@ class ScansionMachine:
                     self.LD.data['footlist'][inx] = '(iamb)'
                     self.P.AddScanMark('%', sylinx+1)
                     promotions.append(sylinx+1)
-            sylinx += len(d[f][0])
+            sylinx += feet.Length(f)
         logger.ExpPromotions(promotions)
         return self.P.GetScanString(), True
     
@@ -609,39 +1087,29 @@ class ScansionMachine:
         This does a main part of what ChooseAlgorithm does for iambics: get
         from the Positioner a list of alternative lexical-stress lines, each
         with a set of resolutions of stress ambiguities, and try each one out.
-        It elicits a complexity measure and uses it to pick a "best."
+        It elicits a complexity measure and uses it to pick a "best" (see
+        ResolveAmbiguities).
         """
-        possScansions = self.P.GetAmbiguities()
-        numcands = len(possScansions)
-        complexities = {}
-        for p in possScansions:
+        def score(p):
             flist = self.scanAnapestics(p)
-            complexities[p] = (self._anapComplexity(flist), len(flist))
-        lowest = min([v[0] for v in complexities.values()])
-        bestkeys = [key for key in complexities
-                    if complexities[key][0] == lowest]
+            return [(self._anapComplexity(flist), (p, len(flist)))]
+        (lowest, bestkeys, numcands) = self.ResolveAmbiguities(score)
         ourkey = random.choice(bestkeys)
         if not deducingParams:
             logger.ExpAnapGetBest(numcands, len(bestkeys))
             if bestkeys:
-                self.P.AdjustMarks(ourkey)
+                self.P.AdjustMarks(ourkey[0])
                 return self.P.GetScanString(), True
             else: return self.P.GetScanString(), False
-        else: return (lowest, complexities[ourkey][1])
+        else: return (lowest, ourkey[1])
             
     def _anapComplexity(self, footlist):
+        """Add up points (see anapesticPoints) for every foot but anapests."""
         if not footlist: return 100
+        anapPoints = feet.points[ANAPESTIC]
         points = 0
-        for inx, f in enumerate(footlist):
-            if f == 'bacchius': points += 2		# note: readjust
-            elif f == '(anapest)': points += 1
-            elif f in ('iamb', '(iamb)'): points += 2
-            elif f == 'cretic': points += 4		#  can reduce!
-            elif f in ('spondee', 'pyrrhic'): points += 4
-            elif f in ('amphibrach', '3rd paeon'): points += 4
-            elif f in ('2nd paeon', 'molossus', 'palimbacchius'):
-                points += 5
-        return points		
+        for f in footlist: points += anapPoints.get(f, 0)
+        return points
         
     def scanAnapestics(self, scansion):
         """Run through anapestic scansion
@@ -650,8 +1118,11 @@ class ScansionMachine:
         Fairly parallel to iambic DoAlgorithm. Called by DeduceParameters
         directly for quick judgement. Also called, with alternate
         stress-resolution preliminary scansions, by GetBestAnapLexes.
+        Like DoAlgorithm's, its answers come from self.footTable or are
+        remembered in self.footMemo.
         """
         numsyls = len(scansion)
+        marks = scansion
         if self.LD.data['lfeetset']:
             needfeet = self.LD.data['lfeet']
         else:
@@ -666,17 +1137,28 @@ class ScansionMachine:
         if scansion[-2:] == 'xx': # mark promo., treat as stressed (x% or /x%)
             scansion = scansion[:-1] + '%'
             self.P.AddScanMark('%', len(scansion)-1)
+        footlist = None
+        if self.footTable:
+            footlist = self.footTable.Lookup('anapestic', marks, needfeet)
+        key = ('anapestic', scansion, needfeet)
+        if footlist is None: footlist = self.footMemo.get(key)
+        if footlist is None:
+            footlist = tuple(self._divideAnapestic(scansion, needfeet))
+            self.footMemo.put(key, footlist)
+        return list(footlist)
+
+    def _divideAnapestic(self, scansion, needfeet):
+        """Return the feet scanAnapestics finds, or [] for none."""
+        numsyls = len(scansion)
         if scansion and scansion[-1] == 'x': # see AnapSubs for last feet notes
                 tailstart = scansion.rfind('/')				  # point to penult
                 tailstart = scansion.rfind('/', 0, tailstart) # stress in line
                 tail = numsyls - tailstart - 1
-                if AnapSubs.has_key(scansion[-tail:]):
-                    lastfoot = AnapSubs[scansion[-tail:]]
-                else:
+                lastfoot = feet.Find(ANAPESTIC, scansion[-tail:])
+                if not lastfoot:
                     tail += 1		# desperation: one more foot to try
-                    if AnapSubs.has_key(scansion[-tail:]):
-                        lastfoot = AnapSubs[scansion[-tail:]]
-                    else: return []                    # unknown last foot
+                    lastfoot = feet.Find(ANAPESTIC, scansion[-tail:])
+                    if not lastfoot: return []         # unknown last foot
                 needfeet -= 1
                 numsyls -= tail
                 scansion = scansion[:-tail]
@@ -687,35 +1169,26 @@ class ScansionMachine:
             scansion = self.AnapPromoteSlack(scansion)
             footlist = []
             for (footname, sylinx) \
-                  in footfinder(AnapSubs, scansion, 3, 0, numsyls):
+                  in feet.Divide(ANAPESTIC, scansion, 3, 0, numsyls):
                 if footname: footlist.append(footname)
                 else: return []
         else:
             needDisyls = (needfeet * 3) - numsyls
             if needDisyls > needfeet: return []
             scansion = self.AnapPromoteSlack(scansion)
-            numlist = '2' * needDisyls + '3' * (needfeet - needDisyls)
-            listoflists = uniquePermutations(numlist)
-            for pat in listoflists:
-                thislldo = True
-                index = 0
-                for foot in pat:
-                    index += int(foot)
-                    if scansion[index-1] not in '/%':
-                        thislldo = False
-                        break
-                if thislldo: break
-            if not thislldo: return []		# no plausible pattern of feet!
+            pat = next(footArrangements(needDisyls, needfeet - needDisyls,
+                                        scansion), None)
+            if pat is None: return []		# no plausible pattern of feet!
             footlist = []
+            table = feet.tables[ANAPESTIC]
+            code = LineCode(scansion)
             f = 0
             for digit in pat:
-                stride = int(digit)
-                if f + stride >= len(scansion): endf = None
-                else: endf = f+stride
-                if AnapSubs.has_key(scansion[f:endf]):
-                    footlist.append(AnapSubs[scansion[f:endf]])
-                    f += stride
-                else: return []
+                stride = min(int(digit), numsyls - f)
+                foot = table[CodeIndex(code, numsyls, f, stride)]
+                if foot < 0: return []
+                footlist.append(feet.names[foot])
+                f += stride
         if lastfoot: footlist.append(lastfoot)
         return footlist
 
@@ -737,14 +1210,12 @@ class ScansionMachine:
             tailstart = marks.rfind('/')				# point to penult
             tailstart = marks.rfind('/', 0, tailstart)	# stress in line
             tail = numsyls - tailstart - 1
-            if AnapSubs.has_key(marks[-tail:]):
-                self.LD.data['lastfoot'] = AnapSubs[marks[-tail:]]
-            else:
+            self.LD.data['lastfoot'] = feet.Find(ANAPESTIC, marks[-tail:])
+            if not self.LD.data['lastfoot']:
                 tail += 1		# desperation: one more foot to try
                 tailstart -= 1
-                if AnapSubs.has_key(marks[-tail:]):
-                    self.LD.data['lastfoot'] = AnapSubs[marks[-tail:]]
-                else:
+                self.LD.data['lastfoot'] = feet.Find(ANAPESTIC, marks[-tail:])
+                if not self.LD.data['lastfoot']:
                     logger.Explain("\nFAIL! unknown last foot")
                     return self.P.GetScanString(), False
             self.P.AddFootDivMark(tailstart + 1)
@@ -773,7 +1244,7 @@ class ScansionMachine:
         if numsyls == needfeet * 3:		# assign even 3s as feet
             marks = self.AnapPromoteSlack(marks, insertmark=True)
             for (footname, sylinx) \
-                  in footfinder(AnapSubs, marks, 3, 0, numsyls):
+                  in feet.Divide(ANAPESTIC, marks, 3, 0, numsyls):
                 if footname: self.LD.appendFoot(footname)
                 else:
                     logger.Explain("\nFAIL! unknown foot")
@@ -790,29 +1261,22 @@ class ScansionMachine:
                                + " exceeds needed feet")
                 return self.P.GetScanString(), False
             marks = self.AnapPromoteSlack(marks, insertmark=True)
-            numlist = '2' * needDisyls + '3' * (needfeet - needDisyls)
-            listoflists = uniquePermutations(numlist)
-            for pat in listoflists:
-                thislldo = True
-                index = self.LD.data['hremain'][0]    # we know it's 0
-                for foot in pat:
-                    index += int(foot)
-                    if marks[index-1] not in '/%': # treat (term.) prom.
-                        thislldo = False           # as stress
-                        break
-                if thislldo: break
-            if not thislldo:
+            # treat (term.) prom. as stress; we know hremain[0] is 0
+            pat = next(footArrangements(needDisyls, needfeet - needDisyls,
+                                  marks, self.LD.data['hremain'][0]), None)
+            if pat is None:
                 logger.Explain("\nFAIL! could not find " +
                                "plausible pattern of feet")
                 return self.P.GetScanString(), False
-            f = sylinx = 0	# can't use footfinder; chunksize changes
+            f = sylinx = 0	# can't use feet.Divide; chunksize changes
             for digit in pat:
                 stride = int(digit)
                 if f + stride >= len(marks): endf = None
                 else: endf = f+stride
                 sylinx += stride
-                if AnapSubs.has_key(marks[f:endf]):
-                    self.LD.appendFoot(AnapSubs[marks[f:endf]])
+                foot = feet.Find(ANAPESTIC, marks[f:endf])
+                if foot:
+                    self.LD.appendFoot(foot)
                     if endf: self.P.AddFootDivMark(sylinx)
                     f += stride
                 else: 
@@ -849,7 +1313,6 @@ class ScansionMachine:
         nothing about.) Call Explainer with list of feet to be displayed.
         """
         fl = self.LD.data['footlist']
-        d = dictinvert(AnapSubs)
         substitutions = 0
         sylinx = 0
         footAdjust = False
@@ -868,10 +1331,146 @@ class ScansionMachine:
                 footAdjust = True
             if fl[finx] not in ('anapest', '(anapest)'):
                 substitutions += 1
-            sylinx += len(d[fl[finx]][0])
+            sylinx += feet.Length(fl[finx])
         if self.LD.data['lfeetset'] and (len(fl) != self.LD.data['lfeet']):
             logger.ExpAnapFinal(fl, 100)
             return self.P.GetScanString(), False
         else:
             logger.ExpAnapFinal(fl, substitutions, footAdjust)
             return self.P.GetScanString(), True
+
+## - - - - - below, all code for scanning trochaics and dactylics
+    def GetBestFallingLexes(self, logger, metron, deducingParams=False):
+        """Try out all stress-resolutions for trochaics or dactylics.
+
+        As GetBestAnapLexes does for anapestics: each resolution of the
+        line's stress ambiguities is divided by DoFalling, and one with
+        fewest points is chosen (see ResolveAmbiguities).
+        """
+        def score(p):
+            (flist, points) = self.DoFalling(metron, p)
+            return [(points, (p, len(flist)))]
+        (lowest, bestkeys, numcands) = self.ResolveAmbiguities(score)
+        if deducingParams:
+            # every division has the line's number of feet, or none; no need
+            # to choose at random (and use up the random numbers)
+            return (lowest, bestkeys[0][1])
+        if lowest >= 100:
+            logger.ExpFallingGetBest(metron, numcands, 0)
+            return self.P.GetScanString(), False
+        ourkey = random.choice(bestkeys)
+        logger.ExpFallingGetBest(metron, numcands, len(bestkeys))
+        self.P.AdjustMarks(ourkey[0])
+        return self.P.GetScanString(), True
+
+    def DoFalling(self, metron, scansion):
+        """Run through trochaic or dactylic scansion silently.
+
+        Return (feet, points) from _divideFalling. If the line's length in
+        feet is not set, guess it from the syllables, as if the line were
+        regular but for a catalectic last foot, and set it for the steps.
+        The answer is remembered in self.footMemo.
+        """
+        if self.LD.data['lfeetset']: linefeet = self.LD.data['lfeet']
+        else:
+            footsize = footSizes[metron]
+            linefeet = (len(scansion) + footsize - 1) // footsize
+            self.LD.data['lfeet'] = linefeet
+        key = (metronNames[metron], scansion, linefeet)
+        found = self.footMemo.get(key)
+        if found is None:
+            (footlist, points) = self._divideFalling(metron, scansion,
+                                                     linefeet)
+            found = (tuple(footlist), points)
+            self.footMemo.put(key, found)
+        return list(found[0]), found[1]
+
+    def _divideFalling(self, metron, scansion, linefeet):
+        """Divide marks into exactly linefeet feet at least cost in points.
+
+        Return ([footname, ...], points), or ([], 100) if there is no
+        division at all. As in _leastCostDivision, but simpler, since in
+        the falling metres no foot's cost depends on the one before it:
+        for each syllable and number of feet so far, keep only the
+        cheapest way there.
+        """
+        numsyls = len(scansion)
+        if not numsyls or linefeet < 1: return [], 100
+        table = _fallingTables[metron]
+        code = LineCode(scansion)
+        # states[pos] = {feet so far: (points, back)}, where back is
+        # (oldpos, footname)
+        states = [{} for pos in range(numsyls + 1)]
+        states[0][0] = (0, None)
+        for pos in range(numsyls):
+            for length in range(1, MAXFOOT + 1):
+                end = pos + length
+                if end > numsyls or not states[pos]: break
+                foot = table[CodeIndex(code, numsyls, pos, length)]
+                if foot is None: continue
+                (f, points, endpoints) = foot
+                if end == numsyls: points = endpoints
+                if points is None: continue
+                left = numsyls - end
+                for (k, (sofar, back)) in states[pos].items():
+                    feetleft = linefeet - k - 1
+                    if left < feetleft or left > feetleft * MAXFOOT: continue
+                    there = (sofar + points, (pos, f))
+                    if k + 1 not in states[end] or there < states[end][k + 1]:
+                        states[end][k + 1] = there
+        if linefeet not in states[numsyls]: return [], 100
+        (points, back) = states[numsyls][linefeet]
+        division = []
+        k = linefeet
+        while back:
+            (pos, f) = back
+            division.insert(0, f)
+            k -= 1
+            back = states[pos][k][1]
+        return division, points
+
+    def _fallingComplexity(self, metron, footlist):
+        """Add up points for each foot but the trochee or dactyl, as
+        _divideFalling does."""
+        if not footlist: return 100
+        if (self.LD.data['lfeetset']
+              and len(footlist) != self.LD.data['lfeet']): return 100
+        points = 0
+        for inx, f in enumerate(footlist):
+            footpoints = _fallingPoints(metron, f, inx == len(footlist) - 1)
+            if footpoints is None: return 100
+            points += footpoints
+        return points
+
+    def FallingDivision(self, logger, metron):
+        """Divide the trochaic or dactylic line into feet at least cost."""
+        marks = self.P.GetMarks()
+        (footlist, points) = self.DoFalling(metron, marks)
+        if not footlist:
+            logger.Explain("\nFAIL! no division into known feet")
+            return self.P.GetScanString(), False
+        sylinx = 0
+        for footname in footlist:
+            self.LD.appendFoot(footname)
+            sylinx += feet.Length(footname)
+            if sylinx < len(marks): self.P.AddFootDivMark(sylinx)
+        self.LD.data['lastfoot'] = ''
+        logger.ExpFallingDivision(metron, footlist, points)
+        return self.P.GetScanString(), True
+
+    def FallingReport(self, logger, metron):
+        """Report results of trochaic or dactylic scansion, as HowWeDoing.
+
+        A catalectic last foot is not counted as a substitution.
+        """
+        fl = self.LD.data['footlist']
+        if self.LD.data['lfeetset'] and len(fl) != self.LD.data['lfeet']:
+            logger.ExpEndGame(fl, 100)		# flag of despair!
+            return self.P.GetScanString(), False
+        substitutions = 0
+        for inx, f in enumerate(fl):
+            if f == normalFeet[metron]: continue
+            if inx == len(fl) - 1 and f in catalecticFeet[metron]: continue
+            substitutions += 1
+        logger.ExpEndGame(fl, substitutions)
+        return self.P.GetScanString(), True
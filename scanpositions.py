@@ -22,28 +22,52 @@
 # to promotions (especially in iambics) end up using them, good. If not,
 # sooner or later these lines should be deleted.
 
-import sre
 import copy
+import re
+import string
 from scanstrings import *
 from scanutilities import *
+from scanfeet import *
+
+# charlist is a bytearray, whose items are numbers, not characters
+SCANMARKS = bytearray('x/%')
+LEXMARKS = bytearray('x/')
+_FOOTDIV = ord(FOOTDIV)
+# for rendering it: what GetScanString blanks, and what GetMarks drops
+PUNCT = '-.,;:?!()"\''
+_blankFeet = string.maketrans(FOOTDIV, ' ')
+_blankPunct = string.maketrans(PUNCT, ' ' * len(PUNCT))
+_blankFeetAndPunct = string.maketrans(FOOTDIV + PUNCT,
+                                      ' ' * (len(PUNCT) + 1))
+_sylsOnly = ''.join([(SYLMARK, ' ')[chr(c) in ' ' + FOOTDIV + PUNCT]
+                     for c in range(256)])
+_scanMarkRE = re.compile('[%s]' % re.escape(str(SCANMARKS)))
 
 class Positioner:
     def __init__(self):
-        self.charlist = []		# one item per char in the printed line of text
+        self.charlist = bytearray()	# one byte per char in the printed line
+        self.rendered = {}		# strings made from charlist since it changed
         self.sylmids = []		# indices of positions of middles of syllables
         self.footplace = [0]	# indices of positions of possible foot divs
-        self.possLexicals = []	# list of scanstrings, ambiguities resolved
+        self.lexmarks = []		# lexical marks, one part per syl or ambig word
+        self.ambiguities = []	# (index in lexmarks, (stressed, unstressed))
         self.punctAt = []		# to check on caesurae
+        self.punctBefore = []	# per position, nearest punct at or before
+        self.indexed = 0		# positions punctBefore has been filled for
         self.promCands = []
         self.wordbounds = []	# index of pos after each word (NOT USED)
         self.scanMarkMoved = False	# silly flag; see FindEmptyPosForMark
     
     def NewLine(self, linelength):
-        self.charlist = (linelength + 1) * [' '] # extra for possible footdiv
+        self.charlist = bytearray(' ') * (linelength + 1) # extra for footdiv
+        self.rendered = {}
         self.sylmids = []
         self.footplace = [0]			# keep 0-based, parallel to sylmids[]
-        self.possLexicals = []
+        self.lexmarks = []
+        self.ambiguities = []
         self.punctAt = []
+        self.punctBefore = [0] * len(self.charlist)
+        self.indexed = 0
         self.promCands = []
         self.wordbounds = []
 
@@ -54,8 +78,13 @@ class Positioner:
         This function has grown. It tracks not only the midpoint of each 
         syllable in the printed line (sylmids) and its end (a possible foot-
         division point), and stress or slack marks to the spaced-out line
-        (charlist), but also tracks ambiguous stresses (multiplying the lines
-        of possible lexical marks) and candidates for promotion.
+        (charlist), but also tracks ambiguous stresses and candidates for
+        promotion.
+
+        Each ambiguous word is one two-way choice in a small lattice: a slot
+        in the list of lexical marks, plus its two possible readings. Lines
+        of lexical marks are made from it only on demand (GetAmbiguities),
+        so k ambiguous words cost k slots, not 2**k strings.
         """
         self.promCands.extend([0 for x in range(len(syls))])
         sylinx = len(self.sylmids)
@@ -75,27 +104,21 @@ class Positioner:
                 if s.isupper():			# enforces ALL CAPS rule!
                     ambiguous = False
                     break
-        if ambiguous:
-            if len(self.possLexicals) == 0:
-                self.possLexicals.append(self.GetMarks())
-            halfway = len(self.possLexicals)
-            self.possLexicals *= 2			# each ambiguity doubles the list
-            for pL in range(0, halfway):
-                if len(syls) == 1: self.possLexicals[pL] += STRESS
-                else: self.possLexicals[pL] += (STRESS + SLACK)
-            for pL in range(halfway, len(self.possLexicals)):
-                if len(syls) == 1: self.possLexicals[pL] += SLACK
-                else: self.possLexicals[pL] += (SLACK + STRESS)
+        if ambiguous:		# (two marks, however many syllables)
+            if len(syls) == 1: readings = (STRESS, SLACK)
+            else: readings = (STRESS + SLACK, SLACK + STRESS)
+            self.ambiguities.append((len(self.lexmarks), readings))
+            self.lexmarks.append('')		# slot filled by GetAmbiguities
         for s in syls:
             self.sylmids.append(linePos + (len(s) // 2))
             if s.isupper(): newmark = STRESS	# enforces ALL CAPS rule!
             else: newmark = SLACK
             self.AddScanMark(newmark, len(self.sylmids) - 1)
-            if not ambiguous:		# if ambig, this is already done
-                for pL in range(len(self.possLexicals)):
-                    self.possLexicals[pL] += newmark
+            if not ambiguous:		# if ambig, its slot stands for it
+                self.lexmarks.append(newmark)
             linePos += len(s)
         self.wordbounds.append(linePos)	# not used (punct only); but...
+        self._indexPunct(linePos)
         return linePos
 
     def LocateFootDivPositions(self):
@@ -111,15 +134,36 @@ class Positioner:
             self.footplace.append(self.sylmids[syl] + (self.sylmids[syl + 1]
                                                    - self.sylmids[syl]) // 2)
         self.footplace.append(len(self.charlist) - 1)
+        self._indexPunct(len(self.charlist))
     
     def AddPunct(self, str, linePos):
         for c in str:			# skip spaces, record punct for (?) later use
             if not c.isspace():
+                if isinstance(c, unicode): c = c.encode('ascii', 'replace')
                 self.charlist[linePos] = c
+                self._indexPunct(linePos)
                 self.punctAt.append(linePos)
             linePos += 1
+        self._indexPunct(linePos)
+        self._changed()
         return linePos
+
+    def _indexPunct(self, end):
+        """Fill punctBefore up to end with the last punctuation so far.
+
+        AddWord and AddPunct call this as they go along the line, so the
+        index is whole once LocateFootDivPositions has filled in the rest.
+        Position 0 stands for none (PunctBound never looks there).
+        """
+        if self.punctAt: last = self.punctAt[-1]
+        else: last = 0
+        self.punctBefore[self.indexed:end] = [last] * (end - self.indexed)
+        self.indexed = max(self.indexed, end)
     
+    def _changed(self):
+        """Forget the strings made from charlist; it has changed."""
+        self.rendered = {}
+
     def AddScanMark(self, mark, syllable):
         """Insert given mark into charlist of (spaced) scansion marks.
         
@@ -128,6 +172,7 @@ class Positioner:
         """
         if syllable > len(self.sylmids): return		# major woops
         self.charlist[self.sylmids[syllable]] = mark
+        self._changed()
     
     def AddFootDivMark(self, syllable):
         """Place a foot-division mark *before* the specified syllable."""
@@ -138,10 +183,12 @@ class Positioner:
         else: pos = self.footplace[syllable]
         pos = self.FindEmptyPosForMark(pos)
         self.charlist[pos] = FOOTDIV
+        self._changed()
     
     def EraseFootDivMark(self, syllable):
         """Replace internal-to-line footdiv with space to "move" a footdiv."""
         self.charlist[self.footplace[syllable]] = ' '
+        self._changed()
     
     def FindEmptyPosForMark(self, pos):
         """Find a nondestructive spot for a footdiv mark.
@@ -161,8 +208,8 @@ class Positioner:
         This can silently overwrite marks of punctuation in charlist.
         We don't need them by this time, so it should be OK.
         """
-        SCANMARKS = 'x/%'
         if self.charlist[pos] not in SCANMARKS: return pos
+        self._changed()
         if pos == 0 and self.charlist[0] in SCANMARKS:
             self.charlist[1] = self.charlist[0]
             self.scanMarkMoved = True		# flag to move back later!
@@ -177,22 +224,96 @@ class Positioner:
         return pos
 
     def GetAmbiguities(self):
-        """Return list of 1 or more possible
-        resolutions of stress ambiguities"""
-        if len(self.possLexicals) > 0: return self.possLexicals
-        else: return [self.GetMarks()]
+        """Generate 1 or more possible resolutions of stress ambiguities.
+
+        Resolution number i reads ambiguous word j as stressed if bit j of i
+        is 0, unstressed if it is 1 (the order in which the old doubled
+        list held them). Each line of marks is made only when asked for.
+        """
+        if not self.ambiguities:
+            yield self.GetMarks()
+            return
+        parts = self.lexmarks[:]
+        for i in xrange(self.CountAmbiguities()):
+            for (j, (slot, readings)) in enumerate(self.ambiguities):
+                parts[slot] = readings[(i >> j) & 1]
+            yield ''.join(parts)
+
+    def CountAmbiguities(self):
+        """Return how many resolutions GetAmbiguities will generate."""
+        return 1 << len(self.ambiguities)
+
+    def CountAmbiguousWords(self):
+        return len(self.ambiguities)
+
+    def GetResolution(self, choice):
+        """Return the line of marks for resolution number choice, as
+        GetAmbiguities numbers them, without generating the others."""
+        parts = self.lexmarks[:]
+        for (j, (slot, readings)) in enumerate(self.ambiguities):
+            parts[slot] = readings[(choice >> j) & 1]
+        return ''.join(parts)
 
     def GetMarks(self, includeFeet=False):
         """Return unspaced line of marks: x, /, and |"""
-        return ''.join(self.GetScanString(includeFeet).split())
+        key = ('marks', includeFeet)
+        if key not in self.rendered:
+            if includeFeet: drop = ' ' + PUNCT
+            else: drop = ' ' + FOOTDIV + PUNCT
+            self.rendered[key] = str(self.charlist).translate(None, drop)
+        return self.rendered[key]
 
     def GetScanString(self, feet = True, punct = False, sylsOnly = False):
-        """Return fully spaced line of all scansion marks (with options)"""
-        s = ''.join(self.charlist)
-        if not feet or sylsOnly: s = sre.sub('\|', ' ', s)
-        if not punct or sylsOnly: s = sre.sub('[-.,;:?!\(\)\"\']', ' ', s)
-        if sylsOnly: s = sre.sub('[^ ]', SYLMARK, s)
-        return s
+        """Return fully spaced line of all scansion marks (with options)
+
+        Each string is made once from charlist and kept until it changes.
+        """
+        key = (feet, punct, sylsOnly)
+        if key not in self.rendered:
+            if sylsOnly: table = _sylsOnly
+            elif feet and punct: table = None
+            elif feet: table = _blankPunct
+            elif punct: table = _blankFeet
+            else: table = _blankFeetAndPunct
+            s = str(self.charlist)
+            if table: s = s.translate(table)
+            self.rendered[key] = s
+        return self.rendered[key]
+
+    def Snapshot(self):
+        """Return the marks as they stand, for Restore to put back."""
+        return str(self.charlist)
+
+    def Restore(self, snapshot):
+        self.charlist = bytearray(snapshot)
+        self._changed()
+
+    def ParsedState(self):
+        """Return all that ParseLine laid down for a line, for SetParsedState
+        to put back instead of parsing the line again. Scansion changes
+        none of it but charlist, so only that is copied back out.
+        """
+        return (str(self.charlist), tuple(self.sylmids),
+                tuple(self.footplace), tuple(self.lexmarks),
+                tuple(self.ambiguities), tuple(self.punctAt),
+                tuple(self.punctBefore), tuple(self.promCands),
+                tuple(self.wordbounds))
+
+    def SetParsedState(self, state):
+        """Stand as just after ParseLine made the state (see NewLine)."""
+        (charlist, sylmids, footplace, lexmarks, ambiguities, punctAt,
+         punctBefore, promCands, wordbounds) = state
+        self.charlist = bytearray(charlist)
+        self.rendered = {}
+        self.sylmids = list(sylmids)
+        self.footplace = list(footplace)
+        self.lexmarks = list(lexmarks)
+        self.ambiguities = list(ambiguities)
+        self.punctAt = list(punctAt)
+        self.punctBefore = list(punctBefore)
+        self.indexed = len(punctBefore)
+        self.promCands = list(promCands)
+        self.wordbounds = list(wordbounds)
     
     def AdjustMarks(self, scansion):
         """Correct marks in charlist to correspond to given scansion.
@@ -203,9 +324,10 @@ class Positioner:
         last one tried will likely not have been the one finally chosen, so we
         correct the condition of charlist to reflect the final choice.
         """
+        self._changed()
         i = 0		# index in unspaced line of marks
         for c in range(len(self.charlist)):	# index in spaced line
-            if self.charlist[c] in 'x/':
+            if self.charlist[c] in LEXMARKS:
                 self.charlist[c] = scansion[i]
                 i += 1
             if i >= len(scansion):
@@ -227,19 +349,21 @@ class Positioner:
         self._removeHeadFootMark()
     
     def _removeTailFootMark(self):
-        lastfootdiv = ''.join(self.charlist).rfind(FOOTDIV)
+        lastfootdiv = self.charlist.rfind(FOOTDIV)
         if lastfootdiv == -1:
             return
         islastmark = True
         for c in self.charlist[lastfootdiv:]:
-            if c in 'x/%':		# some scan mark follows last footdiv
+            if c in SCANMARKS:		# some scan mark follows last footdiv
                 islastmark = False
                 break
         if islastmark:
             self.charlist[lastfootdiv] = ' '
+            self._changed()
     
     def _removeHeadFootMark(self):
-        if self.charlist[0] == FOOTDIV:
+        if self.charlist[0] == _FOOTDIV:
+            self._changed()
             if self.scanMarkMoved:
                 self.charlist[0] = self.charlist[1]
                 self.charlist[1] = ' '
@@ -247,21 +371,41 @@ class Positioner:
             else:
                 self.charlist[0] = ' '
  
+    def PunctBound(self, syllable):
+        """What comes first before the foot division at this syllable.
+
+        True if, looking leftward from footplace[syllable], punctuation
+        comes before any scansion mark; False if a mark does; None if
+        neither does before the start of the line. Punctuation never moves,
+        so where the nearest is comes from punctBefore; scansion marks can
+        (foot-division marks shift them), so charlist is searched for one,
+        but only between there and the foot division.
+        """
+        place = self.footplace[syllable]
+        punct = self.punctBefore[place]
+        if _scanMarkRE.search(self.charlist, punct + 1, place + 1):
+            return False
+        if punct: return True
+        return None
+
     def FeetAtPunctBounds(self, footlist):
-        d = dictinvert(footDict)
+        (lengths, ids) = (feet.lengths, feet.ids)
         retlist = [True]
         i = 0
         for f in footlist:
-            i += len(d[f][0]) # invert turns str. to *lists* of one string each
+            i += lengths[ids[f]]
             if i >= len(self.footplace):
                 return retlist
-            ip = self.footplace[i]
-            while ip:
-                if ip in self.punctAt:
-                    retlist.append(True)
-                    break
-                elif self.charlist[ip] in 'x/%':
-                    retlist.append(False)
-                    break
-                ip -= 1
+            bound = self.PunctBound(i)
+            if bound is not None: retlist.append(bound)
         return retlist
+
+    def SyllableAtPunctBound(self, syllable):
+        """Would a foot starting at this syllable follow punctuation?
+
+        The test FeetAtPunctBounds makes for each foot, for one position;
+        the line's first syllable counts as bounded.
+        """
+        if syllable == 0: return True
+        if syllable >= len(self.footplace): return False
+        return bool(self.PunctBound(syllable))
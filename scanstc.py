@@ -13,10 +13,13 @@
 # Also we subclass TextCtrl for a generic one-line read-only control, and
 # subclass that for our text line and its scansion; want specialized
 # methods for each of those. Constrained to non-proportional fonts!
+# The dialog for correcting a dictionary entry is here too, so that
+# dictfuncs.py can be used without wx.
 
 import wx
 import wx.stc as stc
 from scanstrings import *
+from scandoc import *
 
 import traceback
 
@@ -83,6 +86,7 @@ class MyLineTC(MyOneLineTC):
             traceback.print_exc()
             return
         if result:
+            self.GetParent().WordEdited(clicked)	# other lines using it
             self.GetParent().RestartLineAfterCancel()
         else:		# canceled; just un-select
             self.SetSelection(0, 0)
@@ -111,6 +115,9 @@ class MyTextSTC(stc.StyledTextCtrl):
         self.StyleSetSpec(stc.STC_STYLE_DEFAULT, "size:14,face:Courier")
         self.Bind(stc.EVT_STC_DOUBLECLICK, self.OnDoubleClick)
         self.Bind(stc.EVT_STC_CHANGE, self.OnChange)
+        self.lineIndex = LineIndex()	# what each line is; see scandoc.py
+        self.SetModEventMask(stc.STC_MOD_INSERTTEXT | stc.STC_MOD_DELETETEXT)
+        self.Bind(stc.EVT_STC_MODIFIED, self.OnModified)
         ##bug: after line is double-clicked up to scansion work area, it
         ##becomes impossible to type in the main window
         ##first experiment in fixing this: bind an on-click event, and have
@@ -136,7 +143,21 @@ class MyTextSTC(stc.StyledTextCtrl):
 
     def OnChange(self, event):
         self.ToggleLineNumbers()
+        self.GetParent().ScheduleRescan()	# if an edit made any stale
     
+    def OnModified(self, event):
+        """Tell the LineIndex which lines an insertion or deletion made."""
+        modtype = event.GetModificationType()
+        if modtype & (stc.STC_MOD_INSERTTEXT | stc.STC_MOD_DELETETEXT):
+            first = self.LineFromPosition(event.GetPosition())
+            added = event.GetLinesAdded()
+            if modtype & stc.STC_MOD_INSERTTEXT:	# one line became several
+                (count, now) = (1, 1 + added)
+            else: (count, now) = (1 - added, 1)	# several became one
+            self.lineIndex.Replace(first, count, [self.GetLine(n)
+                                   for n in range(first, first + now)])
+        event.Skip()
+
     def ToggleLineNumbers(self):
         if self.lineNumsVisible:
             lines = self.GetLineCount()
@@ -149,10 +170,10 @@ class MyTextSTC(stc.StyledTextCtrl):
             self.SetMarginWidth(1, 10)
     
     def DisplayText(self, text):
+        """Show a text, every line ended by a newline, in one SetText
+        (one change, one margin update, one layout)."""
         self.SetReadOnly(0)
-        self.ClearAll()
-        for line in text.splitlines():
-            self.AddText(line + '\n')
+        self.SetText(''.join([line + '\n' for line in text.splitlines()]))
         if len(self.GetLine(self.GetLineCount())) > 2:	# non-blank last line
             self.AddText('\n')		# make GetNextUnscanned work on last
         self.SetFocus()
@@ -162,10 +183,13 @@ class MyTextSTC(stc.StyledTextCtrl):
 
     def IsScanLine(self, number):
         """Return True/False for arg line contains scansion marks"""
-        line = self.GetLine(number)
-        if line.find(STRESS) != -1 or line.find(SYLMARK) != -1: 
-            return True			# NOT a sophisticated test
-        else: return False
+        return (0 <= number < len(self.lineIndex)
+                and self.lineIndex.kinds[number] == SCANSION)
+
+    def ScannedCounts(self):
+        """Return (verse lines with scansions, all verse lines)."""
+        scanned = self.lineIndex.Count(SCANNED)
+        return scanned, scanned + self.lineIndex.Count(VERSE)
         
     def GetNextUnscannedLine(self):
         """Find next scannable text line at or below cursor.
@@ -178,20 +202,17 @@ class MyTextSTC(stc.StyledTextCtrl):
         The not-in-a-selection trick is to allow the current line (rather than
         the one following) to be selected, but for an immediately following
         get-next-line command to move forward from it.
+
+        The LineIndex knows where the unscanned verse lines are, so this
+        takes no walk through the lines between.
         """
-        ourpos = self.GetCurrentPos()
-        aline = self.LineFromPosition(ourpos)
+        aline = self.LineFromPosition(self.GetCurrentPos())
         last = self.GetLineCount() - 1
         (start, end) = self.GetSelection()
-        while aline < last:
-            line = self.GetLine(aline)
-            if len(line) > 0 and not line.isspace() and line[0] != '\t' and \
-                            not self.IsScanLine(aline) and (start == end and \
-                            (aline == 0 or not self.IsScanLine(aline - 1))):
-                break			# we have our target line
-            end = start		# dummy to get next line selected
-            aline += 1
-            self.GotoLine(aline)
+        if start != end: aline += 1	# the selected line is done with
+        aline = self.lineIndex.NextLine(VERSE, aline)
+        if aline is None or aline >= last: aline = last
+        self.GotoLine(aline)
         if aline < last:
             self.SelectTheLine(aline)
             return True		# not used!
@@ -215,7 +236,8 @@ class MyTextSTC(stc.StyledTextCtrl):
         self.GetParent().ShowTextLine(linetext, thelinenum)
 
     def PutLineBack(self, linenum, thescansion):
-        """Place scansion over line it belongs to in Text panel"""
+        """Place scansion over line it belongs to in Text panel; return
+        the line's number now"""
         if linenum > 0 and self.IsScanLine(linenum - 1):  # scan line exists?
             linenum -= 1
             self.GotoLine(linenum)
@@ -223,6 +245,7 @@ class MyTextSTC(stc.StyledTextCtrl):
             self.SetSelection(self.GetCurrentPos(),
                               self.GetLineEndPosition(linenum))
             self.ReplaceSelection(thescansion)	# substitute newer scansion
+            return linenum + 1
         else:
             self.GotoLine(linenum)			# go back where we got it
             pos = self.GetCurrentPos()
@@ -230,6 +253,125 @@ class MyTextSTC(stc.StyledTextCtrl):
             bottomline = self.GetFirstVisibleLine() + self.LinesOnScreen()
             if linenum > bottomline - 2:
                 self.LineScroll(0, 2)
+            return linenum + 1
+
+    def ReplaceLine(self, linenum, text):
+        """Put text in place of a line, leaving the caret, selection and
+        scrolling as they are (but for the change itself)."""
+        self.SetTargetStart(self.PositionFromLine(linenum))
+        self.SetTargetEnd(self.GetLineEndPosition(linenum))
+        self.ReplaceTarget(text)
+
+    def PutLinesBack(self, scansions):
+        """Place many scansions, each over its line, in one SetText.
+
+        Scansions are (line number, scansion), numbered as the text stands
+        before any is placed; as with PutLineBack, one replaces a scansion
+        already over its line. The whole interleaved text is built in
+        memory, so storing the scansions of a long poem costs one change
+        to the control, not one per line. The caret, selection and first
+        visible line stay with the text they were at. Return the number
+        of lines inserted.
+        """
+        if not scansions: return 0
+        lines = self.GetText().splitlines(True)
+        over = dict(scansions)
+        newlines = []
+        added = [0] * (len(lines) + 1)	# lines inserted above each line
+        for (linenum, line) in enumerate(lines):
+            added[linenum + 1] = added[linenum]
+            if linenum + 1 in over and IsScansion(line): continue
+            if linenum in over:
+                newlines.append(over[linenum] + '\n')
+                if not (linenum > 0 and IsScansion(lines[linenum - 1])):
+                    added[linenum] += 1
+                    added[linenum + 1] += 1
+            newlines.append(line)
+        marks = []			# (line, column) of anchor and caret
+        for pos in (self.GetAnchor(), self.GetCurrentPos()):
+            line = self.LineFromPosition(pos)
+            marks.append((line, pos - self.PositionFromLine(line)))
+        firstline = self.GetFirstVisibleLine()
+        self.SetText(''.join(newlines))
+        positions = []
+        for (line, column) in marks:
+            line += added[min(line, len(lines))]
+            positions.append(min(self.PositionFromLine(line) + column,
+                                 self.GetLineEndPosition(line)))
+        self.SetSelection(*positions)
+        self.SetFirstVisibleLine(firstline
+                                 + added[min(firstline, len(lines))])
+        return added[len(lines)]
+
+
+class DictEditDialog(wx.Dialog):
+    def __init__(self, parent, id, syls):
+        wx.Dialog.__init__(self, None, id,
+                           style=wx.DEFAULT_DIALOG_STYLE|wx.RESIZE_BORDER)
+
+        instructions = ("The Scandroid thinks the word",
+                        "has this pattern of syllables",
+                        "and stress:\n",
+                        "Type in the corrected form,",
+                        "separating syllables with spaces,",
+                        "the stressed one ALL CAPS:\n")
+        textlines = []
+        for line in instructions:
+            text = wx.StaticText(self, -1, line)
+            textlines.append((text, 0, wx.ALL|wx.ALIGN_CENTER_HORIZONTAL, 3))
+            
+        self.wordAsKnown = wx.TextCtrl(self, -1, syls)
+        self.wordCorrected = wx.TextCtrl(self, -1, "")
+ 
+        self.OKbutton = wx.Button(self, wx.ID_OK, " OK ")
+        self.CancelButton = wx.Button(self, wx.ID_CANCEL, " Cancel ")
+ 
+        items = ((self.wordAsKnown, 3, wx.EXPAND),
+                 (self.wordCorrected, 3, wx.EXPAND),
+                 (self.OKbutton, 0, wx.ALIGN_LEFT),
+                 (self.CancelButton, 0, wx.ALIGN_RIGHT))
+                 
+        spacers = (((40, 20), 0), ((30, 30), 0), ((20, 20), 0))
+ 
+        fieldsizers = []
+        for item in items[:2]:
+            sizer = wx.BoxSizer(wx.HORIZONTAL)
+            sizer.Add(*spacers[0])
+            sizer.Add(*item)
+            sizer.Add(*spacers[0])
+            fieldsizers.append((sizer, 0, wx.EXPAND, 3))
+        
+        buttonsizer = wx.BoxSizer(wx.HORIZONTAL)
+        buttonsizer.Add(*spacers[1])
+        for item in items[2:]:
+            buttonsizer.Add(*item)
+            buttonsizer.Add(*spacers[1])
+        buttonsizer = (buttonsizer, 0, wx.EXPAND, 3)
+        
+        components = (textlines[0], textlines[1], textlines[2],
+                      fieldsizers[0], textlines[3], textlines[4],
+                      textlines[5], fieldsizers[1], buttonsizer)
+        
+        mainsizer = wx.BoxSizer(wx.VERTICAL)
+        mainsizer.Add(*spacers[2])
+        for cmpnt in components:
+            mainsizer.Add(*cmpnt)
+            if cmpnt not in textlines:
+                mainsizer.Add(*spacers[2])
+        
+        self.Bind(wx.EVT_BUTTON, self.OnOK, self.OKbutton)
+        self.SetSizer(mainsizer); self.SetAutoLayout(True)
+        mainsizer.Fit(self)
+        
+        self.wordAsKnown.SetEditable(0)
+        self.wordCorrected.SetFocus()
+        self.OKbutton.SetDefault()
+        
+    def OnOK(self, event):
+        """When DictEditDialog's OK button is pressed,
+        save the selected word."""
+        self.CorrectedWord = self.wordCorrected.GetValue()
+        event.Skip()
 
 
 def CopySelectedText(aninstance):
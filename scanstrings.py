@@ -59,11 +59,102 @@ AnapSubs = { 'xx/':'anapest', '/x/':'cretic', 'x//':'bacchius',
              '///':'molossus', '/x%':'(cretic)', '//x':'palimbacchius' }
 ##                'xx':'pyrrhic', 'xxx':'tribrach' }		# experiment!
 
+# feet for the falling metres; a lone stress may only end the line
+TrochSubs = { '/x':'trochee', '//':'spondee', 'xx':'pyrrhic', 'x/':'iamb',
+              '/xx':'dactyl', '/':'defective' }
+DactSubs = { '/xx':'dactyl', '/x':'trochee', '//':'spondee', '/x/':'cretic',
+             '//x':'palimbacchius', 'xxx':'tribrach', '/':'defective' }
+
 lineLengthName = ['','','DIMETER','TRIMETER','TETRAMETER','PENTAMETER',
                             'HEXAMETER','HEPTAMETER','OCTAMETER','NONAMETER']
 
-import wx			# only for default encoding!
-defaultEncoding = wx.GetDefaultPyEncoding()
+IAMBIC, ANAPESTIC = 2, 3		# metrons: syllables in the normal foot
+TROCHAIC, DACTYLIC = -2, -3		# falling ones (use footSizes, not these)
+METRONS = (IAMBIC, ANAPESTIC, TROCHAIC, DACTYLIC)
+metronNames = {IAMBIC: 'IAMBIC', ANAPESTIC: 'ANAPESTIC',
+               TROCHAIC: 'TROCHAIC', DACTYLIC: 'DACTYLIC'}
+normalFeet = {IAMBIC: 'iamb', ANAPESTIC: 'anapest',
+              TROCHAIC: 'trochee', DACTYLIC: 'dactyl'}
+footSizes = {IAMBIC: 2, ANAPESTIC: 3, TROCHAIC: 2, DACTYLIC: 3}	# syllables
+
+def ChooseMetron(totals):
+    """Return the metron with the lowest total score, from a dict.
+
+    Iambic wins only if lower than anapestic, as it always has; then
+    trochaic and dactylic each win only if lower than that. A metron not
+    in the dict never wins over one that is.
+    """
+    if IAMBIC in totals and (ANAPESTIC not in totals
+                             or totals[IAMBIC] < totals[ANAPESTIC]):
+        metron = IAMBIC
+    else: metron = ANAPESTIC
+    for falling in (TROCHAIC, DACTYLIC):
+        if falling in totals and (metron not in totals
+                                  or totals[falling] < totals[metron]):
+            metron = falling
+    return metron
+
+def VoteMetron(votes, scores):
+    """Add a line's vote to a dict of votes, from its {metron: score}:
+    for the metron that scored it lowest (as ChooseMetron), among those
+    that could scan it at all (scored under 100)."""
+    scannable = dict([(m, score) for (m, score) in scores.items()
+                      if score < 100])
+    if scannable:
+        vote = ChooseMetron(scannable)
+        votes[vote] = votes.get(vote, 0) + 1
+
+def ChooseVotedMetron(votes, totals):
+    """Return the metron with most votes (see VoteMetron); a tie goes to
+    the lowest total, as ChooseMetron; with no votes, all go by totals.
+
+    Totals alone let every line a falling metre can't scan charge it 100,
+    so iambs beat trochees even where most lines are trochaic.
+    """
+    if not votes: return ChooseMetron(totals)
+    most = max(votes.values())
+    return ChooseMetron(dict([(m, totals.get(m, 0))
+                              for (m, n) in votes.items() if n == most]))
+
+FORKSTEP = 3		# in iambics, the step at which the algorithms divide
+# when an iambic algorithm fails, the one to try instead
+fallbackAlgorithm = {1: 2, 2: 1, 3: 1}
+
+# points for each substitution for the iamb (see _measureComplexity),
+# and for especially disruptive positions of trochees and defectives
+iambicPoints = {'spondee': 2, 'pyrrhic': 2, 'trochee': 2,
+                'anapest': 4, 'defective': 4, '3rd paeon': 4,
+                'amphibrach': 4, 'palimbacchius': 4, '2nd paeon': 4,
+                'dactyl': 10, 'cretic': 10, 'bacchius': 10}
+SCAZONPOINTS = 6		# trochee as last foot
+SPRUNGPOINTS = 8		# trochee after trochee
+OFFBOUNDPOINTS = 4		# trochee or defective not after punctuation
+# points for each substitution for the anapest (see _anapComplexity);
+# here a promoted foot is scored as itself
+anapesticPoints = {'(anapest)': 1, 'bacchius': 2, 'iamb': 2, '(iamb)': 2,
+                   'cretic': 4, 'spondee': 4, 'pyrrhic': 4, 'amphibrach': 4,
+                   '3rd paeon': 4, '2nd paeon': 5, 'molossus': 5,
+                   'palimbacchius': 5}
+# points for each substitution for the trochee and the dactyl (see
+# _divideFalling); a catalectic last foot, short of the normal one, costs
+# only CATALEXISPOINTS, and a lone stress may not come before the end
+trochaicPoints = {'spondee': 2, 'pyrrhic': 2, 'iamb': 4, 'dactyl': 4}
+dactylicPoints = {'trochee': 2, 'spondee': 2, 'cretic': 4,
+                  'palimbacchius': 4, 'tribrach': 4}
+catalecticFeet = {TROCHAIC: ('defective',),
+                  DACTYLIC: ('trochee', 'defective')}
+CATALEXISPOINTS = 1
+
+# feet iambic Algorithm 3 may divide a line into; those ending in an extra
+# slack may only end the line
+leastCostFeet = ['x/', 'xx', '//', '/x', 'xx/', '/', '/x/', 'x//']
+leastCostEndFeet = ['x/x', '//x', 'x/xx', 'xx/x', '/xx']
+
+try:
+    import wx			# only for default encoding!
+    defaultEncoding = wx.GetDefaultPyEncoding()
+except ImportError:		# running headless, as from scanbatch.py
+    defaultEncoding = 'utf-8'
 
 class Explainer:
     """Send pedagogically useful (?) notes to the Notes frame about each step.
@@ -82,8 +173,8 @@ class Explainer:
     def ExpDeduceParams(self, metron, linelen, linelenset):
         sall1 = "The Scandroid has sampled the lines, and deduced:\n"
         sall2 = "     -- that the basic foot is the "
-        siamb = "IAMB (x/).\n"
-        sanap = "ANAPEST (xx/).\n"
+        sfoot = {IAMBIC: "IAMB (x/).\n", ANAPESTIC: "ANAPEST (xx/).\n",
+                 TROCHAIC: "TROCHEE (/x).\n", DACTYLIC: "DACTYL (/xx).\n"}
         snotset1 = ("     -- that the lines are not consistent "
                                      + "in length (in feet),\n")
         snotset2 = ("          so it will figure length line by line, "
@@ -93,15 +184,22 @@ class Explainer:
         sset3 = " feet."
         sall3 = "\nThese conclusions could be wrong. The Scan menu lets you "
         sall4 = "force the choice of basic foot."
-        if metron == 2:
-            self.Explain(''.join([sall1, sall2, siamb]))
-        else:
-            self.Explain(''.join([sall1, sall2, sanap]))
+        self.Explain(''.join([sall1, sall2, sfoot[metron]]))
         if linelenset:
             self.Explain(''.join([sset1, sset2, sset3, sall3, sall4]))
         else:
             self.Explain(''.join([snotset1, snotset2, sall3, sall4]))
 
+    def ExpSections(self, sections):
+        self.Explain("\nThe metre changes partway through the text:")
+        for s in sections:
+            if s.linefeetset and s.linefeet < len(lineLengthName):
+                length = lineLengthName[s.linefeet]
+            else: length = "(lines vary in length)"
+            self.Explain("\n     -- lines %s to %s: %s %s" % (s.firstline + 1,
+                         s.lastline + 1, metronNames[s.metron], length))
+        self.Explain("\nEach line is scanned in the metre of its part.\n")
+
     ## - - methods explaining normal workings of each step, each algorithm
 
     def ExpParseLine(self, dictwords, compwords):
@@ -125,16 +223,16 @@ class Explainer:
                      + "resolved in the next step")
         
     def ExpChooseAlg(self, alg, ambigs):
-        sall1 = "\nthe Scandroid knows two approaches to dividing the line "
-        sall2 = "into feet; it has tried both, and chosen "
-        salg1 = "Algorithm 1 (Corral the Weird)"
-        salg2 = "Algorithm 2 (Maximize the Normal)"
+        sall1 = "\nthe Scandroid knows three approaches to dividing the line "
+        sall2 = "into feet; it has tried those in use, and chosen "
+        salgs = {1: "Algorithm 1 (Corral the Weird)",
+                 2: "Algorithm 2 (Maximize the Normal)",
+                 3: "Algorithm 3 (Least Cost)"}
         sall3 = "\n(you can force the choice; see the Scan menu)"
         sambig1 = ("\n\nthe program also decided one "
                               + "or more ambiguous stresses ")
         sambig2 = "and adjusted the lexical stresses accordingly"
-        if alg == 1: self.Explain(''.join([sall1, sall2, salg1, sall3]))
-        else: self.Explain(''.join([sall1, sall2, salg2, sall3]))
+        self.Explain(''.join([sall1, sall2, salgs[alg], sall3]))
         if ambigs > 1: self.Explain(''.join([sambig1, sambig2]))
 
     def ExpWeirdEnds(self, lastfoot, footlist):
@@ -167,6 +265,22 @@ class Explainer:
             s2 = "one or more anapests (xx/) to make up the difference"
         self.Explain(''.join([sall, s1, s2]))
 
+    def ExpBestDivision(self, feet, points):
+        s1 = "      <begin Algorithm 3: Least Cost>"
+        s2 = ("\nof all the ways to divide the line into %s feet, "
+                                                       % len(feet))
+        s3 = "take the one whose substitutions for the iamb cost least "
+        s4 = "(%s points)" % points
+        self.Explain(''.join([s1, s2, s3, s4]))
+
+    def ExpFallingDivision(self, metron, feet, points):
+        s1 = ("\nof all the ways to divide the line into %s feet, "
+                                                       % len(feet))
+        s2 = ("take the one whose substitutions for the %s cost least "
+                                                       % normalFeet[metron])
+        s3 = "(%s points; a short last foot costs little)" % points
+        self.Explain(''.join([s1, s2, s3]))
+
     def ExpREMain(self, start, length, tail, feet, totalfeet):
         s1 = "      <begin Algorithm 2: Maximize the Normal>\nLongest run of "
         s2 = ("iambs (x/) and potential iambs (xx) from syllable %s "
@@ -214,14 +328,12 @@ class Explainer:
             self.Explain(''.join([s3, s4]))
             
     def ExpRestartNewIambicAlg(self, algorithm, scanline):
-        if algorithm == 1:
-            s1 = "\n\nAlgorithm 1 (Corral the Exceptional) FAILED\n"
-            s2 = "with this result: %s" % scanline
-            s3 = "\n\nTry Algorithm 2 (Maximize the Normal)\n"
-        else:
-            s1 = "\n\nAlgorithm 2 (Maximize the Normal) FAILED\n"
-            s2 = "with this result: %s" % scanline
-            s3 = "\n\nTry Algorithm 1 (Corral the Exceptional)\n"
+        salgs = {1: "Algorithm 1 (Corral the Exceptional)",
+                 2: "Algorithm 2 (Maximize the Normal)",
+                 3: "Algorithm 3 (Least Cost)"}
+        s1 = "\n\n%s FAILED\n" % salgs[algorithm]
+        s2 = "with this result: %s" % scanline
+        s3 = "\n\nTry %s\n" % salgs[fallbackAlgorithm[algorithm]]
         s4 = "\nReturn the scansion to lexical stresses only"
         self.Explain(''.join([s1, s2, s3,s4]))
 
@@ -229,7 +341,7 @@ class Explainer:
     
     def ExpAnapGetBest(self, numtried, results):
         if numtried > 1:
-            s1 = "\nthe program tried all %s resolutions of " % numtried
+            s1 = "\nthe program tried %s resolutions of " % numtried
             s2 = "stress ambiguities; "
             self.Explain(''.join([s1, s2]))
         else:
@@ -244,6 +356,23 @@ class Explainer:
         else:
             self.Explain("could not find a scannable line of lexical stresses")
                 
+    def ExpFallingGetBest(self, metron, numtried, results):
+        if numtried > 1:
+            s1 = "\nthe program tried %s resolutions of stress " % numtried
+            s2 = "ambiguities, dividing each into %ss; " % normalFeet[metron]
+            self.Explain(''.join([s1, s2]))
+        else:
+            self.Explain("\nthere were no stress ambiguities to be resolved; ")
+        if not results:
+            self.Explain("none of them could be divided into %s feet"
+                         % metronNames[metron].lower())
+        elif results == 1:
+            self.Explain("found one division into feet that costs least")
+        else:
+            s1 = "%s divide at the same least cost; " % results
+            s2 = "chose one at random"
+            self.Explain(''.join([s1, s2]))
+
     def ExpAnapEnd(self, lastfoot):
         self.Explain("\nlooked for special (terminal-slack) last feet; found ")
         if lastfoot: self.Explain(lastfoot)
@@ -272,3 +401,40 @@ class Explainer:
         if footAdjust:
             self.Explain("\n(replaced iamb+cretic with "
                          + "bacchius+iamb for regularity)")
+
+
+class NullExplainer:
+    """An Explainer that says nothing, for scanning nobody will read about.
+
+    It answers every method the Explainer has and does no work at all, so
+    batch scanning pays nothing for the prose. (The methods are filled in
+    from Explainer's own, just below, so the two can't drift apart.)
+    """
+    def __init__(self, target=None): pass
+
+
+class RecordingExplainer:
+    """An Explainer that keeps what it's told as events, not prose.
+
+    Each call becomes (method name, arguments) in self.events; lists among
+    the arguments are copied, since the engine goes on changing its own.
+    Use Clear between lines if only the current line's events are wanted.
+    """
+    def __init__(self, target=None): self.events = []
+
+    def Clear(self): del self.events[:]
+
+
+def _explainNothing(self, *args, **kwargs): pass
+
+def _explainAsEvent(name):
+    def record(self, *args):
+        self.events.append((name, tuple([a[:] if isinstance(a, list) else a
+                                         for a in args])))
+    return record
+
+for _name in dir(Explainer):
+    if _name == 'Explain' or _name.startswith('Exp'):
+        setattr(NullExplainer, _name, _explainNothing)
+        setattr(RecordingExplainer, _name, _explainAsEvent(_name))
+del _name
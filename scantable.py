@@ -0,0 +1,267 @@
+# scantable.py 1.5
+#
+# the Scandroid
+# Copyright (C) 2005 Charles Hartman
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version. See the accompanying file, gpl.txt, for full
+# details.
+# OSI Certified Open Source Software
+#
+# This module builds, saves, and looks things up in the foot table: the feet
+# each iambic algorithm and the anapestic scanner find for every line of
+# lexical marks up to some number of syllables, and every line length in feet
+# in some range. Lines of verse are short and the marks are only 'x' and '/'
+# ('%' comes later, with promotions), so there are few enough such lines to
+# divide them all in advance, once:
+#
+#     python scantable.py [--syllables 12] [--feet 1-6] [-o scantable.dat]
+#
+# after which ScansionMachine.DoAlgorithm and .scanAnapestics look up a line
+# instead of dividing it, and divide only lines the table doesn't cover.
+#
+# Each line of marks has a place in the table by its length and its marks
+# read as a binary number ('x' 0, '/' 1); the table holds, for each kind of
+# division (iambic Algorithms 1, 2, 3, anapestic) and each length in feet,
+# one 16-bit number per line of marks: the index of its feet in a list of
+# the distinct lists of feet found, of which number 0 is "none". The file:
+# an 8-byte magic string, the signature of the definitions the table was
+# built from, the limits, and then, zlib-compressed, the lists of feet (one
+# per text line, names separated by commas) and the numbers (unsigned 16-bit
+# little-endian). A table whose signature doesn't match the definitions in
+# scanstrings is not used; rebuild it after changing them (or the ways of
+# dividing lines into feet, when TABLEVERSION should be raised too).
+# Since a change to the code alone leaves the signature as it was,
+#
+#     python scantable.py --check
+#
+# divides the shorter lines of marks again and compares what it finds with
+# the saved table (as scanbench.py does on every run); exit status 1 means
+# the table is stale, or missing, and should be rebuilt.
+#
+# Algorithm 3 weighs where the punctuation falls; the table holds its
+# divisions for lines whose only bound is the start of the line.
+
+import os
+import sys
+import struct
+import zlib
+from array import array
+from hashlib import md5
+from scanstrings import *
+
+MAGIC = 'SCNTBL01'
+HEADER = struct.Struct('<8s16sBBBI')	# magic, signature, limits, pool size
+TABLEVERSION = 1	# raise whenever DoAlgorithm or scanAnapestics change
+KINDS = (1, 2, 3, 'anapestic')		# iambic algorithms, then anapestic
+MAXSYLLABLES = 12
+MINFEET, MAXFEET = 1, 6
+CHECKSYLLABLES = 8	# lines of marks up to this long are divided again
+TABLEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'scantable.dat')
+
+def Signature():
+    """Digest of the definitions the feet found depend on."""
+    defs = (TABLEVERSION, KINDS, sorted(footDict.items()),
+            sorted(AnapSubs.items()), sorted(iambicPoints.items()),
+            leastCostFeet, leastCostEndFeet,
+            SCAZONPOINTS, SPRUNGPOINTS, OFFBOUNDPOINTS)
+    return md5(repr(defs)).digest()
+
+def _allMarks(numsyls):
+    """Generate every line of lexical marks of numsyls, in table order."""
+    for value in xrange(1 << numsyls):
+        bits = [(value >> b) & 1 for b in range(numsyls - 1, -1, -1)]
+        yield ''.join([(SLACK, STRESS)[bit] for bit in bits])
+
+
+class FootTable:
+    """The feet found for all short lines of marks, ready to look up.
+
+    Keeps counts of lines found and not found in it, like LRUCache.
+    """
+    def __init__(self, maxsyls, minfeet, maxfeet, footlists, index):
+        self.maxsyls = maxsyls
+        self.minfeet = minfeet
+        self.maxfeet = maxfeet
+        self.footlists = footlists	# tuples of foot names; () first
+        self.index = index		# array of indices into footlists
+        self.sectionsize = (1 << (maxsyls + 1)) - 2
+        self.hits = self.misses = 0
+
+    def _place(self, kind, marks, feet):
+        """Index in self.index of a line of marks, or None if not covered."""
+        if not 0 < len(marks) <= self.maxsyls: return None
+        if not self.minfeet <= feet <= self.maxfeet: return None
+        if kind not in KINDS: return None
+        try: value = int(marks.replace(SLACK, '0').replace(STRESS, '1'), 2)
+        except ValueError: return None		# not lexical marks
+        section = KINDS.index(kind) * (self.maxfeet - self.minfeet + 1) \
+                  + feet - self.minfeet
+        return section * self.sectionsize + (1 << len(marks)) - 2 + value
+
+    def Lookup(self, kind, marks, feet):
+        """Return the tuple of feet found for the line, or None if the
+        table doesn't cover it (an empty tuple means no feet were found).
+        """
+        place = self._place(kind, marks, feet)
+        if place is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.footlists[self.index[place]]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        if lookups: hitrate = float(self.hits) / lookups
+        else: hitrate = 0.0
+        return {'size': len(self.index), 'footlists': len(self.footlists),
+                'hits': self.hits, 'misses': self.misses, 'hitrate': hitrate}
+
+
+def BuildFootTable(maxsyls=MAXSYLLABLES, minfeet=MINFEET, maxfeet=MAXFEET,
+                   progress=None):
+    """Divide every line of marks in the limits; return a FootTable.
+
+    Each line is divided as DoAlgorithm and scanAnapestics would divide it
+    (with no punctuation but the start of the line). progress, if given,
+    is called with each kind and number of feet as it is begun.
+    """
+    from scanfuncs import ScansionMachine
+    SM = ScansionMachine()
+    footlists = [()]
+    known = {(): 0}
+    index = array('H')
+    for kind in KINDS:
+        for feet in range(minfeet, maxfeet + 1):
+            if progress: progress(kind, feet)
+            for numsyls in range(1, maxsyls + 1):
+                for marks in _allMarks(numsyls):
+                    if kind == 'anapestic':
+                        if marks[-2:] == SLACK + SLACK:
+                            marks = marks[:-1] + '%'
+                        found = tuple(SM._divideAnapestic(marks, feet))
+                    else:
+                        found = tuple(SM._divideIambic(kind, marks, feet))
+                    if found not in known:
+                        if len(footlists) > 0xffff:
+                            raise ValueError("too many lists of feet")
+                        known[found] = len(footlists)
+                        footlists.append(found)
+                    index.append(known[found])
+    return FootTable(maxsyls, minfeet, maxfeet, tuple(footlists), index)
+
+def CheckFootTable(table, maxsyls=CHECKSYLLABLES):
+    """Divide again every line of marks of up to maxsyls in the table's
+    limits; return (kind, feet, marks) for each the table has wrong.
+
+    A table's signature covers the definitions in scanstrings, not the
+    code that divides lines by them; this is how a table left behind by a
+    change to that code is found out.
+    """
+    maxsyls = min(maxsyls, table.maxsyls)
+    fresh = BuildFootTable(maxsyls, table.minfeet, table.maxfeet)
+    wrong = []
+    for kind in KINDS:
+        for feet in range(table.minfeet, table.maxfeet + 1):
+            for numsyls in range(1, maxsyls + 1):
+                for marks in _allMarks(numsyls):
+                    saved = table.footlists[table.index[
+                                    table._place(kind, marks, feet)]]
+                    found = fresh.footlists[fresh.index[
+                                    fresh._place(kind, marks, feet)]]
+                    if saved != found: wrong.append((kind, feet, marks))
+    return wrong
+
+def WriteFootTable(table, path=TABLEPATH):
+    pool = '\n'.join([','.join(feet) for feet in table.footlists])
+    index = array('H', table.index)
+    if sys.byteorder == 'big': index.byteswap()
+    out = open(path, 'wb')
+    try:
+        out.write(HEADER.pack(MAGIC, Signature(), table.maxsyls,
+                              table.minfeet, table.maxfeet, len(pool)))
+        out.write(zlib.compress(pool + index.tostring(), 9))
+    finally:
+        out.close()
+
+def LoadFootTable(path=TABLEPATH):
+    """Return the FootTable saved in a file, or None if there is none
+    or it was built from other definitions than ours.
+    """
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    if len(data) < HEADER.size: return None
+    (magic, signature, maxsyls, minfeet, maxfeet,
+     poolsize) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or signature != Signature(): return None
+    data = zlib.decompress(data[HEADER.size:])
+    footlists = tuple([tuple(line.split(',')) if line else ()
+                       for line in data[:poolsize].split('\n')])
+    index = array('H')
+    index.fromstring(data[poolsize:])
+    if sys.byteorder == 'big': index.byteswap()
+    return FootTable(maxsyls, minfeet, maxfeet, footlists, index)
+
+
+def main(argv=None):
+    import optparse
+    import time
+    parser = optparse.OptionParser(usage="%prog [options]",
+        description="Divide every short line of lexical marks into feet, "
+                    "for the Scansion Machine to look up.")
+    parser.add_option('-o', '--output', default=TABLEPATH,
+                      help="table file to write (or check) [%default]")
+    parser.add_option('-c', '--check', action='store_true', default=False,
+                      help="don't build; check the table against the code,"
+                           " up to --syllables or %d" % CHECKSYLLABLES)
+    parser.add_option('-s', '--syllables', type='int', default=MAXSYLLABLES,
+                      help="longest line of marks, in syllables [%default]")
+    parser.add_option('-f', '--feet', default='%d-%d' % (MINFEET, MAXFEET),
+                      help="range of line lengths in feet [%default]")
+    (options, args) = parser.parse_args(argv)
+    try:
+        (minfeet, maxfeet) = [int(n) for n in options.feet.split('-')]
+    except ValueError:
+        parser.error("--feet must be a range such as 1-6")
+    if not 0 < minfeet <= maxfeet < 256 or not 0 < options.syllables < 24:
+        parser.error("limits out of range")
+    if options.check:
+        table = LoadFootTable(options.output)
+        if table is None:
+            sys.stderr.write("%s: missing, or built from other definitions;"
+                             " rebuild it\n" % options.output)
+            return 1
+        wrong = CheckFootTable(table, min(options.syllables,
+                                          CHECKSYLLABLES))
+        for (kind, feet, marks) in wrong[:10]:
+            sys.stderr.write("%s, %d feet, %s: table has %s\n" % (kind,
+                             feet, marks, ','.join(table.Lookup(kind, marks,
+                                                                feet))))
+        if wrong:
+            sys.stderr.write("%s: %d lines of marks divided otherwise than"
+                             " the code now does; rebuild it\n"
+                             % (options.output, len(wrong)))
+            return 1
+        return 0
+    def progress(kind, feet):
+        sys.stderr.write("\r%-10s %d feet" % (kind, feet))
+    starttime = time.time()
+    table = BuildFootTable(options.syllables, minfeet, maxfeet, progress)
+    WriteFootTable(table, options.output)
+    sys.stderr.write("\r%d lines of marks, %d lists of feet in %.1f sec:"
+                     " %s (%d bytes)\n" % (len(table.index),
+                     len(table.footlists), time.time() - starttime,
+                     options.output, os.path.getsize(options.output)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,6 +11,8 @@
 #
 # This module contains utility classes and out-of-class functions.
 
+from collections import OrderedDict
+
 class LineData:
     def __init__(self):
         self.data = {'linetext': '',
@@ -34,48 +36,138 @@ class LineData:
         self.data['footlist'].insert(point, foot)
 
 
-## our handy helpers from the ActiveState Cookbook site!
+class StepRecord:
+    """What one scansion step did, as reported to the step hooks.
 
-def getPermutations(a):		# Shalabh Chaturvedi, AS Cookbook
-    if len(a) == 1 or len(a) > 9: yield a
-    else:
-        for i in range(len(a)):
-            this = a[i]
-            rest = a[:i] + a[i+1:]
-            for p in getPermutations(rest): yield this + p
-
-def uniquePermutations(lst):
-    slist = []
-    for s in getPermutations(lst): slist.append(s)
-    u = {}					# this common trick got from Tim Peters, ASC
-    for s in slist: u[s] = 1
-    retlist = u.keys()
-    retlist.sort()
-    return retlist
-
-def dictinvert(d):			# Jason Drew from AS Cookbook
-    inv = {}
-    for k, v in d.iteritems():
-        keys = inv.setdefault(v, [])
-        keys.append(k)
-    return inv
-
-def footfinder(fDict, scansion, chunksize, startpoint, endpoint):
-    """Generator to return a next foot name,
-    updating index within (part of) scanline.
-
-    If endpoint not given, set to end of scansion string. Indices figured and
-    yielded are within that string; if it's offset from the beginning of the
-    actual line, caller is responsible for adding that offset. This makes it 
-    useful both for start-of-line fragments (and whole lines) and for
-    middles of lines.
+    The ScansionMachine makes one of these in RunStep for every step it
+    runs, and hands it to each function registered with AddStepHook.
     """
-    while startpoint < endpoint:
-        possfoot = scansion[startpoint:startpoint+chunksize]
-        if fDict.has_key(possfoot):
-            startpoint += chunksize
-            yield fDict[possfoot], startpoint
-        else: yield '', startpoint
+    def __init__(self, name, seconds, linelength, syllables, ambiguities,
+                 success):
+        self.name = name			# as in GetScansionSteps
+        self.seconds = seconds			# wall-clock time of the step
+        self.linelength = linelength		# characters in the line
+        self.syllables = syllables
+        self.ambiguities = ambiguities		# resolutions of stress to try
+        self.success = success			# False if it failed or raised
+
+
+class LRUCache:
+    """A dictionary of bounded size that forgets what was least recently used.
+
+    Keeps counts of hits, misses, and evictions, so the size can be tuned
+    against real texts. Values are stored as given; a caller that will
+    change what it gets back must store something immutable, or copy.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.table = OrderedDict()		# least recently used first
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.table.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.table[key] = value			# now the most recent
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self.table: del self.table[key]
+        elif len(self.table) >= self.maxsize:
+            self.table.popitem(last=False)
+            self.evictions += 1
+        self.table[key] = value
+
+    def discard(self, key):
+        self.table.pop(key, None)
+
+    def clear(self):
+        self.table.clear()
+
+    def __len__(self): return len(self.table)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        if lookups: hitrate = float(self.hits) / lookups
+        else: hitrate = 0.0
+        return {'size': len(self.table), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hitrate': hitrate}
+
+
+class FenwickTree:
+    """Counts over positions 0..n-1, with prefix sums and search by rank
+    each in O(log n) (a binary indexed tree).
+
+    Built from a list of counts in O(n); a change to one count is Add.
+    """
+    def __init__(self, counts=()):
+        self.tree = [0] + list(counts)		# 1-based, as the tree goes
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree): self.tree[parent] += self.tree[i]
+
+    def __len__(self): return len(self.tree) - 1
+
+    def Add(self, pos, delta):
+        pos += 1
+        while pos < len(self.tree):
+            self.tree[pos] += delta
+            pos += pos & -pos
+
+    def Sum(self, end):
+        """Total of the counts at positions before end."""
+        total = 0
+        while end > 0:
+            total += self.tree[end]
+            end -= end & -end
+        return total
+
+    def Find(self, rank):
+        """The least position whose count takes the running total past
+        rank (counts being 0 or more); len(self) if the total never does."""
+        pos = 0
+        step = 1
+        while step * 2 < len(self.tree): step *= 2
+        while step:
+            if pos + step < len(self.tree) and self.tree[pos + step] <= rank:
+                pos += step
+                rank -= self.tree[pos]
+            step //= 2
+        return pos
+
+
+def footArrangements(twos, threes, scansion, start=0, ends='/%'):
+    """Generate arrangements of 2- and 3-syllable feet that end on stresses.
+
+    Each is a string of '2's and '3's (so many of each), yielded once only
+    and in sorted order, leftmost disyllables first. A foot must end on one
+    of the marks in `ends`; an arrangement is abandoned at the first foot
+    that doesn't, and a point in the line from which nothing works (known
+    by how many of each foot are left) is not tried again.
+    """
+    dead = set()
+    def arrange(twos, threes, pos):
+        if not twos and not threes:
+            yield ''
+            return
+        if (twos, threes) in dead: return
+        found = False
+        for (digit, stride, left2, left3) in (('2', 2, twos - 1, threes),
+                                              ('3', 3, twos, threes - 1)):
+            if left2 < 0 or left3 < 0: continue
+            if scansion[pos + stride - 1] not in ends: continue
+            for rest in arrange(left2, left3, pos + stride):
+                found = True
+                yield digit + rest
+        if not found: dead.add((twos, threes))
+    return arrange(twos, threes, start)
+
+
+## our handy helpers from the ActiveState Cookbook site!
 
 def longestMatch(rx, s):			# code by Kent Johnson from python-list
     """Find the longest match for regular expression rx in string s.
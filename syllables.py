@@ -34,8 +34,8 @@
 # which I've resolved more or less by hunch individually in each place.
 
 import sre
-import wx		# need ONLY for:
-defaultEncoding = wx.GetDefaultPyEncoding()		# for DivideCV only!
+import copy
+import threading
 
 SIBILANTS = '40xzjgsc'			# weird ones are encoded, 7th bit set
 MIDS = 'bdfgklmnpstw%0245'
@@ -80,6 +80,33 @@ class Syllabizer:
     # divisions should fall before or after, not within, these consonant pairs
         self.splitLeftPairs = sre.compile(r""" [bdfk%02] [rl] | g [rln] |
                                           [tw] r | p [rlsn] s [nml]""", sre.X)
+    # small patterns tried on every word, compiled here once
+        self.pluralRE = sre.compile(r"[^s]s\b")
+        self.pastRE = sre.compile(r"ed\b")
+        self.anyVowelRE = sre.compile(r"[aeiouy]")
+        self.finalSilentE = sre.compile(r"[^aeiouy]e\b")
+        self.vowelGroups = sre.compile(
+                      u"[ae\N{LATIN SMALL LETTER E WITH GRAVE}iouy]+")
+        self.consGroups = sre.compile(
+                      u"[^ae\N{LATIN SMALL LETTER E WITH GRAVE}iouy]+")
+        self.workers = threading.local()	# see SyllabizeMany
+
+    def SyllabizeMany(self, words):
+        """Syllabize every distinct word of an iterable; return {word: syls}.
+
+        Each word is syllabized once, however often it comes. Syllabize
+        keeps its working state on the instance, so the work is done by a
+        worker, a copy of this Syllabizer sharing its compiled REs, made
+        once for each thread that calls this; any number of threads can
+        use one Syllabizer at once, and none disturbs its own Syllabize.
+        """
+        worker = getattr(self.workers, 'syllabizer', None)
+        if worker is None:
+            worker = self.workers.syllabizer = copy.copy(self)
+        syllabize = worker.Syllabize
+        analyses = dict.fromkeys(words)
+        for word in analyses: analyses[word] = syllabize(word)
+        return analyses
 
     def Syllabize(self, word):
         if len(word) < 3: return [word.upper()]	# 'ax' etc
@@ -111,9 +138,9 @@ class Syllabizer:
             self.wd = self.wd[:apostrophe]	# cut off ' or 's until last stage
         # cut final s/d from plurals/pasts if not syllabic
         self.isPast = self.isPlural = False	 # defaults used also for suffixes
-        if sre.search(r"[^s]s\b", self.wd):
+        if self.pluralRE.search(self.wd):
             self.isPlural = True	# terminal single s (DUMB!)
-        if sre.search(r"ed\b", self.wd):
+        if self.pastRE.search(self.wd):
             self.isPast = True		# terminal 'ed'
         if self.isPast or self.isPlural:
             self.wd = self.wd[:-1]
@@ -144,7 +171,7 @@ class Syllabizer:
         for res in resultslist:
             # if no vowel left before, false suffix ('singing')
             # n.b.: will choke on 'quest' etc! put in dictionary, I guess
-            if not sre.search('[aeiouy]', self.wd[:res[1]]): break
+            if not self.anyVowelRE.search(self.wd[:res[1]]): break
             if res[0] == 'ing' and self.wd[res[1]-1] == self.wd[res[1]-2]:
                 self.sylBounds.append(res[1] - 1)	# freq special case
             else: self.sylBounds.append(res[1])	# sorted later
@@ -174,11 +201,11 @@ class Syllabizer:
         The messy encoding-and-sometimes-decoding of nonsyllabic final 'e' 
         after a C seems the best that can be done, though I hope not. 
         """
-        if sre.search(r"[^aeiouy]e\b", self.wd): # nonsyllabic final e after C
+        if self.finalSilentE.search(self.wd): # nonsyllabic final e after C
             if ((not self.isPlural or self.wd[-2] not in SIBILANTS) and
                                  (not self.isPast or self.wd[-2] not in 'dt')):
                 self.wd = self.wd[:-1] + encode(self.wd[-1])
-            if not sre.search(r"[aeiouy]", self.wd):		# any vowel left??
+            if not self.anyVowelRE.search(self.wd):		# any vowel left??
                 self.wd = self.wd[:-1] + 'e'		# undo the encoding
         self.wd = self.CiVcomb.sub(handleCiV, self.wd)
         self.wd = self.CCpair.sub(handleCC, self.wd)
@@ -192,15 +219,13 @@ class Syllabizer:
         special characters might be useful to recognize, but won't make the 
         same syllabic difference.
         """
-        unicodeVowels = u"[ae\N{LATIN SMALL LETTER E WITH GRAVE}iouy]+"
-        uniConsonants = u"[^ae\N{LATIN SMALL LETTER E WITH GRAVE}iouy]+"
-        firstvowel = sre.search(unicodeVowels, self.wd).start()
-        for v in sre.finditer(unicodeVowels, self.wd):
+        firstvowel = self.vowelGroups.search(self.wd).start()
+        for v in self.vowelGroups.finditer(self.wd):
             lastvowel = v.end()		# replaced for each group, last sticks
             disyllabicvowels = self.sylvowels.search(v.group())
             if disyllabicvowels:
                 self.sylBounds.append(v.start() + disyllabicvowels.start() + 1)
-        for cc in sre.finditer(uniConsonants, self.wd):
+        for cc in self.consGroups.finditer(self.wd):
             if cc.start() < firstvowel or cc.end() >= lastvowel: continue
             numcons = len(cc.group())
             if numcons < 3: pos = cc.end() - 1	# before single C or betw. 2
@@ -253,6 +278,17 @@ class Syllabizer:
                 retstress -= 1
         return retstress
 
+_poolSyllabizer = []		# made when first needed, one per process
+
+def SyllabizeVocabulary(words):
+    """Syllabizer.SyllabizeMany for process pools, e.g. mapped over chunks.
+
+    Uses this process's own Syllabizer, so nothing but the words and the
+    results need be sent between processes.
+    """
+    if not _poolSyllabizer: _poolSyllabizer.append(Syllabizer())
+    return _poolSyllabizer[0].SyllabizeMany(words)
+
 ## test code
 inputSingleWords = True
 # UNcomment out following line to process whole wordlist.txt file